@@ -0,0 +1,91 @@
+# agent_outputs.py
+
+import asyncio
+import functools
+from typing import Callable, Optional
+
+from langgraph.schema import BaseMessage, ToolMessage, AIMessage
+from blob_store import externalize
+
+
+# -----------------------------
+# 🗂️ Per-node output index (state["agent_outputs"])
+# -----------------------------
+def merge_agent_outputs(left: Optional[dict[str, str]], right: Optional[dict[str, str]]) -> dict[str, str]:
+    """
+    Reducer for `agent_outputs: Annotated[dict[str, str], merge_agent_outputs]`.
+    First non-empty output per node wins, like the old message/visited scan did.
+    Cost is O(agents), independent of conversation length.
+    """
+    if not right:
+        return left or {}
+    merged = dict(left or {})
+    for node, content in right.items():
+        if content and node not in merged:
+            merged[node] = content
+    return merged
+
+
+def node_output(messages: list[BaseMessage]) -> str:
+    """The node's answer: last non-empty Tool/AI message it produced."""
+    for msg in reversed(messages):
+        if isinstance(msg, (ToolMessage, AIMessage)):
+            content = (msg.content or "").strip()
+            if content:
+                return content
+    return ""
+
+
+def agent_output_update(node_name: str, messages: list[BaseMessage]) -> dict[str, str]:
+    """Value to return under "agent_outputs" when `node_name` finishes (large outputs as preview + blob handle)."""
+    content = externalize(node_output(messages))
+    return {node_name: content} if content else {}
+
+
+def with_output_index(node_name: str, node_fn: Callable) -> Callable:
+    """
+    Wraps a worker node we don't own so its update also feeds the index.
+    Works for sync and async node functions.
+    """
+
+    def add_index(update: dict) -> dict:
+        if "agent_outputs" in update or not update.get("messages"):
+            return update
+        return {**update, "agent_outputs": agent_output_update(node_name, update["messages"])}
+
+    if asyncio.iscoroutinefunction(node_fn):
+        @functools.wraps(node_fn)
+        async def indexed_async(state):
+            return add_index(await node_fn(state))
+        return indexed_async
+
+    @functools.wraps(node_fn)
+    def indexed(state):
+        return add_index(node_fn(state))
+    return indexed
+
+
+# -----------------------------
+# 🧾 Format Agent Outputs (Tool or AI)
+# -----------------------------
+def scan_agent_outputs(state: dict) -> dict[str, str]:
+    """Legacy O(messages) reconstruction: zips Tool/AI messages against `visited`."""
+    outputs = {}
+    visited = state.get("visited", [])
+
+    tool_ai_messages = [msg for msg in state["messages"] if isinstance(msg, (ToolMessage, AIMessage))]
+
+    for i, msg in enumerate(tool_ai_messages):
+        if i < len(visited):
+            node = visited[i]
+            content = msg.content.strip()
+            if content and node not in outputs:  # ✅ skip blank
+                outputs[node] = content
+    return outputs
+
+
+def get_agent_outputs_grouped(state: dict) -> dict[str, str]:
+    """node -> first output. Reads the maintained index; falls back to a scan for states that predate it."""
+    if "agent_outputs" in state:
+        return state["agent_outputs"] or {}
+    return scan_agent_outputs(state)
@@ -0,0 +1,429 @@
+# agent_pool.py
+
+import os
+import json
+import time
+import asyncio
+import importlib
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+from pool_slots import Slots
+from tracing import annotate, add_queue_time
+from blob_store import resolve_messages
+from streaming import stream_agent, astream_agent, emit_text, chunk_text
+from registry_service import REGISTRY_PATH, RegistrySnapshot, get_registry, get_registry_service
+
+
+# =========================
+# 1) Pool configuration
+# =========================
+AGENT_FACTORY_MODULE = os.getenv("AGENT_FACTORY_MODULE", "src.agents")          # where `agent` names resolve
+AGENT_POOL_MAX_CONCURRENCY = int(os.getenv("AGENT_POOL_MAX_CONCURRENCY", "4"))  # per agent; registry `max_concurrency` overrides
+AGENT_POOL_IDLE_TTL = float(os.getenv("AGENT_POOL_IDLE_TTL", "600"))            # seconds, 0 = never evict idle
+AGENT_POOL_ACQUIRE_TIMEOUT = float(os.getenv("AGENT_POOL_ACQUIRE_TIMEOUT", "60"))
+AGENT_POOL_PREWARM = os.getenv("AGENT_POOL_PREWARM", "1") == "1"                 # build one instance per agent at compile
+
+
+def load_registry(path: str = REGISTRY_PATH) -> dict[str, dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# =========================
+# 2) Per-agent slot
+# =========================
+class _PooledAgent:
+    __slots__ = ("agent", "slot", "created_at", "last_used", "uses")
+
+    def __init__(self, agent: Any, slot: "_AgentSlot"):
+        self.agent = agent
+        self.slot = slot
+        self.created_at = self.last_used = time.monotonic()
+        self.uses = 0
+
+
+class _AgentSlot:
+    """Idle instances + concurrency limit + metrics for one registry node."""
+
+    def __init__(self, node: str, factory: Callable[[], Any], max_concurrency: int):
+        self.node = node
+        self.factory = factory
+        self.max_concurrency = max_concurrency
+        self.idle: deque[_PooledAgent] = deque()   # appended on checkin: left end = least recently used
+        self.slots = Slots(max_concurrency)   # shared by threads and event loops
+        self.stats = {
+            "constructed": 0, "construct_seconds": 0.0,
+            "invocations": 0, "invoke_seconds": 0.0,
+            "errors": 0, "waits": 0, "evicted_idle": 0, "evicted_error": 0, "in_use": 0,
+        }
+
+
+def _agent_input(state: dict) -> dict:
+    # agents read full tool results: blob handles in the history are resolved here, per call
+    messages = state.get("messages")
+    resolved = resolve_messages(messages) if messages else messages
+    return state if resolved is messages else {**state, "messages": resolved}
+
+
+def _stream_sync(agent: Any, state: dict, node: str) -> dict:
+    if hasattr(agent, "stream"):
+        return stream_agent(agent, state, node)
+    result = agent.invoke(state)   # no streaming API: the whole answer arrives as one chunk
+    emit_text(node, chunk_text(result["messages"][-1]))
+    return result
+
+
+class AgentPool:
+    """
+    Reusable worker agents, keyed by registry node and built from the registry's
+    `agent` field (`get_db_agent`, `get_github_agent`, ...):
+
+      - Instances are constructed lazily on first use (or by `warm_up`) and reused
+        across requests; each instance serves one invocation at a time.
+      - At most `max_concurrency` invocations per agent run at once (registry
+        `max_concurrency` overrides the default); extra callers wait.
+      - Instances idle longer than `idle_ttl` are dropped; an instance whose
+        invoke raises is dropped too (its connection may be broken).
+      - `stats()` reports construction time separately from invoke time.
+      - Without an explicit `registry` the pool follows the registry service: agents
+        added at runtime resolve on first use, and the instances of a removed or
+        edited entry are dropped when the new snapshot is swapped in.
+    """
+
+    def __init__(
+        self,
+        registry: Optional[dict[str, dict]] = None,
+        factories: Optional[dict[str, Callable[[], Any]]] = None,
+        max_concurrency: int = AGENT_POOL_MAX_CONCURRENCY,
+        idle_ttl: float = AGENT_POOL_IDLE_TTL,
+        acquire_timeout: float = AGENT_POOL_ACQUIRE_TIMEOUT,
+        factory_module: str = AGENT_FACTORY_MODULE,
+    ):
+        if max_concurrency < 1:
+            raise ValueError("AgentPool max_concurrency must be >= 1")
+        self._registry = registry
+        self.factories = dict(factories or {})   # `agent` name -> factory, overrides factory_module
+        self.max_concurrency = max_concurrency
+        self.idle_ttl = idle_ttl
+        self.acquire_timeout = acquire_timeout
+        self.factory_module = factory_module
+        self._slots: dict[str, _AgentSlot] = {}
+        self._lock = threading.Lock()
+        self._unsubscribe = get_registry_service().subscribe(self._on_registry_change) if registry is None else None
+
+    @property
+    def registry(self):
+        return self._registry if self._registry is not None else get_registry()
+
+    def _on_registry_change(self, old: RegistrySnapshot, new: RegistrySnapshot) -> None:
+        stale = [node for node in old if node not in new or dict(old[node]) != dict(new[node])]
+        with self._lock:
+            slots = [self._slots.pop(node) for node in stale if node in self._slots]
+            idle = [entry for slot in slots for entry in slot.idle]
+            for slot in slots:
+                slot.idle.clear()
+        for entry in idle:   # checked-out instances finish their call and are dropped with the old slot
+            self._close(entry)
+
+    # ---- factories ----
+    def _resolve_factory(self, node: str) -> Callable[[], Any]:
+        info = self.registry.get(node)
+        if info is None:
+            raise KeyError(f"'{node}' is not in the agent registry")
+        agent_name = info.get("agent")
+        if not agent_name:
+            raise ValueError(f"Registry entry '{node}' has no `agent` factory name")
+        factory = self.factories.get(agent_name)
+        if factory is None:
+            factory = getattr(importlib.import_module(self.factory_module), agent_name, None)
+            if not callable(factory):
+                raise ValueError(f"Agent factory '{agent_name}' not found in {self.factory_module}")
+        return factory
+
+    def _slot(self, node: str) -> _AgentSlot:
+        slot = self._slots.get(node)
+        if slot is None:
+            with self._lock:
+                slot = self._slots.get(node)
+                if slot is None:
+                    limit = int(self.registry.get(node, {}).get("max_concurrency", self.max_concurrency))
+                    slot = self._slots[node] = _AgentSlot(node, self._resolve_factory(node), max(1, limit))
+        return slot
+
+    # ---- lifecycle ----
+    def _construct(self, slot: _AgentSlot) -> _PooledAgent:
+        start = time.perf_counter()
+        entry = _PooledAgent(slot.factory(), slot)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            slot.stats["constructed"] += 1
+            slot.stats["construct_seconds"] += elapsed
+        annotate(agent_construct_ms=elapsed * 1000)
+        return entry
+
+    def _close(self, entry: _PooledAgent) -> None:
+        close = getattr(entry.agent, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
+
+    def _sweep(self, slot: _AgentSlot) -> None:
+        if not self.idle_ttl:
+            return
+        cutoff = time.monotonic() - self.idle_ttl
+        expired = []
+        with self._lock:
+            while slot.idle and slot.idle[0].last_used < cutoff:
+                expired.append(slot.idle.popleft())
+            slot.stats["evicted_idle"] += len(expired)
+        for entry in expired:
+            self._close(entry)
+
+    def evict_idle(self) -> int:
+        """Drops every instance idle longer than `idle_ttl`. Returns how many were dropped."""
+        before = sum(slot.stats["evicted_idle"] for slot in list(self._slots.values()))
+        for slot in list(self._slots.values()):
+            self._sweep(slot)
+        return sum(slot.stats["evicted_idle"] for slot in list(self._slots.values())) - before
+
+    # ---- checkout / checkin ----
+    def _checkout(self, node: str, blocking: bool = True) -> Optional[_PooledAgent]:
+        slot = self._slot(node)
+        if not slot.slots.try_acquire():
+            if not blocking:
+                return None
+            with self._lock:
+                slot.stats["waits"] += 1
+            waited = time.perf_counter()
+            acquired = slot.slots.acquire(self.acquire_timeout)
+            add_queue_time(time.perf_counter() - waited)
+            if not acquired:
+                raise TimeoutError(f"No '{node}' agent available within {self.acquire_timeout}s")
+        return self._ready_entry(slot)
+
+    def _ready_entry(self, slot: _AgentSlot) -> _PooledAgent:
+        """An instance for a held slot: the warmest idle one, or a new one."""
+        try:
+            self._sweep(slot)
+            with self._lock:
+                entry = slot.idle.pop() if slot.idle else None   # most recently used: warmest
+            if entry is None:
+                entry = self._construct(slot)
+            with self._lock:
+                slot.stats["in_use"] += 1
+            return entry
+        except BaseException:
+            slot.slots.release()
+            raise
+
+    def _checkin(self, node: str, entry: _PooledAgent, healthy: bool = True) -> None:
+        slot = entry.slot
+        try:
+            entry.uses += 1
+            entry.last_used = time.monotonic()
+            with self._lock:
+                slot.stats["in_use"] -= 1
+                if self._slots.get(node) is not slot:   # registry entry changed while checked out
+                    healthy = False
+                elif healthy:
+                    slot.idle.append(entry)
+                else:
+                    slot.stats["evicted_error"] += 1
+            if not healthy:
+                self._close(entry)
+        finally:
+            slot.slots.release()
+
+    async def _acheckout(self, node: str) -> _PooledAgent:
+        """
+        Waits for a slot on the event loop (no thread is parked on it) and takes an
+        idle instance right there; building one (or closing expired ones) runs in a
+        worker thread, shielded so a cancelled caller still returns what it produced.
+        """
+        slot = self._slot(node)
+        if not slot.slots.try_acquire():
+            with self._lock:
+                slot.stats["waits"] += 1
+            waited = time.perf_counter()
+            acquired = await slot.slots.aacquire(self.acquire_timeout)
+            add_queue_time(time.perf_counter() - waited)
+            if not acquired:
+                raise TimeoutError(f"No '{node}' agent available within {self.acquire_timeout}s")
+        with self._lock:
+            entry = slot.idle.pop() if slot.idle else None
+            if entry is not None:
+                slot.stats["in_use"] += 1
+        if entry is not None:
+            return entry
+        checkout = asyncio.ensure_future(asyncio.to_thread(self._ready_entry, slot))
+        try:
+            # shielded: a cancelled caller can't stop the thread, which may still build an instance
+            return await asyncio.shield(checkout)
+        except asyncio.CancelledError:
+            checkout.add_done_callback(lambda done: self._return_unused(node, done))
+            raise
+
+    def _return_unused(self, node: str, checkout: asyncio.Future) -> None:
+        if not checkout.cancelled() and checkout.exception() is None:
+            entry = checkout.result()
+            entry.uses -= 1   # checked out for a caller that was already gone
+            self._checkin(node, entry)
+
+    @contextmanager
+    def acquire(self, node: str):
+        entry = self._checkout(node)
+        healthy = True
+        try:
+            yield entry.agent
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            self._checkin(node, entry, healthy)
+
+    def _record_invoke(self, entry: _PooledAgent, started: float, ok: bool) -> None:
+        # the slot the instance was checked out from: a registry edit may have replaced it since
+        slot = entry.slot
+        with self._lock:
+            slot.stats["invocations"] += 1
+            slot.stats["invoke_seconds"] += time.perf_counter() - started
+            slot.stats["errors"] += not ok
+
+    # ---- invoke helpers ----
+    def invoke(self, node: str, state: dict) -> dict:
+        state = _agent_input(state)
+        entry = self._checkout(node)
+        started, ok = time.perf_counter(), False
+        try:
+            result = entry.agent.invoke(state)
+            ok = True
+            return result
+        finally:
+            self._record_invoke(entry, started, ok)
+            self._checkin(node, entry, ok)
+
+    async def ainvoke(self, node: str, state: dict) -> dict:
+        state = _agent_input(state)
+        entry = await self._acheckout(node)
+        started, ok = time.perf_counter(), False
+        try:
+            ainvoke = getattr(entry.agent, "ainvoke", None)
+            if ainvoke is not None:
+                result = await ainvoke(state)
+            else:
+                result = await asyncio.to_thread(entry.agent.invoke, state)
+            ok = True
+            return result
+        finally:
+            self._record_invoke(entry, started, ok)
+            self._checkin(node, entry, ok)
+
+    def stream(self, node: str, state: dict) -> dict:
+        """`invoke`, emitting the agent's message chunks to the current event stream as they arrive."""
+        state = _agent_input(state)
+        entry = self._checkout(node)
+        started, ok = time.perf_counter(), False
+        try:
+            result = _stream_sync(entry.agent, state, node)
+            ok = True
+            return result
+        finally:
+            self._record_invoke(entry, started, ok)
+            self._checkin(node, entry, ok)
+
+    async def astream(self, node: str, state: dict) -> dict:
+        state = _agent_input(state)
+        entry = await self._acheckout(node)
+        started, ok = time.perf_counter(), False
+        try:
+            if hasattr(entry.agent, "astream"):
+                result = await astream_agent(entry.agent, state, node)
+            else:
+                result = await asyncio.to_thread(_stream_sync, entry.agent, state, node)
+            ok = True
+            return result
+        finally:
+            self._record_invoke(entry, started, ok)
+            self._checkin(node, entry, ok)
+
+    # ---- warm-up / metrics ----
+    def warm_up(self, nodes: Optional[list[str]] = None, count: int = 1) -> int:
+        """Constructs up to `count` idle instances per agent (default: every registry node). Returns how many."""
+        created = 0
+        for node in (nodes if nodes is not None else list(self.registry)):
+            slot = self._slot(node)
+            before = slot.stats["constructed"]
+            held = []
+            try:
+                # Hold the slots at once so each checkout reuses or builds a distinct instance
+                for _ in range(min(count, slot.max_concurrency)):
+                    entry = self._checkout(node, blocking=False)
+                    if entry is None:
+                        break
+                    held.append(entry)
+            finally:
+                for entry in held:
+                    entry.uses -= 1      # warm-up is not a real use
+                    self._checkin(node, entry)
+            created += slot.stats["constructed"] - before
+        return created
+
+    def stats(self) -> dict[str, dict]:
+        with self._lock:
+            return {
+                node: {
+                    **slot.stats,
+                    "idle": len(slot.idle),
+                    "max_concurrency": slot.max_concurrency,
+                    "avg_construct_ms": 1000 * slot.stats["construct_seconds"] / max(1, slot.stats["constructed"]),
+                    "avg_invoke_ms": 1000 * slot.stats["invoke_seconds"] / max(1, slot.stats["invocations"]),
+                }
+                for node, slot in self._slots.items()
+            }
+
+    def close(self) -> None:
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+        with self._lock:
+            idle = [entry for slot in self._slots.values() for entry in slot.idle]
+            for slot in self._slots.values():
+                slot.idle.clear()
+        for entry in idle:
+            self._close(entry)
+
+
+# =========================
+# 3) Shared pool accessors
+# =========================
+_POOL: Optional[AgentPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_agent_pool() -> AgentPool:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = AgentPool()
+    return _POOL
+
+
+def set_agent_pool(pool: Optional[AgentPool]) -> Optional[AgentPool]:
+    """Swaps the process-wide agent pool (e.g. fake agents in benchmarks). Returns the previous one."""
+    global _POOL
+    with _POOL_LOCK:
+        previous, _POOL = _POOL, pool
+    return previous
+
+
+def warm_up_agent_pool(nodes: Optional[list[str]] = None, count: int = 1) -> int:
+    """Called by the graph builders so the first visit to each agent doesn't pay construction."""
+    if not AGENT_POOL_PREWARM:
+        return 0
+    return get_agent_pool().warm_up(nodes, count)
@@ -0,0 +1,2 @@
+# benchmarks/ — offline performance harnesses.
+# Run from the repo root, e.g.:  python -m benchmarks.bench_llm_pool
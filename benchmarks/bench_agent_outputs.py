@@ -0,0 +1,66 @@
+# benchmarks/bench_agent_outputs.py
+#
+# Router-side cost of building the "agent responses so far" summary on long conversations:
+# the legacy full message scan vs the reducer-maintained state["agent_outputs"] index.
+#   python -m benchmarks.bench_agent_outputs --messages 5000 --hops 200
+
+import time
+import argparse
+
+from langgraph.schema import HumanMessage, ToolMessage, AIMessage
+
+from agent_outputs import (
+    scan_agent_outputs, get_agent_outputs_grouped, merge_agent_outputs, agent_output_update,
+)
+
+AGENTS = ["database_node", "github_node", "knowledge_node"]
+
+
+def synthetic_conversation(n_messages: int) -> dict:
+    """Alternating human turns and agent outputs, with a matching `visited` trail and index."""
+    state = {"messages": [], "visited": [], "agent_outputs": {}}
+    for i in range(n_messages):
+        if i % 4 == 0:
+            state["messages"].append(HumanMessage(content=f"question {i}"))
+            continue
+        node = AGENTS[i % len(AGENTS)]
+        content = f"{node} output {i} " + "x" * 200
+        if i % 2:
+            msg = ToolMessage(content=content, tool_call_id=f"t{i}")
+        else:
+            msg = AIMessage(content=content)
+        state["messages"].append(msg)
+        state["visited"].append(node)
+        state["agent_outputs"] = merge_agent_outputs(
+            state["agent_outputs"], agent_output_update(node, [msg])
+        )
+    return state
+
+
+def summary(outputs: dict[str, str]) -> str:
+    return "\n".join(f"- {agent}: {response}" for agent, response in outputs.items())
+
+
+def time_per_hop(fn, state: dict, hops: int) -> float:
+    start = time.perf_counter()
+    for _ in range(hops):
+        summary(fn(state))
+    return (time.perf_counter() - start) / hops
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Agent-output summary: scan vs index")
+    parser.add_argument("--messages", type=int, nargs="+", default=[100, 1000, 5000, 20000])
+    parser.add_argument("--hops", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'messages':>9} {'scan/hop':>12} {'index/hop':>12} {'speedup':>9}")
+    for n in args.messages:
+        state = synthetic_conversation(n)
+        scan = time_per_hop(scan_agent_outputs, state, args.hops)
+        index = time_per_hop(get_agent_outputs_grouped, state, args.hops)
+        print(f"{n:>9} {scan * 1e6:>10.1f}us {index * 1e6:>10.1f}us {scan / index:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_agent_pool.py
+#
+# Per-visit agent construction (the old `get_db_agent()` in every node call) vs the
+# shared AgentPool, with fake agents that sleep for setup and invoke.
+#   python -m benchmarks.bench_agent_pool --threads 8 --calls 200 --setup 0.1 --latency 0.02
+
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from agent_pool import AgentPool
+from benchmarks.bench_llm_pool import _report
+
+REGISTRY = {"database_node": {"agent": "get_db_agent", "prompt": "Handles database queries."}}
+
+
+class FakeAgent:
+    """Models an agent whose construction opens tools + a DB connection."""
+
+    def __init__(self, setup_latency: float, latency: float):
+        time.sleep(setup_latency)
+        self.latency = latency
+
+    def invoke(self, state: dict) -> dict:
+        time.sleep(self.latency)
+        return {"messages": state["messages"]}
+
+
+def _run(call, threads: int, calls: int) -> tuple[list[float], float]:
+    def timed(_):
+        start = time.perf_counter()
+        call({"messages": []})
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(timed, range(calls)))
+    return latencies, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Agent construction per visit vs AgentPool")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--setup", type=float, default=0.1, help="agent construction seconds")
+    parser.add_argument("--latency", type=float, default=0.02, help="agent invoke seconds")
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    def build():
+        return FakeAgent(args.setup, args.latency)
+
+    latencies, elapsed = _run(lambda state: build().invoke(state), args.threads, args.calls)
+    _report("construct per visit", latencies, elapsed)
+
+    pool = AgentPool(REGISTRY, factories={"get_db_agent": build}, max_concurrency=args.max_concurrency)
+    pool.warm_up(count=args.max_concurrency)
+    latencies, elapsed = _run(lambda state: pool.invoke("database_node", state), args.threads, args.calls)
+    _report("AgentPool", latencies, elapsed)
+
+    stats = pool.stats()["database_node"]
+    print(
+        f"pool: constructed={stats['constructed']} avg_construct={stats['avg_construct_ms']:.1f}ms "
+        f"invocations={stats['invocations']} avg_invoke={stats['avg_invoke_ms']:.1f}ms waits={stats['waits']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_async.py
+#
+# Sync vs async routing under concurrent conversations, against the fake LLM.
+#   python -m benchmarks.bench_async --conversations 200 --hops 3 --latency 0.05
+#
+# The sync path serves conversations one at a time (one blocking worker); the async
+# path runs them all on one event loop. Rules and the routing cache are disabled so
+# every hop pays the model latency.
+
+import time
+import asyncio
+import argparse
+
+from langchain_core.messages import HumanMessage
+
+import llm_pool
+import routing_rules
+import routing_cache
+from supervisor import supervisor, asupervisor
+
+
+def _new_state(i: int) -> dict:
+    return {
+        "messages": [HumanMessage(content=f"conversation {i}: which agent?")],
+        "feedback": [],
+        "current_node": None,
+        "next_node": None,
+        "visited": [],
+    }
+
+
+def run_sync(conversations: int, hops: int) -> float:
+    start = time.perf_counter()
+    for i in range(conversations):
+        state = _new_state(i)
+        for _ in range(hops):
+            supervisor(state)
+    return time.perf_counter() - start
+
+
+async def run_async(conversations: int, hops: int) -> float:
+    async def conversation(i: int):
+        state = _new_state(i)
+        for _ in range(hops):
+            await asupervisor(state)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(conversation(i) for i in range(conversations)))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sync vs async supervisor routing")
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--hops", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM latency per call (s)")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--pool-size", type=int, default=256)
+    args = parser.parse_args()
+
+    llm_pool.set_model_pool(llm_pool.ModelPool(
+        factory=llm_pool.fake_model_factory(decisions=["database_node"], latency=args.latency, jitter=args.jitter),
+        size=args.pool_size,
+    ))
+    routing_rules.set_rule_engine(routing_rules.RoutingRuleEngine([]))
+    routing_cache.set_routing_cache(routing_cache.RoutingCache(max_entries=0))
+
+    calls = args.conversations * args.hops
+    # The sync run is sequential, so a slice is enough to extrapolate from
+    sample = max(1, min(args.conversations, 20))
+    sync_elapsed = run_sync(sample, args.hops) * args.conversations / sample
+    async_elapsed = asyncio.run(run_async(args.conversations, args.hops))
+
+    print(f"{'path':<8} {'conversations':>13} {'llm calls':>10} {'elapsed':>10} {'conv/s':>9}")
+    print(f"{'sync':<8} {args.conversations:>13} {calls:>10} {sync_elapsed:>9.2f}s {args.conversations / sync_elapsed:>9.1f}  (extrapolated from {sample})")
+    print(f"{'async':<8} {args.conversations:>13} {calls:>10} {async_elapsed:>9.2f}s {args.conversations / async_elapsed:>9.1f}")
+    print(f"speedup: {sync_elapsed / async_elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/bench_batching.py
+#
+# Routing throughput with one LLM call per conversation vs the RoutingBatcher, against a
+# fake backend whose batch call costs one round trip plus a small per-prompt charge.
+#   python -m benchmarks.bench_batching --conversations 64 --calls 640 --window-ms 10 --batch 16
+
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_pool import ModelPool, fake_model_factory
+from routing_batcher import RoutingBatcher
+from benchmarks.bench_llm_pool import _report
+
+
+def _run(route, conversations: int, calls: int) -> tuple[list[float], float]:
+    def timed(i):
+        start = time.perf_counter()
+        route(f"route conversation {i}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=conversations) as executor:
+        latencies = list(executor.map(timed, range(calls)))
+    return latencies, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Routing: per-prompt calls vs micro-batching")
+    parser.add_argument("--conversations", type=int, default=64, help="concurrent graph executions")
+    parser.add_argument("--calls", type=int, default=640)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per model round trip")
+    parser.add_argument("--item-latency", type=float, default=0.001, help="extra seconds per prompt in a batch")
+    parser.add_argument("--window-ms", type=float, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--batch", type=int, default=16)
+    args = parser.parse_args()
+
+    def make_pool() -> ModelPool:
+        factory = fake_model_factory(decisions=["database_node"], latency=args.latency,
+                                     batch_item_latency=args.item_latency)
+        pool = ModelPool(factory=factory, size=args.pool_size)
+        pool.warm_up()
+        return pool
+
+    pool = make_pool()
+    latencies, elapsed = _run(pool.invoke, args.conversations, args.calls)
+    _report("unbatched", latencies, elapsed)
+
+    for window_ms in args.window_ms:
+        batcher = RoutingBatcher(window=window_ms / 1000, max_batch=args.batch, pool=make_pool(),
+                                 max_inflight=args.pool_size)
+        latencies, elapsed = _run(batcher.route, args.conversations, args.calls)
+        _report(f"batched {window_ms:g}ms/{args.batch}", latencies, elapsed)
+        stats = batcher.stats()
+        print(f"{'':<22} batches={stats['batches']} avg_batch={stats['avg_batch_size']:.1f} "
+              f"avg_wait={stats['avg_wait_ms']:.1f}ms")
+        batcher.close()
+
+
+if __name__ == "__main__":
+    main()
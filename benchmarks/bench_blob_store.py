@@ -0,0 +1,116 @@
+# benchmarks/bench_blob_store.py
+#
+# Large tool results inline vs out of line. Each hop one agent returns a `--payload`-char
+# result (every third hop repeats an earlier one, like re-running the same query); the
+# hop's state update, feedback line and routing-prompt sections are built the way
+# nodes._agent_update / the routers build them. Reports state size (pickled, a proxy
+# for checkpoint cost), feedback bytes, per-hop time, and the blob store's read path.
+#   python -m benchmarks.bench_blob_store --hops 200 --payload 200000
+#   python -m benchmarks.bench_blob_store --store-dir /tmp/blobs
+
+import time
+import pickle
+import argparse
+import tempfile
+import statistics
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from state_logs import add_messages
+from agent_outputs import merge_agent_outputs, node_output
+from prompt_budget import PromptBudget, budgeted_output_summary
+from blob_store import BlobStore, externalize, externalize_messages, resolve, set_blob_store
+
+NODES = ("database_node", "github_node", "knowledge_node")
+
+
+def _result(hop: int, payload: int) -> list:
+    source = hop - 1 if hop % 3 == 2 else hop   # repeated queries return identical payloads
+    node = NODES[hop % len(NODES)]
+    call_id = f"call-{hop}"
+    rows = "\n".join(f"{{'id': {source * 1000 + i}, 'name': 'row {i}', 'status': 'ok'}}" for i in range(payload // 48))
+    return [
+        AIMessage(content="", tool_calls=[{"name": f"{node}_tool", "args": {"q": source}, "id": call_id}]),
+        ToolMessage(content=f"{rows}\n-- {payload // 48} rows", tool_call_id=call_id, name=f"{node}_tool"),
+        AIMessage(content=f"{node}: found {payload // 48} rows for query {source}"),
+    ]
+
+
+def run(hops: int, payload: int, out_of_line: bool) -> dict:
+    state = {"messages": add_messages([], [HumanMessage(content="list the failing records")]),
+             "feedback": [], "agent_outputs": {}}
+    times, prompt_tokens = [], []
+    for hop in range(hops):
+        node = NODES[hop % len(NODES)]
+        result = _result(hop, payload)
+        start = time.perf_counter()
+        messages = externalize_messages(result, (ToolMessage,)) if out_of_line else result
+        tool = next(m for m in messages if isinstance(m, ToolMessage))
+        output = node_output(messages)
+        update = {
+            "messages": messages,
+            "feedback": [f"[{node}] Tool responded: {tool.content}"],
+            "agent_outputs": {node: externalize(output) if out_of_line else output},
+        }
+        state["messages"] = add_messages(state["messages"], update["messages"])
+        state["feedback"] = state["feedback"] + update["feedback"]
+        state["agent_outputs"] = merge_agent_outputs(state["agent_outputs"], update["agent_outputs"])
+
+        budget = PromptBudget()
+        budget.fit("last_output", tool.content)
+        budgeted_output_summary(budget, state["agent_outputs"])
+        times.append(time.perf_counter() - start)
+        prompt_tokens.append(budget.finish()["tokens_out"])
+
+    start = time.perf_counter()
+    final = [resolve(m.content) for m in state["messages"] if isinstance(m, ToolMessage)]   # full payloads at the edge
+    resolve_ms = (time.perf_counter() - start) * 1000
+    return {
+        "state_kb": len(pickle.dumps(state)) / 1024,
+        "feedback_kb": sum(len(line) for line in state["feedback"]) / 1024,
+        "hop_us": statistics.median(times) * 1e6,
+        "prompt_tokens": statistics.median(prompt_tokens),
+        "resolve_ms": resolve_ms,
+        "resolved_mb": sum(len(text) for text in final) / 1e6,
+    }
+
+
+def read_path(store: BlobStore, payload: int, reads: int) -> None:
+    key = store.put("x" * payload)
+    start = time.perf_counter()
+    for _ in range(reads):
+        view = store.view(key)
+        view[-1]   # touch the last page
+    view_us = (time.perf_counter() - start) / reads * 1e6
+    start = time.perf_counter()
+    for _ in range(reads):
+        bytes(store.view(key))[-1]
+    copy_us = (time.perf_counter() - start) / reads * 1e6
+    print(f"read {payload // 1024} KB blob ({store.stats()['backend']}): view {view_us:.1f} us, copied {copy_us:.1f} us")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="State / prompt cost of large tool results, inline vs blob store")
+    parser.add_argument("--hops", type=int, default=200)
+    parser.add_argument("--payload", type=int, default=200000, help="chars per tool result")
+    parser.add_argument("--store-dir", default="", help="file-backed store here (default: in-process memory)")
+    parser.add_argument("--reads", type=int, default=200, help="reads for the view vs copy comparison")
+    args = parser.parse_args()
+
+    store = BlobStore(path=args.store_dir)
+    set_blob_store(store)
+
+    print(f"{args.hops} hops, {args.payload}-char tool results, {store.stats()['backend']} store")
+    print(f"{'mode':<12} {'state KB':>10} {'feedback KB':>12} {'hop us':>9} {'prompt tok':>11} {'resolve ms':>11} {'resolved MB':>12}")
+    for label, out_of_line in (("inline", False), ("blob", True)):
+        row = run(args.hops, args.payload, out_of_line)
+        print(f"{label:<12} {row['state_kb']:>10.1f} {row['feedback_kb']:>12.1f} {row['hop_us']:>9.1f} "
+              f"{row['prompt_tokens']:>11.0f} {row['resolve_ms']:>11.1f} {row['resolved_mb']:>12.1f}")
+    print("store:", store.stats())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        read_path(BlobStore(path=args.store_dir or tmp), args.payload * 5, args.reads)
+
+
+if __name__ == "__main__":
+    main()
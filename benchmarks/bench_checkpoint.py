@@ -0,0 +1,82 @@
+# benchmarks/bench_checkpoint.py
+#
+# Checkpoint overhead per hop on a growing conversation: full snapshots of every list
+# channel vs SqliteDeltaSaver's message deltas + compression.
+#   python -m benchmarks.bench_checkpoint --hops 300 --output-bytes 4000
+
+import os
+import time
+import json
+import random
+import argparse
+import tempfile
+
+from langchain_core.messages import HumanMessage, ToolMessage
+
+from checkpoint import SqliteDeltaSaver, thread_config
+from state_logs import append_log
+
+AGENTS = ["database_node", "github_node", "knowledge_node"]
+
+
+def tool_output(rng: random.Random, size: int) -> str:
+    """JSON-ish rows, roughly what the DB / GitHub agents return."""
+    rows = []
+    while sum(len(row) for row in rows) < size:
+        rows.append(json.dumps({"id": rng.randint(1, 10**6), "status": rng.choice(["open", "closed", "paid"]),
+                                "owner": f"user{rng.randint(1, 500)}", "amount": round(rng.random() * 1000, 2)}))
+    return "\n".join(rows)
+
+
+def run(saver: SqliteDeltaSaver, hops: int, output_bytes: int) -> tuple[list[float], list[int], float]:
+    rng = random.Random(7)
+    config = thread_config("bench")
+    messages = [HumanMessage(content="Check invoice 123 and the repo's open PRs", id="h0")]
+    feedback, visited = append_log([], []), append_log([], [])
+    latencies, stored = [], []
+    for hop in range(hops):
+        node = AGENTS[hop % len(AGENTS)]
+        messages = messages + [ToolMessage(content=tool_output(rng, output_bytes), tool_call_id=f"t{hop}", id=f"m{hop}")]
+        feedback = append_log(feedback, [f"[{node}] Tool responded"])
+        visited = append_log(visited, [node])
+        version = hop + 1
+        checkpoint = {
+            "v": 1, "id": f"{hop:08d}", "ts": "", "versions_seen": {},
+            "channel_values": {"messages": messages, "feedback": feedback, "visited": visited, "current_node": node},
+            "channel_versions": {"messages": version, "feedback": version, "visited": version, "current_node": version},
+        }
+        before = saver.stats()["bytes_stored"]
+        start = time.perf_counter()
+        config = saver.put(config, checkpoint, {"step": hop}, dict(checkpoint["channel_versions"]))
+        latencies.append(time.perf_counter() - start)
+        stored.append(saver.stats()["bytes_stored"] - before)
+
+    start = time.perf_counter()
+    saver.get_tuple(thread_config("bench"))
+    return latencies, stored, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Checkpoint overhead per hop: full snapshots vs deltas")
+    parser.add_argument("--hops", type=int, default=300)
+    parser.add_argument("--output-bytes", type=int, default=4000, help="size of each tool output")
+    parser.add_argument("--max-delta-chain", type=int, default=32)
+    args = parser.parse_args()
+
+    strategies = {
+        "full snapshots": dict(max_delta_chain=0, compress_min_bytes=1 << 62),
+        "delta + zlib": dict(max_delta_chain=args.max_delta_chain),
+    }
+    print(f"{'strategy':<16} {'put first 10':>13} {'put last 10':>12} {'KB/hop last 10':>15} "
+          f"{'total MB':>9} {'resume read':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, options in strategies.items():
+            saver = SqliteDeltaSaver(os.path.join(tmp, f"{label.split()[0]}.sqlite"), **options)
+            latencies, stored, read = run(saver, args.hops, args.output_bytes)
+            print(f"{label:<16} {sum(latencies[:10]) * 100:>11.2f}ms {sum(latencies[-10:]) * 100:>10.2f}ms "
+                  f"{sum(stored[-10:]) / 10 / 1024:>15.1f} {sum(stored) / 2**20:>9.1f} {read * 1000:>10.1f}ms")
+            saver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/bench_cold_start.py
+#
+# Cold start of each graph variant, measured in fresh interpreters (fake Gemini + fake
+# agents with zero latency, so only our own startup cost is left):
+#   import      -> `import supervisor` / `import nodes_new`
+#   build       -> first get_compiled_graph() (StateGraph compile, pool warm-up)
+#   cached      -> second get_compiled_graph() for the same registry version
+#   1st / 2nd   -> first and second request through the compiled graph
+#   python -m benchmarks.bench_cold_start --runs 5
+#   python -m benchmarks.bench_cold_start --variants supervisor --importtime 15
+
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+from benchmarks.fakes import install_fake_modules, install_scenario
+
+# variant -> module whose import is timed
+VARIANT_MODULES = {
+    "supervisor": "supervisor",
+    "supervisor_async": "supervisor",
+    "speculative": "supervisor",
+    "planner": "nodes_new",
+    "planner_async": "nodes_new",
+}
+PHASES = ("import_ms", "build_ms", "cached_ms", "first_request_ms", "second_request_ms")
+
+
+# =========================
+# 1) One cold process
+# =========================
+def _ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+
+def _child(variant: str, scenario_name: str) -> dict:
+    import os
+    import asyncio
+    import contextlib
+    import importlib
+
+    install_fake_modules()
+    start = time.perf_counter()
+    importlib.import_module(VARIANT_MODULES[variant])
+    import_ms = _ms(start)
+
+    from graph_cache import get_compiled_graph
+    from benchmarks.run_scenarios import load_scenarios, initial_state
+
+    scenario = load_scenarios([scenario_name])[0]
+    scenario["llm"] = {**scenario.get("llm", {}), "latency": 0.0, "jitter": 0.0}
+    scenario["agents"] = {node: {**spec, "latency": 0.0, "jitter": 0.0}
+                          for node, spec in scenario.get("agents", {}).items()}
+
+    timings = {"import_ms": import_ms}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        install_scenario(scenario, pool_size=1)
+        start = time.perf_counter()
+        graph = get_compiled_graph(variant)
+        timings["build_ms"] = _ms(start)
+
+        start = time.perf_counter()
+        get_compiled_graph(variant)
+        timings["cached_ms"] = _ms(start)
+
+        for i, phase in enumerate(("first_request_ms", "second_request_ms")):
+            start = time.perf_counter()
+            if variant.endswith("_async"):
+                asyncio.run(graph.ainvoke(initial_state(scenario, i)))
+            else:
+                graph.invoke(initial_state(scenario, i))
+            timings[phase] = _ms(start)
+    return timings
+
+
+def _spawn(variant: str, scenario: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_cold_start", "--child", variant, "--scenario", scenario],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+# =========================
+# 2) Import-time breakdown
+# =========================
+def _importtime(module: str, top: int) -> list[tuple[int, int, str]]:
+    """(self us, cumulative us, module) of the slowest imports, from `python -X importtime`."""
+    code = f"from benchmarks.fakes import install_fake_modules; install_fake_modules(); import {module}"
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, module = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(self_us), int(cumulative_us), module.strip()))
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import time and first-request latency of each graph variant")
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANT_MODULES), default=list(VARIANT_MODULES))
+    parser.add_argument("--scenario", default="db_lookup", help="scenario driven for the first requests")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per variant (median reported)")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="also list the N slowest imports")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_child(args.child, args.scenario)))
+        return
+
+    print(f"{'variant':<17} " + " ".join(f"{phase[:-3]:>15}" for phase in PHASES) + "   (median ms)")
+    for variant in args.variants:
+        runs = [_spawn(variant, args.scenario) for _ in range(args.runs)]
+        print(f"{variant:<17} " + " ".join(f"{statistics.median(run[phase] for run in runs):>15.2f}" for phase in PHASES))
+
+    if not args.importtime:
+        return
+    for target in dict.fromkeys(VARIANT_MODULES[variant] for variant in args.variants):
+        print(f"\nslowest imports for `import {target}` (cumulative ms, self ms):")
+        for self_us, cumulative_us, module in _importtime(target, args.importtime):
+            print(f"  {cumulative_us / 1000:9.2f} {self_us / 1000:9.2f}  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# benchmarks/bench_compaction.py
+#
+# Long session through the `messages` reducer: each hop is one agent turn (tool call,
+# tool result of `--payload` chars, answer) plus a new user turn every few hops.
+# Compares plain add_messages with add_compacted_messages on messages kept, reducer
+# time and pickled size per hop (a proxy for checkpoint / serialization cost).
+#   python -m benchmarks.bench_compaction --hops 400 --payload 20000
+
+import time
+import pickle
+import argparse
+import statistics
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from state_logs import add_messages
+from blob_store import BlobStore
+from compaction import CompactionPolicy
+
+
+def _turn(hop: int, payload: int) -> list:
+    call_id = f"call-{hop}"
+    node = ("database_node", "github_node", "knowledge_node")[hop % 3]
+    messages = [
+        AIMessage(content="", tool_calls=[{"name": f"{node}_tool", "args": {"q": hop}, "id": call_id}]),
+        ToolMessage(content=f"{node}: record {hop} " + "x" * payload, tool_call_id=call_id, name=f"{node}_tool"),
+        AIMessage(content=f"{node}: answered hop {hop}"),
+    ]
+    if hop % 5 == 4:
+        messages.append(HumanMessage(content=f"follow-up question {hop}"))
+    return messages
+
+
+def run(reducer, hops: int, payload: int, sample_every: int) -> dict:
+    messages = reducer([], [HumanMessage(content="start the investigation")])
+    times, sizes = [], []
+    for hop in range(hops):
+        turn = _turn(hop, payload)
+        start = time.perf_counter()
+        messages = reducer(messages, turn)
+        times.append(time.perf_counter() - start)
+        if hop % sample_every == 0 or hop == hops - 1:
+            sizes.append(len(pickle.dumps(messages)))
+    return {
+        "messages": len(messages),
+        "p50_us": statistics.median(times) * 1e6,
+        "last_us": statistics.mean(times[-max(1, hops // 10):]) * 1e6,
+        "last_kb": sizes[-1] / 1024,
+        "max_kb": max(sizes) / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="History growth with and without message compaction")
+    parser.add_argument("--hops", type=int, default=400)
+    parser.add_argument("--payload", type=int, default=20000, help="chars per tool result")
+    parser.add_argument("--sample-every", type=int, default=10, help="hops between pickled-size samples")
+    parser.add_argument("--trigger", type=int, default=24)
+    parser.add_argument("--keep", type=int, default=4)
+    parser.add_argument("--spill-bytes", type=int, default=4096)
+    args = parser.parse_args()
+
+    policy = CompactionPolicy(trigger=args.trigger, keep_outputs=args.keep, spill_bytes=args.spill_bytes,
+                              store=BlobStore(path=""))
+    print(f"{args.hops} hops, {args.payload}-char tool results")
+    print(f"{'reducer':<22} {'messages':>9} {'p50 us':>9} {'last10% us':>11} {'final KB':>9} {'max KB':>9}")
+    for label, reducer in (("add_messages", add_messages), ("compacted", policy.reduce)):
+        row = run(reducer, args.hops, args.payload, args.sample_every)
+        print(f"{label:<22} {row['messages']:>9} {row['p50_us']:>9.1f} {row['last_us']:>11.1f} "
+              f"{row['last_kb']:>9.1f} {row['max_kb']:>9.1f}")
+    print("compaction:", policy.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/bench_execution_budget.py
+#
+# The ping_pong scenario (a router that never answers END) under different execution
+# budgets: no controller (the run ends only at LangGraph's recursion limit, as an
+# error), the default hop limit, and whatever --max-hops / --deadline / --max-llm-calls
+# set. Reports latency, LLM and agent calls per request, and how runs ended.
+#   python -m benchmarks.bench_execution_budget --requests 20
+#   python -m benchmarks.bench_execution_budget --deadline 0.3 --variants supervisor_async
+
+from benchmarks.fakes import install_fake_modules, install_scenario
+
+install_fake_modules()
+
+import os
+import time
+import asyncio
+import argparse
+import contextlib
+import statistics
+from collections import Counter
+
+from execution_controller import EXEC_MAX_HOPS, ControlledGraph
+from plan_cache import PlanCache, set_plan_cache
+from routing_cache import RoutingCache, set_routing_cache
+from benchmarks.run_scenarios import VARIANTS, initial_state, load_scenarios, _agent_calls
+
+UNCONTROLLED = {"max_hops": 0, "deadline_s": 0, "max_llm_calls": 0, "max_llm_tokens": 0}
+
+
+def _run(graph, state: dict, is_async: bool, recursion_limit: int) -> dict:
+    config = {"recursion_limit": recursion_limit}
+    try:
+        result = asyncio.run(graph.ainvoke(state, config)) if is_async else graph.invoke(state, config)
+    except Exception as exc:   # GraphRecursionError without a controller
+        return {"outcome": type(exc).__name__, "elapsed_s": None, "llm_calls": None}
+    execution = result["execution"]
+    stopped = execution["stopped"]
+    return {"outcome": stopped.split(" (")[0] if stopped else "END", **execution}
+
+
+def run_mode(variant: str, scenario: dict, limits: dict, requests: int, recursion_limit: int) -> dict:
+    decisions = install_scenario(scenario)
+    set_routing_cache(RoutingCache(path=None))
+    set_plan_cache(PlanCache())
+    build, is_async = VARIANTS[variant]
+    graph = ControlledGraph(build(), **limits)
+
+    llm_before, agent_before = decisions.calls, _agent_calls()
+    runs, latencies = [], []
+    for i in range(requests):
+        start = time.perf_counter()
+        runs.append(_run(graph, initial_state(scenario, i), is_async, recursion_limit))
+        latencies.append(time.perf_counter() - start)
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "llm": (decisions.calls - llm_before) / requests,
+        "agents": (_agent_calls() - agent_before) / requests,
+        "outcomes": Counter(run["outcome"] for run in runs),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Runaway routing loops with and without the execution controller")
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=["supervisor", "supervisor_async", "speculative", "planner"])
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--max-hops", type=int, default=4)
+    parser.add_argument("--deadline", type=float, default=0.0, help="seconds per request, 0 = none")
+    parser.add_argument("--max-llm-calls", type=int, default=0)
+    parser.add_argument("--recursion-limit", type=int, default=25, help="LangGraph's own backstop")
+    args = parser.parse_args()
+
+    scenario = load_scenarios(["ping_pong"])[0]
+    modes = (
+        ("uncontrolled", UNCONTROLLED),
+        (f"default ({EXEC_MAX_HOPS} hops)", {}),
+        ("configured", {"max_hops": args.max_hops, "deadline_s": args.deadline, "max_llm_calls": args.max_llm_calls}),
+    )
+    print(f"{scenario['name']}: {args.requests} requests per row, recursion_limit={args.recursion_limit}")
+    print(f"{'variant':<17} {'budget':<18} {'p50 ms':>9} {'llm/req':>8} {'agent/req':>10}  outcomes")
+    for variant in args.variants:
+        for label, limits in modes:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                row = run_mode(variant, scenario, limits, args.requests, args.recursion_limit)
+            outcomes = ", ".join(f"{name} x{count}" for name, count in row["outcomes"].most_common())
+            print(f"{variant:<17} {label:<18} {row['p50_ms']:>9.1f} {row['llm']:>8.2f} {row['agents']:>10.2f}  {outcomes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/bench_llm_pool.py
+#
+# Per-hop client construction vs the shared ModelPool, against the fake backend.
+#   python -m benchmarks.bench_llm_pool --threads 16 --calls 400 --setup 0.05 --latency 0.02
+
+import time
+import asyncio
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_pool import FakeVertexModel, ModelPool
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _report(label: str, latencies: list[float], elapsed: float) -> None:
+    print(
+        f"{label:<22} calls={len(latencies):<5} "
+        f"throughput={len(latencies) / elapsed:8.1f}/s  "
+        f"p50={_percentile(latencies, 50) * 1000:7.1f}ms  "
+        f"p95={_percentile(latencies, 95) * 1000:7.1f}ms  "
+        f"mean={statistics.mean(latencies) * 1000:7.1f}ms"
+    )
+
+
+def _run_threads(call, threads: int, calls: int) -> tuple[list[float], float]:
+    def timed(_):
+        start = time.perf_counter()
+        call("route this")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(timed, range(calls)))
+    return latencies, time.perf_counter() - start
+
+
+async def _run_async(pool: ModelPool, concurrency: int, calls: int) -> tuple[list[float], float]:
+    gate = asyncio.Semaphore(concurrency)
+
+    async def timed():
+        async with gate:
+            start = time.perf_counter()
+            await pool.ainvoke("route this")
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed() for _ in range(calls)))
+    return list(latencies), time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ModelPool vs per-call client construction")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--pool-size", type=int, default=16)
+    parser.add_argument("--setup", type=float, default=0.05, help="fake client construction latency (s)")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake invoke latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    args = parser.parse_args()
+
+    model_kwargs = dict(decisions=["database_node"], latency=args.latency, jitter=args.jitter)
+
+    def per_call(prompt: str) -> str:
+        # What the routers did before: a new client per hop
+        return FakeVertexModel(setup_latency=args.setup, **model_kwargs).invoke(prompt)
+
+    latencies, elapsed = _run_threads(per_call, args.threads, args.calls)
+    _report("per-call client", latencies, elapsed)
+
+    pool = ModelPool(
+        factory=lambda: FakeVertexModel(setup_latency=args.setup, **model_kwargs),
+        size=args.pool_size,
+    )
+    warm_start = time.perf_counter()
+    pool.warm_up()
+    print(f"{'warm-up':<22} {args.pool_size} clients in {(time.perf_counter() - warm_start) * 1000:.1f}ms")
+
+    latencies, elapsed = _run_threads(pool.invoke, args.threads, args.calls)
+    _report("pooled (threads)", latencies, elapsed)
+
+    latencies, elapsed = asyncio.run(_run_async(pool, args.threads, args.calls))
+    _report("pooled (asyncio)", latencies, elapsed)
+
+    print("pool stats:", pool.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/bench_route_parsing.py
+#
+# Router replies the way models actually phrase them (markdown, sentences, typos, JSON,
+# chatter) parsed two ways: the old exact match (`reply.strip().lower() in registry`)
+# and route_parser. Then end-to-end runs of a scenario with a share of the scripted
+# replies made noisy, with and without the repair call: routes that differ from the
+# clean run, and LLM calls per request.
+#   python -m benchmarks.bench_route_parsing --noise 0.3 --requests 30
+
+from benchmarks.fakes import install_fake_modules, install_scenario
+
+install_fake_modules()
+
+import os
+import time
+import random
+import asyncio
+import argparse
+import threading
+import contextlib
+
+import route_parser
+from registry_service import get_registry
+from plan_cache import PlanCache, set_plan_cache
+from routing_cache import RoutingCache, set_routing_cache
+from route_parser import parse_route, route_parser_stats
+from benchmarks.run_scenarios import VARIANTS, initial_state, load_scenarios
+
+STYLES = {
+    "exact": lambda r: r,
+    "case/punct": lambda r: f" {r.upper()}.\n",
+    "markdown": lambda r: f"**{r}**",
+    "sentence": lambda r: f"I would route this to {r} next.",
+    "stem": lambda r: r.replace("_node", "").replace("_", " "),
+    "typo": lambda r: r[:2] + r[3:] if len(r) > 5 else r,
+    "json": lambda r: f'{{"next": "{r}"}}',
+    "chatter": lambda r: "Let me think about which agent fits best here.",
+}
+
+
+def _legacy(reply: str, names: tuple) -> str:
+    decision = reply.strip().lower()
+    return decision if decision in names else "END" if decision == "end" else None
+
+
+def parse_table(names: tuple) -> None:
+    targets = list(names) + ["END"]
+    print(f"{'style':<12} {'legacy ok':>10} {'parser ok':>10} {'needs repair':>13} {'µs/reply':>9}")
+    for style, noisy in STYLES.items():
+        replies = [(target, noisy(target)) for target in targets]
+        legacy = sum(_legacy(reply, names) == target for target, reply in replies)
+        start = time.perf_counter()
+        parsed = [parse_route(reply, names)[0] for _, reply in replies]
+        micros = (time.perf_counter() - start) / len(replies) * 1e6
+        ok = sum(route == target for route, (target, _) in zip(parsed, replies))
+        repair = sum(route is None for route in parsed)
+        print(f"{style:<12} {legacy:>6}/{len(replies):<3} {ok:>6}/{len(replies):<3} {repair:>13} {micros:>9.1f}")
+
+
+class NoisyDecisions:
+    """Wraps the scenario's script: a `rate` share of replies is rewritten in a random style."""
+
+    def __init__(self, decisions, rate: float, seed: int = 0):
+        self.decisions = decisions
+        self.rate = rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def calls(self) -> int:
+        return self.decisions.calls
+
+    def __call__(self, prompt: str) -> str:
+        reply = self.decisions(prompt)
+        with self._lock:
+            style = self._rng.choice(list(STYLES)) if self._rng.random() < self.rate else "exact"
+        if " | " in reply or ", " in reply:   # planner replies: rewrite each step
+            separator = " | " if " | " in reply else ", "
+            return separator.join(STYLES[style](step) for step in reply.split(separator))
+        return STYLES[style](reply)
+
+
+def run_mode(variant: str, scenario: dict, rate: float, repair: bool, requests: int) -> tuple[list, float]:
+    from benchmarks.fakes import FakeVertexAI
+
+    decisions = install_scenario(scenario)
+    FakeVertexAI.decisions = NoisyDecisions(decisions, rate)
+    set_routing_cache(RoutingCache(path=None))
+    set_plan_cache(PlanCache())
+    route_parser.ROUTE_REPAIR = repair
+    build, is_async = VARIANTS[variant]
+    graph = build()
+
+    routes = []
+    for i in range(requests):
+        state = initial_state(scenario, i)
+        result = asyncio.run(graph.ainvoke(state)) if is_async else graph.invoke(state)
+        routes.append(tuple(result.get("visited") or ()))
+    return routes, decisions.calls / requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Router reply parsing: exact match vs route_parser")
+    parser.add_argument("--scenario", default="db_and_github")
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=["supervisor", "supervisor_async", "planner"])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--noise", type=float, default=0.3, help="share of LLM replies rewritten")
+    args = parser.parse_args()
+
+    names = tuple(get_registry().names)
+    parse_table(names)
+
+    scenario = load_scenarios([args.scenario])[0]
+    print(f"\n{scenario['name']}: {args.requests} requests per row, noise={args.noise:.0%}")
+    print(f"{'variant':<17} {'mode':<16} {'misrouted':>10} {'llm/req':>8}")
+    for variant in args.variants:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            reference, clean_llm = run_mode(variant, scenario, 0.0, True, args.requests)
+            rows = [("clean", 0, clean_llm)]
+            for label, repair in (("noisy, no repair", False), ("noisy, repair", True)):
+                routes, llm = run_mode(variant, scenario, args.noise, repair, args.requests)
+                rows.append((label, sum(route != ref for route, ref in zip(routes, reference)), llm))
+        for label, misrouted, llm in rows:
+            print(f"{variant:<17} {label:<16} {misrouted:>6}/{args.requests:<3} {llm:>8.2f}")
+    route_parser.ROUTE_REPAIR = True
+    print(f"\nparser totals: {route_parser_stats()}")
+
+
+if __name__ == "__main__":
+    main()
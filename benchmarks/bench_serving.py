@@ -0,0 +1,119 @@
+# benchmarks/bench_serving.py
+#
+# Load test of the pre-fork serving runtime against the fake Gemini backend: the same
+# request stream at 1, 2, 4, ... worker processes. Agents burn `--cpu-ms` of GIL-bound
+# work per call, which one process can't overlap; extra workers can.
+#   python -m benchmarks.bench_serving --workers 1 2 4 --requests 400 --concurrency 32 --cpu-ms 5
+#   python -m benchmarks.bench_serving --http --workers 1 4
+
+from benchmarks.fakes import install_fake_modules, install_scenario
+
+install_fake_modules()   # inherited by the forked workers
+
+import os
+import json
+import time
+import argparse
+import contextlib
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from serving import ServingRuntime, make_http_server
+from benchmarks.bench_llm_pool import _percentile
+from benchmarks.run_scenarios import load_scenarios
+
+
+def _setup_worker(scenario_name: str, cpu: float, llm_latency: float) -> None:
+    """Runs in each worker before its graph is compiled: fresh fakes for this process."""
+    install_fake_modules()
+    scenario = load_scenarios([scenario_name])[0]
+    scenario["llm"] = {**scenario.get("llm", {}), "latency": llm_latency}
+    scenario["agents"] = {node: {**spec, "cpu": cpu} for node, spec in scenario.get("agents", {}).items()}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        install_scenario(scenario, pool_size=4)
+
+
+def _http_invoke(url: str, text: str) -> dict:
+    request = urllib.request.Request(url, data=json.dumps({"input": text}).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def run(workers: int, args, scenario: dict) -> dict:
+    runtime = ServingRuntime(
+        variant=args.variant,
+        workers=workers,
+        worker_threads=args.threads,
+        max_pending=args.requests,
+        initializer=_setup_worker,
+        initargs=(scenario["name"], args.cpu_ms / 1000, args.llm_ms / 1000),
+    )
+    server = None
+    # the routers print every decision; keep the table readable
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        runtime.start()
+        if args.http:
+            server = make_http_server(runtime, "127.0.0.1", 0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{server.server_address[1]}/invoke"
+            call = lambda text: _http_invoke(url, text)
+        else:
+            call = runtime.invoke
+
+        def timed(i):
+            start = time.perf_counter()
+            call(scenario["input"].format(i=i))
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(timed, range(args.concurrency)))   # warm-up: first requests per worker
+            start = time.perf_counter()
+            latencies = list(executor.map(timed, range(args.requests)))
+            elapsed = time.perf_counter() - start
+
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        stats = runtime.stats()
+        runtime.drain()
+    return {
+        "workers": workers,
+        "throughput": args.requests / elapsed,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "failed": stats["failed"],
+        "rejected": stats["rejected"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Throughput of the serving runtime vs worker processes")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--variant", default="supervisor")
+    parser.add_argument("--scenario", default="db_and_github")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32, help="clients in flight")
+    parser.add_argument("--threads", type=int, help="conversations in flight per worker (default: --concurrency, "
+                                                    "so every worker count can hold all clients)")
+    parser.add_argument("--cpu-ms", type=float, default=5.0, help="busy work per agent call")
+    parser.add_argument("--llm-ms", type=float, default=20.0, help="fake Gemini latency per call")
+    parser.add_argument("--http", action="store_true", help="drive the runtime through the HTTP front end")
+    args = parser.parse_args()
+    args.threads = args.threads or args.concurrency
+
+    scenario = load_scenarios([args.scenario])[0]
+    print(f"{args.variant} / {scenario['name']}: {args.requests} requests, {args.concurrency} clients, "
+          f"cpu {args.cpu_ms}ms/agent call, llm {args.llm_ms}ms{' via HTTP' if args.http else ''}")
+    print(f"{'workers':>7} {'throughput':>12} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8} {'failed':>7} {'rejected':>9}")
+    baseline = None
+    for workers in args.workers:
+        row = run(workers, args, scenario)
+        baseline = baseline or row["throughput"]
+        print(f"{row['workers']:>7} {row['throughput']:>10.1f}/s {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+              f"{row['throughput'] / baseline:>7.2f}x {row['failed']:>7} {row['rejected']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# benchmarks/bench_state_logs.py
+#
+# Per-hop cost of the feedback/visited updates on long conversations: copying the
+# whole list (`state["feedback"] + [line]`) vs returning a delta to the append_log reducer.
+#   python -m benchmarks.bench_state_logs --hops 20000
+
+import time
+import argparse
+
+from state_logs import append_log
+
+AGENTS = ["database_node", "github_node", "knowledge_node"]
+
+
+def copy_per_hop(hops: int) -> list[float]:
+    feedback, visited, samples = [], [], []
+    for i in range(hops):
+        start = time.perf_counter()
+        node = AGENTS[i % len(AGENTS)]
+        feedback = feedback + [f"[{node}] Tool responded: row {i}"]
+        visited = visited + [node]
+        _ = [name for name in AGENTS if name not in set(visited)]   # router's unvisited check
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def append_log_per_hop(hops: int) -> list[float]:
+    feedback, visited, samples = append_log([], []), append_log([], []), []
+    for i in range(hops):
+        start = time.perf_counter()
+        node = AGENTS[i % len(AGENTS)]
+        feedback = append_log(feedback, [f"[{node}] Tool responded: row {i}"])
+        visited = append_log(visited, [node])
+        _ = [name for name in AGENTS if name not in visited]
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-hop state cost: list copies vs append_log")
+    parser.add_argument("--hops", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'strategy':<12} {'first 100 hops':>16} {'last 100 hops':>16} {'total':>10}")
+    for label, run in (("copy", copy_per_hop), ("append_log", append_log_per_hop)):
+        samples = run(args.hops)
+        first = sum(samples[:100]) / 100
+        last = sum(samples[-100:]) / 100
+        print(f"{label:<12} {first * 1e6:>14.2f}us {last * 1e6:>14.2f}us {sum(samples):>9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
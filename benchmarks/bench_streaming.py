@@ -0,0 +1,95 @@
+# benchmarks/bench_streaming.py
+#
+# Time to the first user-visible bytes: `stream_events` (agent chunks forwarded as they
+# arrive) vs `invoke` (nothing until the whole graph has finished), fake backends.
+#   python -m benchmarks.bench_streaming --requests 20 --chunk-ms 10
+#   python -m benchmarks.bench_streaming --variants supervisor_async planner --scenario db_and_github
+
+from benchmarks.fakes import install_fake_modules, install_scenario
+
+install_fake_modules()
+
+import os
+import time
+import asyncio
+import argparse
+import contextlib
+import statistics
+
+from streaming import stream_events, astream_events
+from plan_cache import PlanCache, set_plan_cache
+from routing_cache import RoutingCache, set_routing_cache
+from benchmarks.run_scenarios import VARIANTS, initial_state, load_scenarios
+
+USER_VISIBLE = ("on_chat_model_stream",)   # agent output; router decisions stay internal
+
+
+def _timed_stream(graph, state: dict, is_async: bool) -> tuple[float, float, int]:
+    """(first agent chunk, last event, events) in seconds from the start of the run."""
+    start = time.perf_counter()
+    first, count = None, 0
+
+    def see(event: dict) -> None:
+        nonlocal first, count
+        count += 1
+        if first is None and event["event"] in USER_VISIBLE:
+            first = time.perf_counter() - start
+
+    if is_async:
+        async def consume():
+            async for event in astream_events(graph, state):
+                see(event)
+        asyncio.run(consume())
+    else:
+        for event in stream_events(graph, state):
+            see(event)
+    total = time.perf_counter() - start
+    return (first if first is not None else total), total, count
+
+
+def _timed_invoke(graph, state: dict, is_async: bool) -> float:
+    start = time.perf_counter()
+    if is_async:
+        asyncio.run(graph.ainvoke(state))
+    else:
+        graph.invoke(state)
+    return time.perf_counter() - start
+
+
+def _fresh_caches() -> None:
+    # both phases start cold, so neither gets the other's routing/plan cache hits
+    set_routing_cache(RoutingCache(path=None))
+    set_plan_cache(PlanCache())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="First-byte latency of streamed vs invoked graph runs")
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=["supervisor", "supervisor_async", "planner"])
+    parser.add_argument("--scenario", default="db_and_github")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--chunk-ms", type=float, default=10.0, help="fake agent latency per streamed word")
+    args = parser.parse_args()
+
+    scenario = load_scenarios([args.scenario])[0]
+    scenario["agents"] = {node: {**spec, "chunk_latency": args.chunk_ms / 1000}
+                          for node, spec in scenario.get("agents", {}).items()}
+
+    print(f"{scenario['name']}: {args.requests} requests, {args.chunk_ms}ms per streamed word (median ms)")
+    print(f"{'variant':<17} {'invoke':>9} {'1st chunk':>10} {'stream end':>11} {'events':>7}")
+    for variant in args.variants:
+        build, is_async = VARIANTS[variant]
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            install_scenario(scenario)
+            graph = build()
+            _fresh_caches()
+            invoked = [_timed_invoke(graph, initial_state(scenario, i), is_async) for i in range(args.requests)]
+            _fresh_caches()
+            streamed = [_timed_stream(graph, initial_state(scenario, i), is_async) for i in range(args.requests)]
+        print(f"{variant:<17} {statistics.median(invoked) * 1000:>9.1f} "
+              f"{statistics.median(s[0] for s in streamed) * 1000:>10.1f} "
+              f"{statistics.median(s[1] for s in streamed) * 1000:>11.1f} "
+              f"{statistics.median(s[2] for s in streamed):>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
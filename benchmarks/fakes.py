@@ -0,0 +1,227 @@
+# benchmarks/fakes.py
+#
+# Offline stand-ins for everything the supervisors reach over the network: the Gemini
+# client (`LLM.Gemini.VertexAI`) and the worker agents (`src.agents.get_*_agent`).
+# Decisions are scripted per scenario, so every variant takes the same route each run.
+# Repo modules are imported inside the functions that need them, so installing the
+# shims doesn't pre-load anything the cold-start benchmark is trying to measure.
+
+import re
+import sys
+import time
+import types
+import random
+import asyncio
+import threading
+from typing import Any, Callable, Optional
+
+
+# =========================
+# 1) Scripted LLM
+# =========================
+class ScriptedDecisions:
+    """
+    prompt -> reply from ordered (regex, reply) rules; the first rule whose regex is
+    found in the prompt wins, otherwise `default`. Counts calls for "LLM calls per request".
+    """
+
+    def __init__(self, rules: list[dict], default: str = "END"):
+        self.rules = [(re.compile(rule["when"], re.IGNORECASE | re.DOTALL), rule["reply"]) for rule in rules]
+        self.default = default
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+        for pattern, reply in self.rules:
+            if pattern.search(prompt):
+                return reply
+        return self.default
+
+
+class FakeVertexAI:
+    """Drop-in for `LLM.Gemini.VertexAI`: `getVertexModel()` returns a scripted FakeVertexModel."""
+
+    decisions: Any = None            # set by `install_scenario`; None = always "END"
+    model_options: dict = {}
+
+    def getVertexModel(self):
+        from llm_pool import FakeVertexModel
+
+        return FakeVertexModel(decisions=FakeVertexAI.decisions, **FakeVertexAI.model_options)
+
+
+# =========================
+# 2) Fake worker agents
+# =========================
+class FakeAgent:
+    """
+    Stands in for a react agent: sleeps `latency` (+ uniform `jitter`) and answers with
+    a ToolMessage + AIMessage carrying `output` ("{user_input}" is filled from the last
+    human message). `cpu` seconds of busy work per call model the GIL-bound part
+    (message handling, JSON parsing). `stream` yields the tool result after `latency`,
+    then the answer word by word, `chunk_latency` apart (`invoke` takes as long in total).
+    """
+
+    def __init__(self, node: str, output: str, latency: float = 0.05, jitter: float = 0.0,
+                 setup_latency: float = 0.0, cpu: float = 0.0, chunk_latency: float = 0.0,
+                 seed: Optional[int] = None):
+        if setup_latency:
+            time.sleep(setup_latency)
+        self.node = node
+        self.output = output
+        self.latency = latency
+        self.jitter = jitter
+        self.cpu = cpu
+        self.chunk_latency = chunk_latency
+        self._rng = random.Random(seed)
+        self._calls = 0
+
+    def _delay(self) -> float:
+        return self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def _reply(self, state: dict) -> dict:
+        from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+        if self.cpu:
+            deadline = time.perf_counter() + self.cpu
+            while time.perf_counter() < deadline:
+                pass
+        messages = list(state["messages"])
+        user_input = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        content = self.output.replace("{user_input}", user_input)
+        self._calls += 1
+        call_id = f"{self.node}-{id(self):x}-{self._calls}"
+        return {"messages": messages + [ToolMessage(content=content, tool_call_id=call_id), AIMessage(content=content)]}
+
+    def _stream_delay(self, result: dict) -> float:
+        return self.chunk_latency * (len(result["messages"][-1].content.split(" ")) - 1)
+
+    def invoke(self, state: dict) -> dict:
+        result = self._reply(state)
+        time.sleep(self._delay() + self._stream_delay(result))
+        return result
+
+    async def ainvoke(self, state: dict) -> dict:
+        result = self._reply(state)
+        await asyncio.sleep(self._delay() + self._stream_delay(result))
+        return result
+
+    def _stream_parts(self, state: dict):
+        from langchain_core.messages import AIMessageChunk
+
+        result = self._reply(state)
+        tool, answer = result["messages"][-2:]
+        words = answer.content.split(" ")
+        chunks = [word + " " for word in words[:-1]] + [words[-1]]
+        return result, [("messages", (tool, {"langgraph_node": "tools"}))] + [
+            ("messages", (AIMessageChunk(content=chunk), {"langgraph_node": "agent"})) for chunk in chunks
+        ]
+
+    def stream(self, state: dict, stream_mode=None):
+        time.sleep(self._delay())
+        result, parts = self._stream_parts(state)
+        for i, part in enumerate(parts):
+            if i > 1 and self.chunk_latency:   # the tool result and the first token arrive together
+                time.sleep(self.chunk_latency)
+            yield part
+        yield ("values", result)
+
+    async def astream(self, state: dict, stream_mode=None):
+        await asyncio.sleep(self._delay())
+        result, parts = self._stream_parts(state)
+        for i, part in enumerate(parts):
+            if i > 1 and self.chunk_latency:
+                await asyncio.sleep(self.chunk_latency)
+            yield part
+        yield ("values", result)
+
+
+def fake_agent_factories(registry: dict[str, dict], agents: Optional[dict[str, dict]] = None,
+                         seed: int = 0) -> dict[str, Callable[[], FakeAgent]]:
+    """
+    registry `agent` name -> factory, for AgentPool(factories=...). `agents` maps node ->
+    {"output", "latency", "jitter", "setup_latency", "cpu", "chunk_latency"}; unscripted nodes report nothing found.
+    """
+    agents = agents or {}
+    factories = {}
+    for node, info in registry.items():
+        spec = {"output": f"{node}: nothing found for this request.", **agents.get(node, {})}
+        factories[info.get("agent", node)] = (
+            lambda node=node, spec=spec: FakeAgent(node, seed=seed, **spec)
+        )
+    return factories
+
+
+# =========================
+# 3) Module shims
+# =========================
+def _fake_src_nodes(name: str):
+    # nodes_new imports `database_node`, `github_node`, ... from src.nodes: serve the pooled
+    # nodes instead, resolved on first access so the agent pool is already installed
+    if name.startswith("__"):
+        raise AttributeError(name)
+    import nodes
+
+    if name not in nodes.AGENT_NODES:
+        raise AttributeError(name)
+    return nodes.AGENT_NODES[name]
+
+
+def _fake_src_agents(name: str):
+    # `get_db_agent`, ...: a FakeAgent factory for the registry entry using that name
+    if name.startswith("__"):
+        raise AttributeError(name)
+    from registry_service import get_registry
+
+    registry = get_registry()
+    factory = fake_agent_factories(registry).get(name)
+    if factory is None:
+        raise AttributeError(name)
+    return factory
+
+
+def install_fake_modules() -> None:
+    """
+    Registers `LLM.Gemini` (FakeVertexAI), `src.agents` (get_*_agent -> FakeAgent) and
+    `src.nodes` in sys.modules. Call before importing the supervisors.
+    """
+    llm = sys.modules.setdefault("LLM", types.ModuleType("LLM"))
+    gemini = types.ModuleType("LLM.Gemini")
+    gemini.VertexAI = FakeVertexAI
+    llm.Gemini = gemini
+    sys.modules["LLM.Gemini"] = gemini
+
+    src = sys.modules.setdefault("src", types.ModuleType("src"))
+    agents = types.ModuleType("src.agents")
+    agents.__getattr__ = _fake_src_agents
+    src_nodes = types.ModuleType("src.nodes")
+    src_nodes.__getattr__ = _fake_src_nodes
+    src.agents, src.nodes = agents, src_nodes
+    sys.modules["src.agents"] = agents
+    sys.modules["src.nodes"] = src_nodes
+
+
+def install_scenario(scenario: dict, pool_size: int = 4, seed: int = 0) -> ScriptedDecisions:
+    """
+    Fresh model pool + agent pool scripted for `scenario`. Returns the decision script
+    (its `calls` counts routing/planning LLM calls).
+    """
+    from llm_pool import ModelPool, set_model_pool
+    from agent_pool import AgentPool, load_registry, set_agent_pool
+
+    llm = scenario.get("llm", {})
+    decisions = ScriptedDecisions(llm.get("replies", []), llm.get("default", "END"))
+    FakeVertexAI.decisions = decisions
+    FakeVertexAI.model_options = {"latency": llm.get("latency", 0.05), "jitter": llm.get("jitter", 0.0),
+                                  "batch_item_latency": llm.get("batch_item_latency", 0.0),
+                                  "chunk_latency": llm.get("chunk_latency", 0.0), "seed": seed}
+    set_model_pool(ModelPool(factory=lambda: FakeVertexAI().getVertexModel(), size=pool_size))
+
+    registry = load_registry()
+    factories = fake_agent_factories(registry, scenario.get("agents"), seed)
+    previous = set_agent_pool(AgentPool(registry, factories=factories))
+    if previous is not None:
+        previous.close()
+    return decisions
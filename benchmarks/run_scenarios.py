@@ -0,0 +1,223 @@
+# benchmarks/run_scenarios.py
+#
+# End-to-end runs of every supervisor variant over the scripted scenarios in
+# benchmarks/scenarios/, with the fake Gemini client and fake agents (no network).
+# Reports throughput, p50/p95/p99 latency, memory per conversation and LLM/agent calls
+# per request.
+#   python -m benchmarks.run_scenarios --requests 100 --concurrency 16
+#   python -m benchmarks.run_scenarios --variants supervisor planner --scenarios db_and_github
+
+from benchmarks.fakes import install_fake_modules, install_scenario
+
+install_fake_modules()   # before any supervisor import pulls in LLM.Gemini / src.agents
+
+import os
+import json
+import contextlib
+import time
+import asyncio
+import argparse
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from langchain_core.messages import HumanMessage
+
+from agent_pool import get_agent_pool
+from execution_controller import ControlledGraph
+from plan_cache import PlanCache, set_plan_cache
+from routing_cache import RoutingCache, set_routing_cache
+from benchmarks.bench_llm_pool import _percentile
+
+SCENARIO_DIR = os.path.join(os.path.dirname(__file__), "scenarios")
+
+
+# =========================
+# 1) Variants
+# =========================
+def _supervisor():
+    from supervisor import build_supervisor_graph
+    return build_supervisor_graph()
+
+
+def _supervisor_async():
+    from supervisor import build_async_supervisor_graph
+    return build_async_supervisor_graph()
+
+
+def _speculative():
+    from supervisor import build_supervisor_graph
+    return build_supervisor_graph(speculative=True)
+
+
+def _dynamic():
+    from supervisor import _build_graph
+    from nodes import AGENT_NODES
+    from dynamic_supervisor import dynamic_supervisor_router
+    return _build_graph(dynamic_supervisor_router, AGENT_NODES, "AGENT_NODES")
+
+
+def _planner():
+    from nodes_new import build_planner_graph, WORKER_NODES
+    from planner import planner_node, make_parallel_stage_node
+    return build_planner_graph(planner_node, make_parallel_stage_node(WORKER_NODES))
+
+
+# name -> (graph builder, driven with ainvoke)
+VARIANTS: dict[str, tuple[Callable, bool]] = {
+    "supervisor": (_supervisor, False),
+    "supervisor_async": (_supervisor_async, True),
+    "speculative": (_speculative, False),
+    "dynamic": (_dynamic, False),
+    "planner": (_planner, False),
+}
+
+
+# =========================
+# 2) Scenarios / requests
+# =========================
+def load_scenarios(names: list[str] = None) -> list[dict]:
+    scenarios = []
+    for filename in sorted(os.listdir(SCENARIO_DIR)):
+        if filename.endswith(".json"):
+            with open(os.path.join(SCENARIO_DIR, filename), "r", encoding="utf-8") as f:
+                scenario = json.load(f)
+            if not names or scenario["name"] in names:
+                scenarios.append(scenario)
+    return scenarios
+
+
+def initial_state(scenario: dict, i: int) -> dict:
+    return {
+        "messages": [HumanMessage(content=scenario["input"].format(i=i))],
+        "feedback": [],
+        "current_node": None,
+        "next_node": None,
+        "visited": [],
+        "agent_outputs": {},
+        "plan": None,
+        "plan_stages": None,
+        "current_step": 0,
+    }
+
+
+def _agent_calls() -> int:
+    return sum(node["invocations"] for node in get_agent_pool().stats().values())
+
+
+# =========================
+# 3) Measurements
+# =========================
+def _run_sync(graph, scenario: dict, requests: int, concurrency: int, offset: int) -> tuple[list[float], float]:
+    def timed(i):
+        start = time.perf_counter()
+        graph.invoke(initial_state(scenario, offset + i))
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, range(requests)))
+    return latencies, time.perf_counter() - start
+
+
+async def _arun(graph, scenario: dict, requests: int, concurrency: int, offset: int) -> tuple[list[float], float]:
+    gate = asyncio.Semaphore(concurrency)
+
+    async def timed(i):
+        async with gate:
+            start = time.perf_counter()
+            await graph.ainvoke(initial_state(scenario, offset + i))
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(i) for i in range(requests)))
+    return list(latencies), time.perf_counter() - start
+
+
+def _memory_per_conversation(graph, scenario: dict, is_async: bool, samples: int, offset: int) -> float:
+    """Average tracemalloc peak (bytes) of one conversation run on its own."""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i in range(samples):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            state = initial_state(scenario, offset + i)
+            if is_async:
+                asyncio.run(graph.ainvoke(state))
+            else:
+                graph.invoke(state)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / max(1, len(peaks))
+
+
+def run_variant(variant: str, scenario: dict, requests: int, concurrency: int,
+                pool_size: int, memory_samples: int) -> dict:
+    # fresh fakes and caches per run, so one variant's cache hits don't leak into the next
+    decisions = install_scenario(scenario, pool_size=pool_size)
+    set_routing_cache(RoutingCache(path=None))
+    set_plan_cache(PlanCache())
+
+    build, is_async = VARIANTS[variant]
+    graph = ControlledGraph(build())   # per-request hop / deadline budget, as graph_cache serves it
+
+    llm_before, agent_before = decisions.calls, _agent_calls()
+    if is_async:
+        latencies, elapsed = asyncio.run(_arun(graph, scenario, requests, concurrency, 0))
+    else:
+        latencies, elapsed = _run_sync(graph, scenario, requests, concurrency, 0)
+    llm_calls, agent_calls = decisions.calls - llm_before, _agent_calls() - agent_before
+
+    memory = _memory_per_conversation(graph, scenario, is_async, memory_samples, requests)
+    return {
+        "variant": variant,
+        "scenario": scenario["name"],
+        "requests": requests,
+        "throughput": requests / elapsed,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "memory_kb": memory / 1024,
+        "llm_calls_per_request": llm_calls / requests,
+        "agent_calls_per_request": agent_calls / requests,
+    }
+
+
+def _print_row(row: dict) -> None:
+    print(f"{row['variant']:<17} {row['scenario']:<18} {row['throughput']:>8.1f}/s "
+          f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+          f"{row['memory_kb']:>9.1f} {row['llm_calls_per_request']:>8.2f} {row['agent_calls_per_request']:>8.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the supervisor variants")
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument("--scenarios", nargs="+", help="scenario names (default: all in benchmarks/scenarios)")
+    parser.add_argument("--requests", type=int, default=100, help="conversations per variant and scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="conversations in flight")
+    parser.add_argument("--pool-size", type=int, default=4, help="fake Gemini clients in the model pool")
+    parser.add_argument("--memory-samples", type=int, default=5, help="single conversations traced with tracemalloc")
+    parser.add_argument("--json", help="also write the rows to this file")
+    args = parser.parse_args()
+
+    rows = []
+    print(f"{'variant':<17} {'scenario':<18} {'throughput':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'KB/conv':>9} {'llm/req':>8} {'agent/req':>8}")
+    for scenario in load_scenarios(args.scenarios):
+        for variant in args.variants:
+            # the routers print every decision; keep the table readable
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                row = run_variant(variant, scenario, args.requests, args.concurrency,
+                                  args.pool_size, args.memory_samples)
+            _print_row(row)
+            rows.append(row)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
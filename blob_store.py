@@ -0,0 +1,326 @@
+# blob_store.py
+
+import os
+import re
+import copy
+import mmap
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+# =========================
+# 1) Configuration
+# =========================
+# directory, resolved once at import (a worker that changes its CWD still finds the same
+# blobs); defaults next to the code, like config/. "" = in-process memory (one process only)
+BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".blobs"))
+BLOB_STORE_PATH = os.path.abspath(BLOB_STORE_PATH) if BLOB_STORE_PATH else ""
+BLOB_INLINE_BYTES = int(os.getenv("BLOB_INLINE_BYTES", "4096"))          # larger payloads are stored out of line
+BLOB_PREVIEW_CHARS = int(os.getenv("BLOB_PREVIEW_CHARS", "200"))         # kept inline next to the handle
+BLOB_MEMORY_ITEMS = int(os.getenv("BLOB_MEMORY_ITEMS", "10000"))         # memory backend: payloads kept (LRU)
+BLOB_TEXT_CACHE_ITEMS = int(os.getenv("BLOB_TEXT_CACHE_ITEMS", "256"))   # decoded payloads kept hot
+# File blobs not written (or re-written) for this long are deleted, at most once per
+# BLOB_PRUNE_INTERVAL_S from `put`. Keep it above checkpoint retention. 0 = keep forever
+BLOB_TTL_S = float(os.getenv("BLOB_TTL_S", str(7 * 24 * 3600)))
+BLOB_PRUNE_INTERVAL_S = float(os.getenv("BLOB_PRUNE_INTERVAL_S", "3600"))
+
+# "<preview>…\n[blob:<key> <chars> chars]": the handle travels inside ordinary strings, so
+# feedback lines, agent_outputs and prompts carry it without any schema change
+BLOB_REF = re.compile(r"\[blob:([0-9a-f]{32}) (\d+) chars\]")
+
+
+# =========================
+# 2) Content-addressed store
+# =========================
+class BlobStore:
+    """
+    Payloads stored once, keyed by sha256 of their bytes (the same DB dump or listing
+    returned twice is one blob).
+
+      - files under `path` (sharded by key prefix, written atomically); `view(key)`
+        is a memoryview over an mmap of the file: no copy, pages are shared with
+        every process reading the same blob (serving workers);
+      - `path=""`: an in-process dict of at most `max_items` payloads (LRU). Handles
+        saved in checkpoints or read by another worker outlive it, so checkpointing
+        and serving refuse it (`require_durable_store`).
+
+    `text(key)` decodes on demand and keeps the last `text_cache_items` decoded.
+    File blobs expire `ttl` seconds after they were last put (`prune`, run in the
+    background from `put` every `prune_interval` seconds).
+    """
+
+    def __init__(self, path: str = BLOB_STORE_PATH, max_items: int = BLOB_MEMORY_ITEMS,
+                 text_cache_items: int = BLOB_TEXT_CACHE_ITEMS, ttl: float = BLOB_TTL_S,
+                 prune_interval: float = BLOB_PRUNE_INTERVAL_S):
+        self.path = os.path.abspath(path) if path else ""
+        self.max_items = max_items
+        self.text_cache_items = text_cache_items
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self._last_prune = time.monotonic()   # a fresh store has nothing of its own to expire yet
+        self._pruning = False
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._texts: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"puts": 0, "dedup": 0, "bytes_stored": 0, "loads": 0, "text_hits": 0, "missing": 0, "pruned": 0}
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key)
+
+    # ---- write ----
+    def put(self, data) -> str:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        key = hashlib.sha256(data).hexdigest()[:32]
+        with self._lock:
+            self._stats["puts"] += 1
+        if not self.path:
+            with self._lock:
+                if key in self._memory:
+                    self._stats["dedup"] += 1
+                else:
+                    self._stats["bytes_stored"] += len(data)
+                self._memory[key] = data
+                self._memory.move_to_end(key)
+                while len(self._memory) > self.max_items:
+                    self._memory.popitem(last=False)
+            return key
+        self._maybe_prune()
+        target = self._file(key)
+        try:
+            os.utime(target)   # already stored: a new handle to it restarts its TTL
+            with self._lock:
+                self._stats["dedup"] += 1
+            return key
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, target)   # atomic: readers never see a partial payload
+        with self._lock:
+            self._stats["bytes_stored"] += len(data)
+        return key
+
+    # ---- read ----
+    def view(self, key: str) -> Optional[memoryview]:
+        """Read-only bytes of a blob without copying them (None if unknown)."""
+        with self._lock:
+            self._stats["loads"] += 1
+        if not self.path:
+            with self._lock:
+                data = self._memory.get(key)
+                if data is None:
+                    self._stats["missing"] += 1
+            return memoryview(data) if data is not None else None
+        try:
+            with open(self._file(key), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return memoryview(b"")
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            with self._lock:
+                self._stats["missing"] += 1
+            return None
+
+    def text(self, key: str) -> Optional[str]:
+        with self._lock:
+            cached = self._texts.get(key)
+            if cached is not None:
+                self._texts.move_to_end(key)
+                self._stats["text_hits"] += 1
+                return cached
+        view = self.view(key)
+        if view is None:
+            return None
+        text = str(view, "utf-8")
+        with self._lock:
+            self._texts[key] = text
+            while len(self._texts) > self.text_cache_items:
+                self._texts.popitem(last=False)
+        return text
+
+    def __contains__(self, key: str) -> bool:
+        if not self.path:
+            return key in self._memory
+        return os.path.exists(self._file(key))
+
+    # ---- maintenance ----
+    def prune(self, older_than: float) -> int:
+        """Deletes file blobs not written for `older_than` seconds. Returns how many."""
+        if not self.path:
+            return 0
+        cutoff, removed = time.time() - older_than, 0
+        for shard in os.listdir(self.path):
+            shard_dir = os.path.join(self.path, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                file = os.path.join(shard_dir, name)
+                try:
+                    if os.path.getmtime(file) < cutoff:
+                        os.remove(file)
+                        removed += 1
+                        with self._lock:
+                            self._texts.pop(name, None)
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            self._stats["pruned"] += removed
+        return removed
+
+    def _maybe_prune(self) -> None:
+        if not self.ttl:
+            return
+        with self._lock:
+            if self._pruning or time.monotonic() - self._last_prune < self.prune_interval:
+                return
+            self._pruning, self._last_prune = True, time.monotonic()
+        threading.Thread(target=self._prune_expired, name="blob-prune", daemon=True).start()
+
+    def _prune_expired(self) -> None:
+        try:
+            removed = self.prune(self.ttl)
+            if removed:
+                print(f"🧹 Pruned {removed} blobs older than {self.ttl:g}s from {self.path}")
+        except OSError as e:
+            print(f"⚠️ Blob prune failed: {e}")
+        finally:
+            with self._lock:
+                self._pruning = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "backend": "files" if self.path else "memory", "text_cached": len(self._texts)}
+
+
+_STORE: Optional[BlobStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = BlobStore()
+    return _STORE
+
+
+def set_blob_store(store: Optional[BlobStore]) -> Optional[BlobStore]:
+    """Swaps the process-wide store (e.g. a shared directory for serving workers). Returns the previous one."""
+    global _STORE
+    with _STORE_LOCK:
+        previous, _STORE = _STORE, store
+    return previous
+
+
+def require_durable_store(user: str) -> None:
+    """Raises when handles written now could be read after a restart or by another process."""
+    if not get_blob_store().path:
+        raise RuntimeError(
+            f"{user} needs a file-backed blob store: handles kept in state would outlive the "
+            "in-memory payloads. Set BLOB_STORE_PATH to a directory shared by every worker."
+        )
+
+
+# =========================
+# 3) Handles in strings and messages
+# =========================
+def _preview(text: str, limit: int) -> str:
+    # head and tail: dumps and listings usually end with their status / count line
+    tail = limit // 4
+    head = " ".join(text[: (limit - tail) * 2].split())[: limit - tail]
+    end = " ".join(text[-tail * 2:].split())[-tail:] if tail else ""
+    return f"{head} … {end}" if end else f"{head} …"
+
+
+def externalize(text: str, threshold: int = BLOB_INLINE_BYTES, preview_chars: int = BLOB_PREVIEW_CHARS,
+                store: Optional[BlobStore] = None) -> str:
+    """Small text unchanged; larger text -> "<preview>\\n[blob:<key> <chars> chars]" with the payload stored."""
+    if not isinstance(text, str) or len(text) <= threshold or blob_key(text):
+        return text
+    key = (store or get_blob_store()).put(text)
+    return f"{_preview(text, preview_chars)}\n[blob:{key} {len(text)} chars]"
+
+
+def blob_key(text: str) -> Optional[str]:
+    match = BLOB_REF.search(text) if isinstance(text, str) else None
+    return match.group(1) if match else None
+
+
+def blob_size(text: str) -> Optional[int]:
+    """Length in chars of the payload behind a handle (None for plain text)."""
+    match = BLOB_REF.search(text) if isinstance(text, str) else None
+    return int(match.group(2)) if match else None
+
+
+def strip_handle(text: str) -> str:
+    """Preview without the handle, for prompts: the model only needs to know more exists."""
+    return BLOB_REF.sub(lambda m: f"[{m.group(2)} chars in total]", text) if isinstance(text, str) else text
+
+
+def resolve(text: str, store: Optional[BlobStore] = None) -> str:
+    """`text` with its blob handle replaced by the full payload (loaded only now)."""
+    if not isinstance(text, str) or "[blob:" not in text:
+        return text
+    match = BLOB_REF.search(text)
+    if match is None:
+        return text
+    payload = (store or get_blob_store()).text(match.group(1))
+    if payload is None:
+        # pruned, or written by a process whose store this one can't see
+        print(f"⚠️ Blob {match.group(1)} not found; only its preview is available")
+        return text
+    return payload
+
+
+def externalize_message(message, threshold: int = BLOB_INLINE_BYTES, preview_chars: int = BLOB_PREVIEW_CHARS,
+                        store: Optional[BlobStore] = None):
+    """A message whose content is over `threshold`, as a copy holding the handle; others unchanged."""
+    content = getattr(message, "content", None)
+    if not isinstance(content, str) or len(content) <= threshold or blob_key(content):
+        return message
+    handle = externalize(content, threshold, preview_chars, store)
+    additional_kwargs = {**(getattr(message, "additional_kwargs", None) or {}), "blob": blob_key(handle)}
+    return _with_content(message, handle, additional_kwargs)
+
+
+def _with_content(message, content: str, additional_kwargs: dict):
+    model_copy = getattr(message, "model_copy", None)   # langchain_core messages are pydantic models
+    if model_copy is not None:
+        return model_copy(update={"content": content, "additional_kwargs": additional_kwargs})
+    clone = copy.copy(message)
+    clone.content, clone.additional_kwargs = content, additional_kwargs
+    return clone
+
+
+def externalize_messages(messages: list, message_types: tuple = (), threshold: int = BLOB_INLINE_BYTES) -> list:
+    """`externalize_message` over a list (only instances of `message_types`, when given)."""
+    return [
+        externalize_message(m, threshold) if not message_types or isinstance(m, message_types) else m
+        for m in messages
+    ]
+
+
+def resolve_messages(messages: list, store: Optional[BlobStore] = None) -> list:
+    """Copies of the externalized messages with their full payloads back; `messages` itself if there are none."""
+    resolved, changed = [], False
+    for message in messages:
+        content = getattr(message, "content", None)
+        if blob_key(content):
+            additional_kwargs = {k: v for k, v in (getattr(message, "additional_kwargs", None) or {}).items() if k != "blob"}
+            message, changed = _with_content(message, resolve(content, store), additional_kwargs), True
+        resolved.append(message)
+    return resolved if changed else messages
+
+
+def message_content(message, store: Optional[BlobStore] = None) -> str:
+    """Full content of a message, loading an externalized payload back when needed."""
+    return resolve(getattr(message, "content", ""), store)
@@ -0,0 +1,460 @@
+# checkpoint.py
+
+import os
+import zlib
+import random
+import sqlite3
+import asyncio
+import operator
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+
+from blob_store import require_durable_store
+from state_logs import AppendLog
+
+
+# =========================
+# 1) Configuration
+# =========================
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "")                          # "" = graphs compile without one
+CHECKPOINT_COMPRESS_MIN_BYTES = int(os.getenv("CHECKPOINT_COMPRESS_MIN_BYTES", "1024"))
+CHECKPOINT_MAX_DELTA_CHAIN = int(os.getenv("CHECKPOINT_MAX_DELTA_CHAIN", "32"))   # full snapshot after N deltas
+CHECKPOINT_HEAD_CACHE_SIZE = int(os.getenv("CHECKPOINT_HEAD_CACHE_SIZE", "256"))  # (thread, channel) heads kept
+
+_MISSING = object()   # channel has a version but no value
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    codec TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata_codec TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    kind TEXT NOT NULL,            -- 'full' | 'delta' (items appended to base_version) | 'empty'
+    base_version TEXT,
+    type TEXT,
+    codec TEXT,                    -- 'raw' | 'zlib'
+    data BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    task_path TEXT NOT NULL DEFAULT '',
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    codec TEXT,
+    data BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class _Head:
+    """Last stored version of a list channel: what the next delta is taken against."""
+
+    __slots__ = ("version", "items", "depth")
+
+    def __init__(self, version: str, items: list, depth: int):
+        self.version = version
+        self.items = items        # shallow copy (references only), or a cut of an AppendLog
+        self.depth = depth        # deltas since the last full snapshot
+
+
+# =========================
+# 2) SQLite saver
+# =========================
+class SqliteDeltaSaver(BaseCheckpointSaver):
+    """
+    Local SQLite checkpointer that stores each conversation incrementally:
+
+      - Only channels in `new_versions` are written on a hop.
+      - A list channel (`messages`, `feedback`, `visited`) that only grew since the
+        last version we stored is written as the appended items plus a pointer to
+        that version. Every `max_delta_chain` deltas a full snapshot is written, so
+        bytes per hop stay O(new items + state / max_delta_chain) and a read replays
+        at most `max_delta_chain` deltas.
+      - Serialized values of `compress_min_bytes` or more (large tool outputs) are
+        zlib-compressed.
+      - Pending writes of finished tasks are kept, so a crashed run resumes from the
+        last completed node: `graph.invoke(None, thread_config(thread_id))`.
+    """
+
+    def __init__(
+        self,
+        path: str = CHECKPOINT_PATH or "checkpoints.sqlite",
+        *,
+        compress_min_bytes: int = CHECKPOINT_COMPRESS_MIN_BYTES,
+        max_delta_chain: int = CHECKPOINT_MAX_DELTA_CHAIN,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        if path != ":memory:":
+            require_durable_store("Checkpointing")   # saved states hold blob handles, not payloads
+        self.path = path
+        self.compress_min_bytes = compress_min_bytes
+        self.max_delta_chain = max_delta_chain
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._heads: "OrderedDict[tuple[str, str, str], _Head]" = OrderedDict()
+        self._stats = {
+            "checkpoints": 0, "full_blobs": 0, "delta_blobs": 0, "writes": 0,
+            "bytes_serialized": 0, "bytes_stored": 0, "compressed": 0,
+        }
+
+    # ---- versions ----
+    def get_next_version(self, current: Optional[str], channel: Any = None) -> str:
+        """
+        "<counter>.<random>": blobs are immutable once written and deltas point at their
+        base version, so a fork (update_state, resuming an older checkpoint_id) must
+        never reuse a version another chain of the same thread already stored.
+        """
+        if current is None:
+            counter = 0
+        elif isinstance(current, (int, float)):
+            counter = int(current)
+        else:
+            counter = int(str(current).split(".")[0])
+        return f"{counter + 1:032}.{random.random():016}"
+
+    # ---- encoding ----
+    def _pack(self, value: Any) -> tuple[str, str, bytes]:
+        type_, data = self.serde.dumps_typed(value)
+        self._stats["bytes_serialized"] += len(data)
+        codec = "raw"
+        if len(data) >= self.compress_min_bytes:
+            compressed = zlib.compress(data, 6)
+            if len(compressed) < len(data):
+                codec, data = "zlib", compressed
+                self._stats["compressed"] += 1
+        self._stats["bytes_stored"] += len(data)
+        return type_, codec, data
+
+    def _unpack(self, type_: str, codec: str, data: bytes) -> Any:
+        if codec == "zlib":
+            data = zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    # ---- list-channel heads (delta bases) ----
+    def _head(self, key: tuple[str, str, str]) -> Optional[_Head]:
+        head = self._heads.get(key)
+        if head is not None:
+            self._heads.move_to_end(key)
+        return head
+
+    def _set_head(self, key: tuple[str, str, str], head: _Head) -> None:
+        self._heads[key] = head
+        self._heads.move_to_end(key)
+        while len(self._heads) > CHECKPOINT_HEAD_CACHE_SIZE:
+            self._heads.popitem(last=False)
+
+    def _blob_row(self, thread_id: str, ns: str, channel: str, version, value: Any) -> tuple:
+        key = (thread_id, ns, channel)
+        if value is _MISSING:
+            self._heads.pop(key, None)
+            return (thread_id, ns, channel, str(version), "empty", None, None, None, None)
+
+        if isinstance(value, AppendLog):
+            # stored as a plain list; a log cut from the last stored one is a delta of
+            # its new items, found from the shared history instead of an O(n) compare
+            head = self._head(key)
+            if (
+                head is not None
+                and head.depth < self.max_delta_chain
+                and isinstance(head.items, AppendLog)
+                and value.shared_prefix(head.items) == len(head.items)
+            ):
+                type_, codec, data = self._pack(list(value[len(head.items):]))
+                self._set_head(key, _Head(str(version), value.copy(), head.depth + 1))
+                self._stats["delta_blobs"] += 1
+                return (thread_id, ns, channel, str(version), "delta", head.version, type_, codec, data)
+            self._set_head(key, _Head(str(version), value.copy(), 0))
+            value = list(value)
+        elif isinstance(value, list):
+            head = self._head(key)
+            items = list(value)
+            if (
+                head is not None
+                and head.depth < self.max_delta_chain
+                and len(items) >= len(head.items)
+                and all(map(operator.is_, head.items, items))   # unchanged prefix, compared by identity
+            ):
+                type_, codec, data = self._pack(items[len(head.items):])
+                self._set_head(key, _Head(str(version), items, head.depth + 1))
+                self._stats["delta_blobs"] += 1
+                return (thread_id, ns, channel, str(version), "delta", head.version, type_, codec, data)
+            self._set_head(key, _Head(str(version), items, 0))
+        else:
+            self._heads.pop(key, None)
+
+        type_, codec, data = self._pack(value)
+        self._stats["full_blobs"] += 1
+        return (thread_id, ns, channel, str(version), "full", None, type_, codec, data)
+
+    def _load_blob(self, thread_id: str, ns: str, channel: str, version) -> tuple[Any, int]:
+        """(full value, delta depth) of one channel version: the last snapshot plus the deltas after it."""
+        deltas = []
+        version = str(version)
+        while True:
+            row = self._conn.execute(
+                "SELECT kind, base_version, type, codec, data FROM blobs "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, ns, channel, version),
+            ).fetchone()
+            if row is None or row[0] == "empty":
+                return _MISSING, 0
+            kind, base_version, type_, codec, data = row
+            if kind == "full":
+                value = self._unpack(type_, codec, data)
+                break
+            deltas.append(self._unpack(type_, codec, data))
+            version = base_version
+        if deltas:
+            value = list(value)
+            for delta in reversed(deltas):
+                value.extend(delta)
+        return value, len(deltas)
+
+    def _load_values(self, thread_id: str, ns: str, versions: ChannelVersions) -> dict[str, Any]:
+        values = {}
+        for channel, version in versions.items():
+            value, depth = self._load_blob(thread_id, ns, channel, version)
+            if value is _MISSING:
+                continue
+            values[channel] = value
+            if isinstance(value, list):
+                # the graph resumes on these very objects, so the next put can be a delta again
+                self._set_head((thread_id, ns, channel), _Head(str(version), list(value), depth))
+        return values
+
+    # ---- BaseCheckpointSaver API ----
+    def put(
+        self,
+        config: dict,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> dict:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        ns = configurable.get("checkpoint_ns", "")
+        stored = dict(checkpoint)
+        values = stored.pop("channel_values", None) or {}
+
+        with self._lock:
+            rows = [
+                self._blob_row(thread_id, ns, channel, version, values.get(channel, _MISSING))
+                for channel, version in new_versions.items()
+            ]
+            type_, codec, data = self._pack(stored)
+            metadata_type, metadata_codec, metadata_data = self._pack(dict(metadata or {}))
+            with self._conn:
+                # a stored version never changes: other checkpoints' deltas may be based on it
+                self._conn.executemany("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, ns, checkpoint["id"], configurable.get("checkpoint_id"),
+                     type_, codec, data, metadata_type, metadata_codec, metadata_data),
+                )
+            self._stats["checkpoints"] += 1
+
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: dict, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        ns = configurable.get("checkpoint_ns", "")
+        checkpoint_id = configurable["checkpoint_id"]
+        # special writes (errors, interrupts) replace; regular task writes are idempotent
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+
+        with self._lock:
+            rows = []
+            for idx, (channel, value) in enumerate(writes):
+                type_, codec, data = self._pack(list(value) if isinstance(value, AppendLog) else value)
+                rows.append((thread_id, ns, checkpoint_id, task_id, task_path,
+                             WRITES_IDX_MAP.get(channel, idx), channel, type_, codec, data))
+            with self._conn:
+                self._conn.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._stats["writes"] += len(rows)
+
+    def _tuple(self, thread_id: str, ns: str, row: tuple) -> CheckpointTuple:
+        checkpoint_id, parent_id, type_, codec, data, metadata_type, metadata_codec, metadata_data = row
+        checkpoint = self._unpack(type_, codec, data)
+        checkpoint["channel_values"] = self._load_values(thread_id, ns, checkpoint["channel_versions"])
+        metadata = self._unpack(metadata_type, metadata_codec, metadata_data)
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, codec, data FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}},
+            checkpoint=checkpoint,
+            metadata=metadata,
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[(task_id, channel, self._unpack(t, c, d)) for task_id, channel, t, c, d in writes],
+        )
+
+    def get_tuple(self, config: dict) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        ns = configurable.get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        query = (
+            "SELECT checkpoint_id, parent_checkpoint_id, type, codec, checkpoint, "
+            "metadata_type, metadata_codec, metadata FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        with self._lock:
+            if checkpoint_id:
+                row = self._conn.execute(query + " AND checkpoint_id = ?", (thread_id, ns, checkpoint_id)).fetchone()
+            else:
+                row = self._conn.execute(query + " ORDER BY checkpoint_id DESC LIMIT 1", (thread_id, ns)).fetchone()
+            return self._tuple(thread_id, ns, row) if row else None
+
+    def list(
+        self,
+        config: Optional[dict],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[dict] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, codec, checkpoint, "
+            "metadata_type, metadata_codec, metadata FROM checkpoints"
+        )
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+        if before:
+            clauses.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        returned = 0
+        for thread_id, ns, *row in rows:
+            if limit is not None and returned >= limit:
+                return
+            with self._lock:
+                item = self._tuple(thread_id, ns, tuple(row))
+            if filter and any(item.metadata.get(key) != value for key, value in filter.items()):
+                continue
+            returned += 1
+            yield item
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            with self._conn:
+                for table in ("checkpoints", "blobs", "writes"):
+                    self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (str(thread_id),))
+            for key in [key for key in self._heads if key[0] == str(thread_id)]:
+                del self._heads[key]
+
+    # ---- async API (SQLite work runs in a thread) ----
+    async def aget_tuple(self, config: dict) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[dict],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[dict] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: dict, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> dict:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: dict, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # ---- metrics / lifecycle ----
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["compression_ratio"] = stats["bytes_serialized"] / max(1, stats["bytes_stored"])
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+
+
+# =========================
+# 3) Shared checkpointer accessors
+# =========================
+_CHECKPOINTER: Optional[SqliteDeltaSaver] = None
+_CHECKPOINTER_LOCK = threading.Lock()
+
+
+def get_checkpointer() -> Optional[SqliteDeltaSaver]:
+    """Shared saver at CHECKPOINT_PATH, or None when checkpointing is off (the default)."""
+    global _CHECKPOINTER
+    if _CHECKPOINTER is None and CHECKPOINT_PATH:
+        with _CHECKPOINTER_LOCK:
+            if _CHECKPOINTER is None:
+                _CHECKPOINTER = SqliteDeltaSaver(CHECKPOINT_PATH)
+    return _CHECKPOINTER
+
+
+def set_checkpointer(saver: Optional[SqliteDeltaSaver]) -> Optional[SqliteDeltaSaver]:
+    """Swaps the shared saver used by the graph builders. Returns the previous one."""
+    global _CHECKPOINTER
+    with _CHECKPOINTER_LOCK:
+        previous, _CHECKPOINTER = _CHECKPOINTER, saver
+    return previous
+
+
+def thread_config(thread_id: str) -> dict:
+    """Config for one conversation. Invoke with input None to resume it after a crash."""
+    return {"configurable": {"thread_id": str(thread_id)}}
@@ -0,0 +1,194 @@
+# compaction.py
+
+import os
+import threading
+from typing import Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from state_logs import add_messages
+from blob_store import BLOB_INLINE_BYTES, BLOB_REF, BlobStore, blob_key, externalize_message
+
+
+# =========================
+# 1) Configuration
+# =========================
+COMPACTION_ENABLED = os.getenv("COMPACTION_ENABLED", "0") == "1"             # opt-in: folded turns lose their verbatim text
+COMPACTION_TRIGGER = int(os.getenv("COMPACTION_TRIGGER", "24"))              # messages before older turns are folded
+COMPACTION_KEEP_OUTPUTS = int(os.getenv("COMPACTION_KEEP_OUTPUTS", "4"))     # latest tool/AI outputs kept verbatim
+COMPACTION_SUMMARY_CHARS = int(os.getenv("COMPACTION_SUMMARY_CHARS", "2000"))  # cap on the folded summary
+COMPACTION_PREVIEW_CHARS = int(os.getenv("COMPACTION_PREVIEW_CHARS", "160"))   # per folded / spilled message
+COMPACTION_SPILL_BYTES = int(os.getenv("COMPACTION_SPILL_BYTES", str(BLOB_INLINE_BYTES)))  # larger ToolMessages go to the blob store, 0 = never
+
+SUMMARY_ID = "compaction-summary"   # one summary message per thread, replaced in place
+
+
+# =========================
+# 2) Policy
+# =========================
+def _preview(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def _tool_call_ids(message: BaseMessage) -> list[str]:
+    return [call.get("id") for call in (getattr(message, "tool_calls", None) or []) if call.get("id")]
+
+
+def _is_summary(message: BaseMessage) -> bool:
+    return getattr(message, "id", None) == SUMMARY_ID
+
+
+class CompactionPolicy:
+    """
+    Keeps `messages` bounded on long sessions:
+
+      - spill: a ToolMessage larger than `spill_bytes` that reached the reducer
+        unshortened keeps a preview plus a blob handle; the payload goes to the
+        blob store (`blob_store.message_content` reads it back);
+      - fold: past `trigger` messages, everything except the last human turn and the
+        last `keep_outputs` tool/AI outputs becomes one line each in a summary
+        message at the head of the list. The summary is carried forward and only
+        new lines are added, capped at `summary_chars` (oldest lines dropped).
+
+    An AIMessage that issued tool calls and the ToolMessages answering it are kept
+    or folded together, so agents never see an orphaned tool result.
+    """
+
+    def __init__(
+        self,
+        trigger: int = COMPACTION_TRIGGER,
+        keep_outputs: int = COMPACTION_KEEP_OUTPUTS,
+        summary_chars: int = COMPACTION_SUMMARY_CHARS,
+        preview_chars: int = COMPACTION_PREVIEW_CHARS,
+        spill_bytes: int = COMPACTION_SPILL_BYTES,
+        store: Optional[BlobStore] = None,
+    ):
+        self.trigger = trigger
+        self.keep_outputs = keep_outputs
+        self.summary_chars = summary_chars
+        self.preview_chars = preview_chars
+        self.spill_bytes = spill_bytes
+        self.store = store   # None = the process-wide blob store
+        self._stats = {"compactions": 0, "folded": 0, "spilled": 0, "spilled_chars": 0}
+        self._lock = threading.Lock()
+
+    # ---- spill ----
+    def spill(self, message: BaseMessage) -> BaseMessage:
+        if not self.spill_bytes or not isinstance(message, ToolMessage):
+            return message
+        spilled = externalize_message(message, self.spill_bytes, self.preview_chars, self.store)
+        if spilled is not message:
+            with self._lock:
+                self._stats["spilled"] += 1
+                self._stats["spilled_chars"] += len(message.content)
+        return spilled
+
+    # ---- fold ----
+    def _line(self, message: BaseMessage) -> str:
+        if isinstance(message, HumanMessage):
+            return f"- user: {_preview(message.content, self.preview_chars)}"
+        if isinstance(message, ToolMessage):
+            key = blob_key(message.content)
+            suffix = f" (blob:{key})" if key else ""
+            text = BLOB_REF.sub("", message.content) if key else message.content
+            return f"- {getattr(message, 'name', None) or 'tool'}: {_preview(text, self.preview_chars)}{suffix}"
+        calls = [call.get("name", "?") for call in (getattr(message, "tool_calls", None) or [])]
+        if calls and not message.content:
+            return f"- assistant called {', '.join(calls)}"
+        return f"- assistant: {_preview(message.content, self.preview_chars)}"
+
+    def _kept(self, messages: list[BaseMessage]) -> set[int]:
+        keep: set[int] = set()
+        last_human = next((i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), None)
+        if last_human is not None:
+            keep.add(last_human)
+        outputs = 0
+        for i in range(len(messages) - 1, -1, -1):
+            if outputs >= self.keep_outputs:
+                break
+            if isinstance(messages[i], (ToolMessage, AIMessage)) and not _is_summary(messages[i]):
+                keep.add(i)
+                outputs += 1
+
+        # keep tool-call pairs whole
+        issued = {call_id: i for i, message in enumerate(messages) for call_id in _tool_call_ids(message)}
+        answers: dict[str, list[int]] = {}
+        for i, message in enumerate(messages):
+            if isinstance(message, ToolMessage) and getattr(message, "tool_call_id", None) in issued:
+                answers.setdefault(message.tool_call_id, []).append(i)
+        for i in list(keep):
+            message = messages[i]
+            if isinstance(message, ToolMessage) and getattr(message, "tool_call_id", None) in issued:
+                keep.add(issued[message.tool_call_id])
+        for i in list(keep):
+            for call_id in _tool_call_ids(messages[i]):
+                keep.update(answers.get(call_id, ()))
+        return keep
+
+    def fold(self, messages: list[BaseMessage]) -> list[BaseMessage]:
+        if len(messages) <= self.trigger:
+            return messages
+        keep = self._kept(messages)
+        summary = next((m for m in messages if _is_summary(m)), None)
+        folded = [m for i, m in enumerate(messages) if i not in keep and not _is_summary(m)]
+        if not folded:
+            return messages
+
+        previous = summary.content.split("\n")[1:] if summary is not None else []
+        lines = previous + [self._line(m) for m in folded]
+        total = ((getattr(summary, "additional_kwargs", None) or {}).get("folded", 0) if summary is not None else 0) + len(folded)
+        while len(lines) > 1 and sum(len(line) + 1 for line in lines) > self.summary_chars:
+            lines.pop(0)
+        header = f"Earlier conversation ({total} messages folded, {total - len(lines)} no longer listed):"
+        new_summary = SystemMessage(content="\n".join([header] + lines), id=SUMMARY_ID,
+                                    additional_kwargs={"folded": total})
+        with self._lock:
+            self._stats["compactions"] += 1
+            self._stats["folded"] += len(folded)
+        return [new_summary] + [m for i, m in enumerate(messages) if i in keep]
+
+    # ---- reducer ----
+    def reduce(self, left: Optional[list], right) -> list:
+        if isinstance(right, BaseMessage):
+            right = [right]
+        if right:
+            right = [self.spill(m) if isinstance(m, ToolMessage) else m for m in right]
+        return self.fold(add_messages(left, right))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+# =========================
+# 3) Shared policy / reducer
+# =========================
+_POLICY: Optional[CompactionPolicy] = None
+_POLICY_LOCK = threading.Lock()
+
+
+def get_compaction_policy() -> CompactionPolicy:
+    global _POLICY
+    if _POLICY is None:
+        with _POLICY_LOCK:
+            if _POLICY is None:
+                _POLICY = CompactionPolicy()
+    return _POLICY
+
+
+def set_compaction_policy(policy: Optional[CompactionPolicy]) -> Optional[CompactionPolicy]:
+    global _POLICY
+    with _POLICY_LOCK:
+        previous, _POLICY = _POLICY, policy
+    return previous
+
+
+def add_compacted_messages(left, right):
+    """
+    Reducer for `messages: Annotated[list[BaseMessage], add_compacted_messages]`:
+    `add_messages`, then the shared CompactionPolicy when COMPACTION_ENABLED=1
+    (plain `add_messages` otherwise, the default).
+    """
+    if not COMPACTION_ENABLED:
+        return add_messages(left, right)
+    return get_compaction_policy().reduce(left, right)
@@ -1,28 +1,35 @@
-import os
-import json
+from functools import partial
 from typing import Optional
 from typing_extensions import TypedDict, Annotated
 
 from langgraph.schema import BaseMessage, HumanMessage, ToolMessage, AIMessage
-from langgraph.prebuilt import add_messages
-from LLM.Gemini import VertexAI
+from agent_outputs import get_agent_outputs_grouped, merge_agent_outputs
+from state_logs import append_log, log_members
+from compaction import add_compacted_messages   # add_messages + history compaction / spill
+from routing_batcher import route_llm, aroute_llm
+from routing_rules import get_rule_engine
+from routing_cache import get_routing_cache, routing_fingerprint
+from prompt_budget import PromptBudget, aprepare, budgeted_output_summary, log_savings
+from prompt_templates import PromptTemplate
+from registry_service import get_registry
+from tracing import traced
+from execution_controller import should_stop
+from route_parser import resolve_route, aresolve_route
 
 # -----------------------------
-# 🧠 Load Agent Registry
+# 🧠 Agent Registry: registry_service.get_registry() (hot-reloaded snapshot per decision)
 # -----------------------------
-REGISTRY_PATH = os.path.join(os.path.dirname(__file__), "config", "agent_registry.json")
-with open(REGISTRY_PATH, "r", encoding="utf-8") as f:
-    AGENT_REGISTRY = json.load(f)
 
 # -----------------------------
 # 📦 Shared State Definition
 # -----------------------------
 class MultiAgentState(TypedDict):
-    messages: Annotated[list[BaseMessage], add_messages]
-    feedback: list[str]
+    messages: Annotated[list[BaseMessage], add_compacted_messages]
+    feedback: Annotated[list[str], append_log]   # nodes return only the lines they add
     current_node: Optional[str]
     next_node: Optional[str]
-    visited: list[str]
+    visited: Annotated[list[str], append_log]    # nodes return only the nodes they add; O(1) `in`
+    agent_outputs: Annotated[dict[str, str], merge_agent_outputs]   # node -> first output, kept by the reducer
 
 # -----------------------------
 # 🔍 Get Last User Input
@@ -34,67 +41,110 @@ def get_last_user_input(messages: list[BaseMessage]) -> str:
     return ""
 
 # -----------------------------
-# 🧾 Format Agent Outputs (Tool or AI)
+# 🤖 LLM-Based Supervisor Router
 # -----------------------------
-def get_agent_outputs_grouped(state: MultiAgentState) -> dict[str, str]:
-    outputs = {}
-    visited = state.get("visited", [])
+# LLM stream events name the router explicitly (the tracing span is absent with TRACING_ENABLED=0)
+_ask = partial(route_llm, node="dynamic_supervisor_router")
+_aask = partial(aroute_llm, node="dynamic_supervisor_router")
 
-    tool_ai_messages = [msg for msg in state["messages"] if isinstance(msg, (ToolMessage, AIMessage))]
+# Prefix is memoized per set of unvisited agents; only the suffix changes per request
+DYNAMIC_SUPERVISOR_PROMPT = PromptTemplate(
+    name="dynamic_supervisor",
+    prefix="""You are the supervisor of a multi-agent system.
 
-    for i, msg in enumerate(tool_ai_messages):
-        if i < len(visited):
-            node = visited[i]
-            content = msg.content.strip()
-            if content and node not in outputs:  # ✅ skip blank
-                outputs[node] = content
-    return outputs
+Agents you can choose from:
+{agent_descriptions}
+
+Choose the most appropriate agent to continue, or reply END if the task is complete.
+Reply with ONLY one of: {agent_names}, END
+
+""",
+    suffix="""User originally asked:
+{user_input}
+
+Agent responses so far:
+{output_summary}""",
+)
+
+def _prepare_dynamic_route(state: MultiAgentState) -> tuple[Optional[str], str, str, list[str]]:
+    """Shared pre-LLM work: (decision or None, prompt, cache_key, available_agents)."""
+    if should_stop(state, "Supervisor"):
+        return "END", "", "", []
 
-# -----------------------------
-# 🤖 LLM-Based Supervisor Router
-# -----------------------------
-def dynamic_supervisor_router(state: MultiAgentState) -> str:
     user_input = get_last_user_input(state["messages"])
-    visited = set(state.get("visited", []))
+    visited = log_members(state.get("visited"))
+    registry = get_registry()
 
     # Determine unvisited agents
-    available_agents = [name for name in AGENT_REGISTRY if name not in visited]
+    available_agents = [name for name in registry.names if name not in visited]
     if not available_agents:
         state["feedback"].append("All agents visited. Routing to END.")
-        return "END"
+        return "END", "", "", []
+
+    # Rule fast path (no LLM call)
+    last_output = getattr(state["messages"][-1], "content", "") if state["messages"] else ""
+    rule = get_rule_engine().resolve(
+        "dynamic_supervisor.dynamic_supervisor_router",
+        {"user_input": user_input, "last_output": last_output},
+        visited=visited,
+        allowed=available_agents + ["END"],
+    )
+    if rule:
+        state["feedback"].append(f"Supervisor decided: {rule.route} (rule: {rule.rule})")
+        return rule.route, "", "", available_agents
 
-    # Build agent descriptions
-    agent_descriptions = "\n".join(
-        f"- {name}: {AGENT_REGISTRY[name]['prompt']}"
-        for name in available_agents
+    # Routing cache: same question, same last output, same candidates
+    cache_key = routing_fingerprint(
+        "dynamic_supervisor.dynamic_supervisor_router", user_input, last_output, available_agents
     )
+    cached = get_routing_cache().get(cache_key)
+    if cached:
+        state["feedback"].append(f"Supervisor decided: {cached} (cached)")
+        return cached, "", cache_key, available_agents
 
-    # Format agent outputs
-    outputs_by_agent = get_agent_outputs_grouped(state)
-    output_summary = "\n".join(
-        f"- {agent}: {response}" for agent, response in outputs_by_agent.items()
-    ) or "No agent responses yet."
+    # Format agent outputs (each fitted to its token budget)
+    budget = PromptBudget()
+    output_summary = budgeted_output_summary(budget, get_agent_outputs_grouped(state))
 
     # Compose Gemini prompt
-    prompt = f"""
-You are the supervisor of a multi-agent system.
+    prompt = registry.templates.render(
+        DYNAMIC_SUPERVISOR_PROMPT,
+        available_agents,
+        user_input=budget.fit("user_input", user_input),
+        output_summary=output_summary,
+    )
+    log_savings("Supervisor", budget.finish())
+    return None, prompt, cache_key, available_agents
 
-User originally asked:
-{user_input}
 
-Agent responses so far:
-{output_summary}
+def _finish_dynamic_route(state: MultiAgentState, decision: Optional[str], cache_key: str) -> str:
+    """`decision`: an available agent or "END" as parsed from the reply, None when unusable."""
+    print("🤖 LLM Decision:", decision)
 
-Agents you can choose from:
-{agent_descriptions}
+    state["feedback"].append(f"Supervisor decided: {decision or 'END (unusable reply)'}")
+    if decision is None:
+        return "END"
+    get_routing_cache().put(cache_key, decision)
+    return decision
 
-Choose the most appropriate agent to continue, or reply END if the task is complete.
-Reply with ONLY one of: {", ".join(available_agents + ["END"])}
-""".strip()
 
-    # Call Gemini
-    decision = VertexAI().getVertexModel().invoke(prompt).strip().lower()
-    print("🤖 LLM Decision:", decision)
+@traced("dynamic_supervisor_router", kind="router")
+def dynamic_supervisor_router(state: MultiAgentState) -> str:
+    decision, prompt, cache_key, available_agents = _prepare_dynamic_route(state)
+    if decision:
+        return decision
+
+    # Call Gemini; the reply is matched against the unvisited agents (one repair if unusable)
+    decision = resolve_route("dynamic_supervisor", prompt, _ask(prompt), available_agents, _ask)
+    return _finish_dynamic_route(state, decision, cache_key)
+
+
+@traced("dynamic_supervisor_router", kind="router")
+async def adynamic_supervisor_router(state: MultiAgentState) -> str:
+    decision, prompt, cache_key, available_agents = await aprepare(_prepare_dynamic_route, state)
+    if decision:
+        return decision
 
-    state["feedback"].append(f"Supervisor decided: {decision}")
-    return decision if decision in available_agents + ["end"] else "END"
+    # Call Gemini without blocking the event loop
+    decision = await aresolve_route("dynamic_supervisor", prompt, await _aask(prompt), available_agents, _aask)
+    return _finish_dynamic_route(state, decision, cache_key)
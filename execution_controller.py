@@ -0,0 +1,313 @@
+# execution_controller.py
+
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from tracing import annotate
+
+
+# =========================
+# 1) Configuration
+# =========================
+EXEC_MAX_HOPS = int(os.getenv("EXEC_MAX_HOPS", "8"))                 # agent visits per request, 0 = unlimited
+EXEC_DEADLINE_S = float(os.getenv("EXEC_DEADLINE_S", "120"))         # wall clock per request, 0 = none
+EXEC_MAX_LLM_CALLS = int(os.getenv("EXEC_MAX_LLM_CALLS", "0"))       # routing / planning calls, 0 = unlimited
+EXEC_MAX_LLM_TOKENS = int(os.getenv("EXEC_MAX_LLM_TOKENS", "0"))     # estimated prompt + completion, 0 = unlimited
+EXEC_PARTIAL_ANSWER = os.getenv("EXEC_PARTIAL_ANSWER", "outputs")    # on early stop: outputs | last | none
+# Hop limit for routers running outside any budget (bare compiled graphs), counted on
+# the whole `visited` log: earlier turns of a checkpointed thread count too. 0 = none
+EXEC_FALLBACK_MAX_HOPS = int(os.getenv("EXEC_FALLBACK_MAX_HOPS", str(EXEC_MAX_HOPS)))
+
+
+# =========================
+# 2) Per-request budget
+# =========================
+class ExecutionBudget:
+    """
+    Limits and consumption of one request. Routers call `should_stop` before every
+    decision; once a limit is reached the request ends at the next decision (an agent
+    that is already running finishes first).
+
+      - hops: agent visits made by this request (`visited` entries added since its
+        first decision, so earlier turns of the same thread don't count);
+      - deadline: seconds since the budget was opened;
+      - llm_calls / llm_tokens: routing and planning calls, tokens estimated from text.
+    """
+
+    def __init__(
+        self,
+        max_hops: int = EXEC_MAX_HOPS,
+        deadline_s: float = EXEC_DEADLINE_S,
+        max_llm_calls: int = EXEC_MAX_LLM_CALLS,
+        max_llm_tokens: int = EXEC_MAX_LLM_TOKENS,
+    ):
+        self.max_hops = max_hops
+        self.deadline_s = deadline_s
+        self.max_llm_calls = max_llm_calls
+        self.max_llm_tokens = max_llm_tokens
+        self.started = time.monotonic()
+        self.hops = 0
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.stopped: Optional[str] = None
+        self._base_hops: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def observe_hops(self, visited: int) -> None:
+        with self._lock:
+            if self._base_hops is None:
+                self._base_hops = visited
+            self.hops = visited - self._base_hops
+
+    def charge_llm(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def exhausted(self, max_hops: Optional[int] = None) -> Optional[str]:
+        """Why the request must stop now, or None. `max_hops` tightens the hop limit for one router."""
+        hop_limit = min(filter(None, (self.max_hops, max_hops)), default=0)
+        tokens = self.prompt_tokens + self.completion_tokens
+        if hop_limit and self.hops >= hop_limit:
+            return f"hop limit ({self.hops}/{hop_limit})"
+        if self.deadline_s and self.elapsed() >= self.deadline_s:
+            return f"deadline ({self.elapsed():.2f}s/{self.deadline_s:g}s)"
+        if self.max_llm_calls and self.llm_calls >= self.max_llm_calls:
+            return f"LLM call budget ({self.llm_calls}/{self.max_llm_calls})"
+        if self.max_llm_tokens and tokens >= self.max_llm_tokens:
+            return f"LLM token budget ({tokens}/{self.max_llm_tokens})"
+        return None
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "hops": self.hops,
+                "max_hops": self.max_hops,
+                "elapsed_s": round(self.elapsed(), 3),
+                "deadline_s": self.deadline_s,
+                "llm_calls": self.llm_calls,
+                "max_llm_calls": self.max_llm_calls,
+                "llm_tokens": self.prompt_tokens + self.completion_tokens,
+                "max_llm_tokens": self.max_llm_tokens,
+                "stopped": self.stopped,
+            }
+
+
+# Set for the duration of one request; nodes on LangGraph's worker threads see it
+# through the copied context, and they all share the one (locked) budget object.
+_BUDGET: contextvars.ContextVar[Optional[ExecutionBudget]] = contextvars.ContextVar("execution_budget", default=None)
+
+_TOTALS = {"requests": 0, "stopped": 0, "hops": 0, "llm_calls": 0, "llm_tokens": 0}
+_STOPS: dict[str, int] = {}
+_TOTALS_LOCK = threading.Lock()
+
+
+def current_budget() -> Optional[ExecutionBudget]:
+    return _BUDGET.get()
+
+
+def _record_totals(budget: ExecutionBudget) -> None:
+    report = budget.report()
+    with _TOTALS_LOCK:
+        _TOTALS["requests"] += 1
+        _TOTALS["stopped"] += report["stopped"] is not None
+        _TOTALS["hops"] += report["hops"]
+        _TOTALS["llm_calls"] += report["llm_calls"]
+        _TOTALS["llm_tokens"] += report["llm_tokens"]
+
+
+@contextmanager
+def execution_budget(budget: Optional[ExecutionBudget] = None, **limits) -> Iterator[ExecutionBudget]:
+    """
+    Opens a budget for the code inside (one request). Nested without an explicit
+    `budget`, the outer request's budget is reused.
+    """
+    outer = _BUDGET.get()
+    if budget is None and outer is not None:
+        yield outer
+        return
+    budget = budget or ExecutionBudget(**limits)
+    token = _BUDGET.set(budget)
+    try:
+        yield budget
+    finally:
+        _BUDGET.reset(token)
+        _record_totals(budget)
+
+
+def controller_stats() -> dict:
+    with _TOTALS_LOCK:
+        return {**_TOTALS, "stopped_by": dict(_STOPS)}
+
+
+# =========================
+# 3) Hooks for routers and LLM calls
+# =========================
+def should_stop(state: dict, router: str, max_hops: Optional[int] = None) -> Optional[str]:
+    """
+    Called by every router before it decides. Returns the reason when the request has
+    to end now (and logs it to `state["feedback"]`, the hop's own list when the router
+    runs as a `routing_node`); the router then routes to END.
+    Inside an open budget (ControlledGraph, `execution_budget()`) every limit applies
+    to this request only. Without one, a bare compiled graph can't tell this request's
+    hops from earlier turns of a checkpointed thread, so only a hop limit on the whole
+    `visited` log applies (EXEC_FALLBACK_MAX_HOPS, tightened by `max_hops`).
+    """
+    budget = _BUDGET.get()
+    if budget is None:
+        reason = _fallback_reason(state, max_hops)
+    else:
+        budget.observe_hops(len(state.get("visited") or ()))
+        reason = budget.stopped or budget.exhausted(max_hops)
+        if reason and budget.stopped is None:
+            budget.stopped = reason
+    if reason:
+        state["feedback"].append(f"⏹️ {router} stopped: {reason}. Routing to END.")
+        annotate(stop_reason=reason)
+        with _TOTALS_LOCK:
+            kind = reason.split(" (")[0]
+            _STOPS[kind] = _STOPS.get(kind, 0) + 1
+    return reason
+
+
+def _fallback_reason(state: dict, max_hops: Optional[int]) -> Optional[str]:
+    hop_limit = min(filter(None, (EXEC_FALLBACK_MAX_HOPS, max_hops)), default=0)
+    hops = len(state.get("visited") or ())
+    if hop_limit and hops >= hop_limit:
+        return f"hop limit ({hops}/{hop_limit}, no budget)"
+    return None
+
+
+def charge_llm(prompt: str, completion: str) -> None:
+    """Counts one LLM call against the current request's budget (no-op without one)."""
+    budget = _BUDGET.get()
+    if budget is not None:
+        from prompt_budget import estimate_tokens
+
+        budget.charge_llm(estimate_tokens(prompt), estimate_tokens(completion))
+
+
+# =========================
+# 4) Partial answers and controlled graphs
+# =========================
+def partial_answer(result: dict, reason: str, policy: str = EXEC_PARTIAL_ANSWER) -> Optional[str]:
+    """
+    What the caller gets when a request was stopped early:
+      - "outputs": the agents' answers gathered so far (previews), under a note saying why;
+      - "last": the last message as is;
+      - "none": nothing (the caller only sees `execution["stopped"]`).
+    """
+    if policy == "none":
+        return None
+    from agent_outputs import get_agent_outputs_grouped
+    from blob_store import strip_handle
+
+    messages = result.get("messages") or []
+    last = getattr(messages[-1], "content", "") if messages else ""
+    outputs = get_agent_outputs_grouped(result) if policy == "outputs" else {}
+    if not outputs:
+        return f"Stopped early ({reason}).\n{last}".rstrip()
+    lines = [f"- {node}: {strip_handle(text)}" for node, text in outputs.items()]
+    return "\n".join([f"Stopped early ({reason}). Partial results:"] + lines)
+
+
+def finish_run(result: Any, budget: ExecutionBudget) -> Any:
+    """Adds `execution` (budget consumption) and, after an early stop, `partial_answer` to a final state."""
+    if isinstance(result, dict):
+        result["execution"] = budget.report()
+        if budget.stopped:
+            answer = partial_answer(result, budget.stopped)
+            if answer is not None:
+                result["partial_answer"] = answer
+    return result
+
+
+_DONE = object()
+
+
+class ControlledGraph:
+    """
+    Compiled graph whose every run gets its own ExecutionBudget (`limits` override the
+    EXEC_* defaults). `invoke` / `ainvoke` return the final state with `execution`
+    and, when stopped early, `partial_answer`; streams run under the budget.
+    Everything else is delegated.
+    """
+
+    def __init__(self, graph: Any, **limits):
+        self.graph = graph
+        self.limits = limits
+
+    def invoke(self, input: Any, config: Optional[dict] = None, **kwargs) -> Any:
+        with execution_budget(**self.limits) as budget:
+            return finish_run(self.graph.invoke(input, config, **kwargs), budget)
+
+    async def ainvoke(self, input: Any, config: Optional[dict] = None, **kwargs) -> Any:
+        with execution_budget(**self.limits) as budget:
+            return finish_run(await self.graph.ainvoke(input, config, **kwargs), budget)
+
+    def _context(self) -> tuple[contextvars.Context, ExecutionBudget, bool]:
+        # the budget lives in a copy of the caller's context, entered only while the
+        # graph runs: nothing leaks into the caller's code between chunks
+        budget, owned = _BUDGET.get(), False
+        if budget is None:
+            budget, owned = ExecutionBudget(**self.limits), True
+        context = contextvars.copy_context()
+        context.run(_BUDGET.set, budget)
+        return context, budget, owned
+
+    def stream(self, input: Any, config: Optional[dict] = None, **kwargs) -> Iterator[Any]:
+        context, budget, owned = self._context()
+        chunks = context.run(self.graph.stream, input, config, **kwargs)
+        try:
+            while True:
+                try:
+                    chunk = context.run(next, chunks)
+                except StopIteration:
+                    return
+                yield chunk
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                context.run(close)
+            if owned:
+                _record_totals(budget)
+
+    async def astream(self, input: Any, config: Optional[dict] = None, **kwargs):
+        context, budget, owned = self._context()
+        chunks: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+        async def pump() -> None:
+            error = None
+            try:
+                async for chunk in self.graph.astream(input, config, **kwargs):
+                    await chunks.put((chunk, None))
+            except Exception as exc:
+                error = exc
+            await chunks.put((_DONE, error))
+
+        task = context.run(asyncio.ensure_future, pump())   # the task copies `context`
+        try:
+            while True:
+                chunk, error = await chunks.get()
+                if chunk is _DONE:
+                    if error is not None:
+                        raise error
+                    return
+                yield chunk
+        finally:
+            task.cancel()
+            if owned:
+                _record_totals(budget)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.graph, name)
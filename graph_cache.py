@@ -0,0 +1,120 @@
+# graph_cache.py
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from registry_service import RegistrySnapshot, get_registry
+from execution_controller import ControlledGraph   # per-request hop / deadline / LLM budget
+
+
+# =========================
+# 1) Configuration
+# =========================
+GRAPH_CACHE_SIZE = int(os.getenv("GRAPH_CACHE_SIZE", "16"))   # compiled graphs kept (variant x registry version)
+
+
+# =========================
+# 2) Variants
+# =========================
+# Builders import their modules on first use, so importing graph_cache stays cheap.
+def _supervisor(registry: RegistrySnapshot, checkpointer):
+    from supervisor import build_supervisor_graph
+    return build_supervisor_graph(checkpointer=checkpointer, registry=registry)
+
+
+def _supervisor_async(registry: RegistrySnapshot, checkpointer):
+    from supervisor import build_async_supervisor_graph
+    return build_async_supervisor_graph(checkpointer=checkpointer, registry=registry)
+
+
+def _speculative(registry: RegistrySnapshot, checkpointer):
+    from supervisor import build_supervisor_graph
+    return build_supervisor_graph(speculative=True, checkpointer=checkpointer, registry=registry)
+
+
+def _planner(registry: RegistrySnapshot, checkpointer):
+    from nodes_new import build_default_planner_graph
+    return build_default_planner_graph(checkpointer=checkpointer)
+
+
+def _planner_async(registry: RegistrySnapshot, checkpointer):
+    from nodes_new import build_default_planner_graph
+    return build_default_planner_graph(use_async=True, checkpointer=checkpointer)
+
+
+GRAPH_VARIANTS: dict[str, Callable[[RegistrySnapshot, Any], Any]] = {
+    "supervisor": _supervisor,
+    "supervisor_async": _supervisor_async,
+    "speculative": _speculative,
+    "planner": _planner,
+    "planner_async": _planner_async,
+}
+
+
+# =========================
+# 3) Memoized factory
+# =========================
+class GraphCache:
+    """
+    (variant, registry fingerprint, checkpointer) -> compiled graph.
+
+      - Each combination is compiled once; later calls return the same object.
+      - The registry fingerprint is a content hash, so a reverted registry edit
+        reuses the graph compiled for that content.
+      - At most `max_entries` graphs are kept (least recently used dropped).
+      - Graphs are returned as ControlledGraph: every run gets its own
+        ExecutionBudget and reports its consumption under `execution`.
+    """
+
+    def __init__(self, max_entries: int = GRAPH_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._graphs: "OrderedDict[tuple, tuple[Any, Any]]" = OrderedDict()   # key -> (graph, checkpointer)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "builds": 0, "evicted": 0}
+
+    def get(self, variant: str, registry: Optional[RegistrySnapshot] = None, checkpointer=None) -> Any:
+        build = GRAPH_VARIANTS.get(variant)
+        if build is None:
+            raise KeyError(f"Unknown graph variant '{variant}' (known: {', '.join(GRAPH_VARIANTS)})")
+        registry = registry or get_registry()
+        key = (variant, registry.fingerprint, id(checkpointer) if checkpointer is not None else None)
+        with self._lock:   # one compile per key, even when many requests arrive at once
+            entry = self._graphs.get(key)
+            if entry is not None:
+                self._graphs.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0]
+            graph = ControlledGraph(build(registry, checkpointer))
+            self._graphs[key] = (graph, checkpointer)   # keeps the checkpointer alive: its id stays unique
+            self._stats["builds"] += 1
+            while len(self._graphs) > self.max_entries:
+                self._graphs.popitem(last=False)
+                self._stats["evicted"] += 1
+            return graph
+
+    def clear(self) -> None:
+        with self._lock:
+            self._graphs.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "size": len(self._graphs)}
+
+
+_GRAPH_CACHE = GraphCache()
+
+
+def get_graph_cache() -> GraphCache:
+    return _GRAPH_CACHE
+
+
+def get_compiled_graph(variant: str = "supervisor", checkpointer=None, registry: Optional[RegistrySnapshot] = None) -> Any:
+    """Compiled graph for `variant` under the current registry version, built on first request."""
+    return _GRAPH_CACHE.get(variant, registry, checkpointer)
+
+
+def prebuild_graphs(variants: Optional[list[str]] = None) -> dict[str, Any]:
+    """Compiles `variants` (default: all) now, e.g. in a parent process before forking workers."""
+    return {variant: get_compiled_graph(variant) for variant in (variants or list(GRAPH_VARIANTS))}
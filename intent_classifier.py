@@ -0,0 +1,313 @@
+# intent_classifier.py
+
+import os
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+from typing import Callable, Iterable, Optional
+
+from plan_cache import query_tokens
+from tracing import annotate, record_cache
+
+
+# =========================
+# 1) Configuration
+# =========================
+INTENT_MODEL_DIR = os.getenv("INTENT_MODEL_DIR", os.path.join(os.path.dirname(__file__), "config"))
+INTENT_LOG_PATH = os.getenv("INTENT_LOG_PATH", "")                    # JSONL of LLM first-hop decisions, "" = off
+INTENT_THRESHOLD = float(os.getenv("INTENT_THRESHOLD", "0.85"))       # min probability to skip the LLM
+INTENT_DIMENSIONS = int(os.getenv("INTENT_DIMENSIONS", "4096"))       # hashed feature buckets
+INTENT_ENABLED = os.getenv("INTENT_ENABLED", "1") == "1"
+
+
+def intent_model_path(router: str) -> str:
+    """One model per router: `supervisor` predicts a node, `planner` a whole plan string."""
+    return os.path.join(INTENT_MODEL_DIR, f"intent_{router}.npz")
+
+
+# =========================
+# 2) Hashed features
+# =========================
+def intent_features(text: str) -> list[str]:
+    """Content-word unigrams + bigrams (numbers collapsed, as in the plan cache)."""
+    tokens = query_tokens(text)
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def hashed_features(text: str, dimensions: int) -> dict[int, float]:
+    """Signed feature hashing, L2-normalized: bucket -> value."""
+    vector: dict[int, float] = {}
+    for feature in intent_features(text):
+        h = zlib.crc32(feature.encode("utf-8"))
+        bucket = h % dimensions
+        vector[bucket] = vector.get(bucket, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+    norm = sum(v * v for v in vector.values()) ** 0.5 or 1.0
+    return {k: v / norm for k, v in vector.items()}
+
+
+# =========================
+# 3) Linear model
+# =========================
+class IntentClassifier:
+    """
+    Multinomial logistic regression over hashed unigram/bigram features (NumPy).
+
+      - `fit` trains with full-batch gradient descent + L2; a few thousand logged
+        decisions train in well under a second.
+      - `predict` gathers only the rows of the active buckets, so one prediction
+        costs tens of microseconds.
+      - `route` returns the label only when its probability clears `threshold`;
+        otherwise the caller asks the LLM.
+    """
+
+    def __init__(self, labels: list[str], weights, bias, dimensions: int = INTENT_DIMENSIONS,
+                 threshold: float = INTENT_THRESHOLD):
+        self.labels = list(labels)
+        self.weights = weights        # (dimensions, n_labels)
+        self.bias = bias              # (n_labels,)
+        self.dimensions = dimensions
+        self.threshold = threshold
+
+    # ---- training ----
+    @classmethod
+    def fit(
+        cls,
+        texts: list[str],
+        labels: list[str],
+        dimensions: int = INTENT_DIMENSIONS,
+        epochs: int = 300,
+        learning_rate: float = 2.0,
+        l2: float = 1e-4,
+        threshold: float = INTENT_THRESHOLD,
+    ) -> "IntentClassifier":
+        import numpy as np
+
+        if not texts:
+            raise ValueError("IntentClassifier.fit needs at least one example")
+        classes = sorted(set(labels))
+        index = {label: i for i, label in enumerate(classes)}
+        X = np.zeros((len(texts), dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for bucket, value in hashed_features(text, dimensions).items():
+                X[row, bucket] += value
+        Y = np.zeros((len(texts), len(classes)), dtype=np.float32)
+        Y[np.arange(len(texts)), [index[label] for label in labels]] = 1.0
+
+        W = np.zeros((dimensions, len(classes)), dtype=np.float32)
+        b = np.zeros(len(classes), dtype=np.float32)
+        for _ in range(epochs):
+            logits = X @ W + b
+            logits -= logits.max(axis=1, keepdims=True)
+            P = np.exp(logits)
+            P /= P.sum(axis=1, keepdims=True)
+            G = (P - Y) / len(texts)
+            W -= learning_rate * (X.T @ G + l2 * W)
+            b -= learning_rate * G.sum(axis=0)
+        return cls(classes, W, b, dimensions, threshold)
+
+    # ---- inference ----
+    def predict_proba(self, text: str) -> dict[str, float]:
+        import numpy as np
+
+        features = hashed_features(text, self.dimensions)
+        logits = self.bias.copy()
+        if features:
+            buckets = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+            values = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+            logits += values @ self.weights[buckets]
+        logits -= logits.max()
+        probs = np.exp(logits)
+        probs /= probs.sum()
+        return dict(zip(self.labels, probs.tolist()))
+
+    def predict(self, text: str, accept: Optional[Callable[[str], bool]] = None) -> tuple[Optional[str], float]:
+        """Most probable label (restricted to labels `accept` allows) and its probability."""
+        best, confidence = None, 0.0
+        for label, prob in self.predict_proba(text).items():
+            if prob > confidence and (accept is None or accept(label)):
+                best, confidence = label, prob
+        return best, confidence
+
+    def route(self, text: str, accept: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        label, confidence = self.predict(text, accept)
+        annotate(intent=label, intent_confidence=round(confidence, 3))
+        confident = label is not None and confidence >= self.threshold
+        record_cache("intent", confident)
+        return label if confident else None
+
+    # ---- persistence ----
+    def save(self, path: str) -> None:
+        import numpy as np
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:   # file handle: np.savez would append ".npz" to a bare path
+            np.savez(f, labels=np.array(self.labels), weights=self.weights, bias=self.bias,
+                     dimensions=np.array(self.dimensions), threshold=np.array(self.threshold))
+
+    @classmethod
+    def load(cls, path: str, threshold: Optional[float] = None) -> "IntentClassifier":
+        import numpy as np
+
+        with np.load(path) as data:
+            return cls(
+                [str(label) for label in data["labels"]], data["weights"], data["bias"],
+                int(data["dimensions"]), float(data["threshold"]) if threshold is None else threshold,
+            )
+
+
+# =========================
+# 4) Training data
+# =========================
+_LOG_LOCK = threading.Lock()
+
+
+def log_routing_decision(router: str, text: str, route: str) -> None:
+    """Appends one LLM-made first-hop decision to INTENT_LOG_PATH (no-op when unset)."""
+    if not INTENT_LOG_PATH or not text or not route:
+        return
+    line = json.dumps({"router": router, "text": text, "route": route, "ts": time.time()}, ensure_ascii=False)
+    with _LOG_LOCK, open(INTENT_LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def load_examples(log_paths: Iterable[str], router: str, registry: Optional[dict] = None) -> tuple[list[str], list[str]]:
+    """(texts, labels) from decision logs for `router`, plus each registry node's `prompt` description."""
+    texts, labels = [], []
+    for path in log_paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("router", router) == router:
+                    texts.append(record["text"])
+                    labels.append(record["route"])
+    for node, info in (registry or {}).items():
+        if info.get("prompt"):
+            texts.append(info["prompt"])
+            labels.append(node)
+    return texts, labels
+
+
+# =========================
+# 5) Shared classifiers
+# =========================
+_CLASSIFIERS: dict[str, Optional[IntentClassifier]] = {}
+_CLASSIFIERS_LOCK = threading.Lock()
+
+
+def get_intent_classifier(router: str) -> Optional[IntentClassifier]:
+    """The router's trained model, loaded once; None when disabled, untrained or NumPy is missing."""
+    if router not in _CLASSIFIERS:
+        with _CLASSIFIERS_LOCK:
+            if router not in _CLASSIFIERS:
+                classifier = None
+                path = intent_model_path(router)
+                if INTENT_ENABLED and os.path.exists(path):
+                    try:
+                        classifier = IntentClassifier.load(path)
+                    except ImportError:
+                        print("⚠️ NumPy not installed; first-hop intent classifier disabled.")
+                _CLASSIFIERS[router] = classifier
+    return _CLASSIFIERS[router]
+
+
+def set_intent_classifier(router: str, classifier: Optional[IntentClassifier]) -> Optional[IntentClassifier]:
+    """Installs (or disables, with None) the router's classifier. Returns the previous one."""
+    with _CLASSIFIERS_LOCK:
+        previous = _CLASSIFIERS.get(router)
+        _CLASSIFIERS[router] = classifier
+    return previous
+
+
+def classify_first_hop(router: str, text: str, accept: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+    """Confident local decision for the first hop, or None to defer to the LLM."""
+    classifier = get_intent_classifier(router)
+    if classifier is None or not text:
+        return None
+    return classifier.route(text, accept)
+
+
+# =========================
+# 6) Training / evaluation CLI
+# =========================
+def evaluate(classifier: IntentClassifier, texts: list[str], labels: list[str]) -> dict:
+    """Accuracy overall and on the confident (LLM-skipping) slice, coverage, per-prediction latency."""
+    latencies, correct, covered, covered_correct = [], 0, 0, 0
+    for text, label in zip(texts, labels):
+        start = time.perf_counter()
+        predicted, confidence = classifier.predict(text)
+        latencies.append(time.perf_counter() - start)
+        correct += predicted == label
+        if confidence >= classifier.threshold:
+            covered += 1
+            covered_correct += predicted == label
+    latencies.sort()
+    n = max(1, len(texts))
+    return {
+        "examples": len(texts),
+        "accuracy": correct / n,
+        "coverage": covered / n,                          # share of first hops that skip the LLM
+        "confident_accuracy": covered_correct / max(1, covered),
+        "p50_us": 1e6 * latencies[len(latencies) // 2] if latencies else 0.0,
+        "p99_us": 1e6 * latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] if latencies else 0.0,
+    }
+
+
+def _print_report(title: str, report: dict) -> None:
+    print(f"{title}: {report['examples']} examples")
+    print(f"  accuracy              {report['accuracy']:.3f}")
+    print(f"  coverage @ threshold  {report['coverage']:.3f}  (LLM skipped)")
+    print(f"  accuracy when used    {report['confident_accuracy']:.3f}")
+    print(f"  latency p50/p99       {report['p50_us']:.0f}µs / {report['p99_us']:.0f}µs")
+
+
+def main() -> None:
+    from agent_pool import load_registry
+
+    parser = argparse.ArgumentParser(description="Train / evaluate the first-hop intent classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train = sub.add_parser("train", help="fit a model from routing-decision logs")
+    train.add_argument("logs", nargs="+", help="JSONL decision logs (INTENT_LOG_PATH)")
+    train.add_argument("--router", default="supervisor", choices=["supervisor", "planner"])
+    train.add_argument("--out", help="model path (default: INTENT_MODEL_DIR/intent_<router>.npz)")
+    train.add_argument("--holdout", type=float, default=0.2, help="share of log examples held out for the report")
+    train.add_argument("--epochs", type=int, default=300)
+    train.add_argument("--threshold", type=float, default=INTENT_THRESHOLD)
+    train.add_argument("--seed", type=int, default=0)
+
+    report = sub.add_parser("evaluate", help="accuracy / coverage / latency of a saved model")
+    report.add_argument("logs", nargs="+")
+    report.add_argument("--router", default="supervisor", choices=["supervisor", "planner"])
+    report.add_argument("--model", help="model path (default: INTENT_MODEL_DIR/intent_<router>.npz)")
+    report.add_argument("--threshold", type=float)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        texts, labels = load_examples(args.logs, args.router)
+        pairs = list(zip(texts, labels))
+        random.Random(args.seed).shuffle(pairs)
+        held = int(len(pairs) * args.holdout)
+        test, fit = pairs[:held], pairs[held:]
+        seed_texts, seed_labels = load_examples([], args.router, load_registry())
+        classifier = IntentClassifier.fit(
+            [t for t, _ in fit] + seed_texts, [l for _, l in fit] + seed_labels,
+            epochs=args.epochs, threshold=args.threshold,
+        )
+        path = args.out or intent_model_path(args.router)
+        classifier.save(path)
+        print(f"Saved {args.router} classifier ({len(classifier.labels)} labels) to {path}")
+        if test:
+            _print_report("holdout", evaluate(classifier, [t for t, _ in test], [l for _, l in test]))
+    else:
+        classifier = IntentClassifier.load(args.model or intent_model_path(args.router), args.threshold)
+        texts, labels = load_examples(args.logs, args.router)
+        _print_report(args.router, evaluate(classifier, texts, labels))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+# llm_pool.py
+
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional, Any
+
+from pool_slots import Slots
+from tracing import span, annotate, add_queue_time, llm_call_attributes
+from streaming import streaming_enabled, stream_node, collect_llm_stream, acollect_llm_stream
+from execution_controller import charge_llm   # per-request LLM call / token budget
+
+
+# =========================
+# 1) Pool configuration
+# =========================
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "4"))
+LLM_POOL_MAX_USES = int(os.getenv("LLM_POOL_MAX_USES", "0"))            # 0 = unlimited
+LLM_POOL_MAX_AGE = float(os.getenv("LLM_POOL_MAX_AGE", "0"))            # seconds, 0 = unlimited
+LLM_POOL_ACQUIRE_TIMEOUT = float(os.getenv("LLM_POOL_ACQUIRE_TIMEOUT", "30"))
+LLM_BACKEND = os.getenv("LLM_BACKEND", "vertex")                        # "vertex" | "fake"
+
+
+# =========================
+# 2) Backends
+# =========================
+def vertex_model_factory():
+    """Builds one Gemini client through the project's Vertex wrapper."""
+    from LLM.Gemini import VertexAI
+
+    return VertexAI().getVertexModel()
+
+
+class FakeVertexModel:
+    """
+    Offline stand-in for `VertexAI().getVertexModel()`.
+
+      - `decisions`: a list of replies (cycled) or a callable prompt -> reply.
+      - `latency` / `jitter`: seconds slept per invoke (uniform jitter on top).
+      - `setup_latency`: seconds slept at construction, to model client/auth setup.
+      - `batch_item_latency`: extra seconds per prompt in a `batch` call (one round trip
+        of `latency` + this per item).
+      - `chunk_latency`: seconds per word after the first; `stream` yields the reply word by
+        word, `invoke` returns it after the same total time.
+    """
+
+    def __init__(
+        self,
+        decisions=None,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        setup_latency: float = 0.0,
+        batch_item_latency: float = 0.0,
+        chunk_latency: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        if setup_latency:
+            time.sleep(setup_latency)
+        self.decisions = decisions if decisions is not None else ["END"]
+        self.latency = latency
+        self.jitter = jitter
+        self.batch_item_latency = batch_item_latency
+        self.chunk_latency = chunk_latency
+        self.calls = 0
+        self.batches = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _next_reply(self, prompt: str) -> str:
+        with self._lock:
+            index = self.calls
+            self.calls += 1
+        if callable(self.decisions):
+            return self.decisions(prompt)
+        return self.decisions[index % len(self.decisions)]
+
+    def _delay(self) -> float:
+        return self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    @staticmethod
+    def _chunks(reply: str) -> list[str]:
+        words = reply.split(" ")
+        return [word + " " for word in words[:-1]] + [words[-1]]
+
+    def invoke(self, prompt: str) -> str:
+        reply = self._next_reply(prompt)
+        time.sleep(self._delay() + self.chunk_latency * (len(self._chunks(reply)) - 1))
+        return reply
+
+    async def ainvoke(self, prompt: str) -> str:
+        reply = self._next_reply(prompt)
+        await asyncio.sleep(self._delay() + self.chunk_latency * (len(self._chunks(reply)) - 1))
+        return reply
+
+    def stream(self, prompt: str):
+        time.sleep(self._delay())
+        for i, chunk in enumerate(self._chunks(self._next_reply(prompt))):
+            if i and self.chunk_latency:
+                time.sleep(self.chunk_latency)
+            yield chunk
+
+    async def astream(self, prompt: str):
+        await asyncio.sleep(self._delay())
+        for i, chunk in enumerate(self._chunks(self._next_reply(prompt))):
+            if i and self.chunk_latency:
+                await asyncio.sleep(self.chunk_latency)
+            yield chunk
+
+    def batch(self, prompts: list[str]) -> list[str]:
+        time.sleep(self._delay() + self.batch_item_latency * len(prompts))
+        with self._lock:
+            self.batches += 1
+        return [self._next_reply(prompt) for prompt in prompts]
+
+
+def fake_model_factory(**kwargs) -> Callable[[], FakeVertexModel]:
+    return lambda: FakeVertexModel(**kwargs)
+
+
+def default_model_factory():
+    if LLM_BACKEND == "fake":
+        return FakeVertexModel()
+    return vertex_model_factory()
+
+
+# =========================
+# 3) Model pool
+# =========================
+class _PooledModel:
+    __slots__ = ("model", "created_at", "uses")
+
+    def __init__(self, model: Any):
+        self.model = model
+        self.created_at = time.monotonic()
+        self.uses = 0
+
+
+class ModelPool:
+    """
+    Bounded pool of reusable model clients shared by every router.
+
+      - Clients are created lazily (or up-front via `warm_up`) up to `size`.
+      - `acquire()` blocks when all clients are checked out.
+      - A client is evicted when an invoke raises, when it exceeds `max_uses`
+        or `max_age`, or when the optional `health_check` rejects it.
+      - Sync and async callers share the same clients; async callers never block
+        the event loop while waiting for a free client.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any] = default_model_factory,
+        size: int = LLM_POOL_SIZE,
+        max_uses: int = LLM_POOL_MAX_USES,
+        max_age: float = LLM_POOL_MAX_AGE,
+        health_check: Optional[Callable[[Any], bool]] = None,
+        acquire_timeout: float = LLM_POOL_ACQUIRE_TIMEOUT,
+    ):
+        if size < 1:
+            raise ValueError("ModelPool size must be >= 1")
+        self.factory = factory
+        self.size = size
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.health_check = health_check
+        self.acquire_timeout = acquire_timeout
+
+        self._idle: deque[_PooledModel] = deque()
+        self._slots = Slots(size)   # shared by threads and event loops
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "evicted": 0, "invocations": 0, "batches": 0, "errors": 0, "waits": 0}
+
+    # ---- lifecycle ----
+    def _create(self) -> _PooledModel:
+        entry = _PooledModel(self.factory())
+        with self._lock:
+            self._stats["created"] += 1
+        return entry
+
+    def _is_stale(self, entry: _PooledModel) -> bool:
+        if self.max_uses and entry.uses >= self.max_uses:
+            return True
+        if self.max_age and time.monotonic() - entry.created_at >= self.max_age:
+            return True
+        return False
+
+    def _evict(self, entry: _PooledModel) -> None:
+        with self._lock:
+            self._stats["evicted"] += 1
+        close = getattr(entry.model, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
+
+    def warm_up(self, count: Optional[int] = None) -> int:
+        """Pre-creates idle clients (defaults to the full pool size). Returns how many were added."""
+        target = min(self.size, count if count is not None else self.size)
+        before = self._stats["created"]
+        held = []
+        try:
+            # Hold `target` slots at once so each checkout creates or revalidates a distinct client
+            for _ in range(target):
+                entry = self._checkout(blocking=False)
+                if entry is None:
+                    break
+                held.append(entry)
+        finally:
+            for entry in held:
+                entry.uses -= 1          # warm-up is not a real use
+                self._checkin(entry)
+        return self._stats["created"] - before
+
+    # ---- checkout / checkin ----
+    def _checkout(self, blocking: bool = True) -> Optional[_PooledModel]:
+        if not self._slots.try_acquire():
+            if not blocking:
+                return None
+            with self._lock:
+                self._stats["waits"] += 1
+            if not self._slots.acquire(self.acquire_timeout):
+                raise TimeoutError(f"No LLM client available within {self.acquire_timeout}s")
+        return self._ready_entry()
+
+    def _ready_entry(self) -> _PooledModel:
+        """A client for a held slot: an idle one that passes the checks, or a new one."""
+        try:
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    return self._create()
+                if self._is_stale(entry) or (self.health_check and not self.health_check(entry.model)):
+                    self._evict(entry)
+                    continue
+                return entry
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, entry: _PooledModel, healthy: bool = True) -> None:
+        try:
+            entry.uses += 1
+            if not healthy or self._is_stale(entry):
+                self._evict(entry)
+            else:
+                with self._lock:
+                    self._idle.append(entry)
+        finally:
+            self._slots.release()
+
+    async def _acheckout(self) -> _PooledModel:
+        """
+        Waits for a slot on the event loop (no thread is parked on it). A ready idle
+        client is taken right there; creating or health-checking one runs in a worker
+        thread, shielded so a cancelled caller still returns what the thread produced.
+        """
+        if not self._slots.try_acquire():
+            with self._lock:
+                self._stats["waits"] += 1
+            if not await self._slots.aacquire(self.acquire_timeout):
+                raise TimeoutError(f"No LLM client available within {self.acquire_timeout}s")
+        if self.health_check is None:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+                if entry is not None and self._is_stale(entry):
+                    self._idle.append(entry)   # evicted (closed) off the loop, below
+                    entry = None
+            if entry is not None:
+                return entry
+        checkout = asyncio.ensure_future(asyncio.to_thread(self._ready_entry))
+        try:
+            return await asyncio.shield(checkout)
+        except asyncio.CancelledError:
+            checkout.add_done_callback(self._return_unused)
+            raise
+
+    def _return_unused(self, checkout: asyncio.Future) -> None:
+        if not checkout.cancelled() and checkout.exception() is None:
+            entry = checkout.result()
+            entry.uses -= 1   # checked out for a caller that was already gone
+            self._checkin(entry)
+
+    @contextmanager
+    def acquire(self):
+        entry = self._checkout()
+        healthy = True
+        try:
+            yield entry.model
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            self._checkin(entry, healthy)
+
+    # ---- invoke helpers ----
+    def invoke(self, prompt: str) -> str:
+        waited = time.perf_counter()
+        entry = self._checkout()
+        add_queue_time(time.perf_counter() - waited)
+        healthy = True
+        try:
+            return entry.model.invoke(prompt)
+        except Exception:
+            healthy = False
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._stats["invocations"] += 1
+            self._checkin(entry, healthy)
+
+    async def ainvoke(self, prompt: str) -> str:
+        waited = time.perf_counter()
+        entry = await self._acheckout()
+        add_queue_time(time.perf_counter() - waited)
+        healthy = True
+        try:
+            ainvoke = getattr(entry.model, "ainvoke", None)
+            if ainvoke is not None:
+                return await ainvoke(prompt)
+            return await asyncio.to_thread(entry.model.invoke, prompt)
+        except Exception:
+            healthy = False
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._stats["invocations"] += 1
+            self._checkin(entry, healthy)
+
+    def stream(self, prompt: str):
+        """Completion chunks from the client's `stream` (the whole completion at once if it has none)."""
+        waited = time.perf_counter()
+        entry = self._checkout()
+        add_queue_time(time.perf_counter() - waited)
+        healthy = True
+        try:
+            stream = getattr(entry.model, "stream", None)
+            if stream is None:
+                yield entry.model.invoke(prompt)
+            else:
+                yield from stream(prompt)
+        except Exception:
+            healthy = False
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._stats["invocations"] += 1
+            self._checkin(entry, healthy)
+
+    async def astream(self, prompt: str):
+        waited = time.perf_counter()
+        entry = await self._acheckout()
+        add_queue_time(time.perf_counter() - waited)
+        healthy = True
+        try:
+            astream = getattr(entry.model, "astream", None)
+            if astream is None:
+                yield await asyncio.to_thread(entry.model.invoke, prompt)
+            else:
+                async for chunk in astream(prompt):
+                    yield chunk
+        except Exception:
+            healthy = False
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._stats["invocations"] += 1
+            self._checkin(entry, healthy)
+
+    def batch(self, prompts: list[str]) -> list[str]:
+        """One request for many prompts through the client's batch API (sequential invokes if it has none)."""
+        entry = self._checkout()
+        healthy = True
+        try:
+            batch = getattr(entry.model, "batch", None)
+            if batch is not None:
+                return list(batch(prompts))
+            return [entry.model.invoke(prompt) for prompt in prompts]
+        except Exception:
+            healthy = False
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._stats["invocations"] += len(prompts)
+                self._stats["batches"] += 1
+            self._checkin(entry, healthy)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "idle": len(self._idle), "size": self.size}
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for entry in idle:
+            self._evict(entry)
+
+
+# =========================
+# 4) Shared pool accessors
+# =========================
+_POOL: Optional[ModelPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_model_pool() -> ModelPool:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ModelPool()
+    return _POOL
+
+
+def set_model_pool(pool: Optional[ModelPool]) -> Optional[ModelPool]:
+    """Swaps the process-wide pool (e.g. for the fake backend). Returns the previous one."""
+    global _POOL
+    with _POOL_LOCK:
+        previous, _POOL = _POOL, pool
+    return previous
+
+
+def warm_up_model_pool(count: Optional[int] = None) -> int:
+    """Called by the graph builders so the first hop doesn't pay client setup."""
+    return get_model_pool().warm_up(count)
+
+
+def invoke_llm(prompt: str, node: Optional[str] = None) -> str:
+    """`node`: the calling router, named in streamed `on_llm_stream` events (else its tracing span)."""
+    streamed = streaming_enabled()                        # a caller is consuming stream_events: forward chunks
+    node = node or (stream_node() if streamed else None)  # the span is read before the llm span opens
+    with span("llm.invoke", "llm", **llm_call_attributes(prompt)):
+        if streamed:
+            completion = collect_llm_stream(get_model_pool().stream(prompt), node)
+        else:
+            completion = get_model_pool().invoke(prompt)
+        annotate(**llm_call_attributes(prompt, completion))
+        charge_llm(prompt, completion)
+        return completion
+
+
+async def ainvoke_llm(prompt: str, node: Optional[str] = None) -> str:
+    streamed = streaming_enabled()
+    node = node or (stream_node() if streamed else None)
+    with span("llm.invoke", "llm", **llm_call_attributes(prompt)):
+        if streamed:
+            completion = await acollect_llm_stream(get_model_pool().astream(prompt), node)
+        else:
+            completion = await get_model_pool().ainvoke(prompt)
+        annotate(**llm_call_attributes(prompt, completion))
+        charge_llm(prompt, completion)
+        return completion
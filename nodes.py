@@ -1,30 +1,91 @@
 # nodes.py
 
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, Iterable
+
 from langchain_core.messages import ToolMessage
-from src.agents import get_db_agent
-from supervisor import MultiAgentState
+from agent_outputs import agent_output_update
+from blob_store import externalize_messages   # large tool results -> preview + handle
+from agent_pool import get_agent_pool   # reused agent instances (registry `agent` -> src.agents factory)
+from registry_service import get_registry
+from tracing import traced
+from streaming import streaming_enabled
+
+if TYPE_CHECKING:  # supervisor imports AGENT_NODES from here; avoid the import cycle
+    from supervisor import MultiAgentState
+
+
+# Feedback prefix per node; registry nodes not listed here use "[<node_name>]"
+AGENT_LABELS = {"database_node": "[DB Agent]"}
 
 
-def database_node(state: MultiAgentState) -> MultiAgentState:
-    agent = get_db_agent()
-    result = agent.invoke(state)  # Expects {"messages": [...]}
+def _agent_update(node_name: str, state: MultiAgentState, result: dict) -> MultiAgentState:
+    label = AGENT_LABELS.get(node_name, f"[{node_name}]")
+
+    # Oversized tool results go to the blob store before they reach state, feedback or
+    # prompts; everything downstream carries the preview + handle
+    messages = externalize_messages(result["messages"], (ToolMessage,))
 
     # Safely extract first ToolMessage from result
     tool_messages = [
-        msg for msg in result["messages"] if isinstance(msg, ToolMessage)
+        msg for msg in messages if isinstance(msg, ToolMessage)
     ]
 
     if tool_messages:
         tool_msg = tool_messages[0]
-        feedback_msg = f"[DB Agent] Tool responded: {tool_msg.content}"
+        feedback_msg = f"{label} Tool responded: {tool_msg.content}"
     else:
-        feedback_msg = "[DB Agent] No ToolMessage found in response."
+        feedback_msg = f"{label} No ToolMessage found in response."
 
     # Return updated state
     return {
-        "messages": result["messages"],
-        "feedback": state["feedback"] + [feedback_msg],
-        "current_node": "database_node",
+        "messages": messages,
+        "feedback": [feedback_msg],             # appended by the state's append_log reducer
+        "current_node": node_name,
         "next_node": None,
-        "visited": state.get("visited", []) + ["database_node"]
+        "visited": [node_name],
+        "agent_outputs": agent_output_update(node_name, messages),
     }
+
+
+def make_agent_node(node_name: str):
+    def agent_node(state: MultiAgentState) -> MultiAgentState:
+        pool = get_agent_pool()
+        # Expects {"messages": [...]}; streamed runs forward the agent's chunks as they arrive
+        result = pool.stream(node_name, state) if streaming_enabled() else pool.invoke(node_name, state)
+        return _agent_update(node_name, state, result)
+
+    agent_node.__name__ = node_name
+    return traced(node_name)(agent_node)
+
+
+def make_async_agent_node(node_name: str):
+    async def aagent_node(state: MultiAgentState) -> MultiAgentState:
+        pool = get_agent_pool()   # non-blocking agent/tool calls
+        result = await (pool.astream(node_name, state) if streaming_enabled() else pool.ainvoke(node_name, state))
+        return _agent_update(node_name, state, result)
+
+    aagent_node.__name__ = f"a{node_name}"
+    return traced(node_name)(aagent_node)
+
+
+database_node = make_agent_node("database_node")
+adatabase_node = make_async_agent_node("database_node")
+
+
+# name -> node_fn for every registry entry, consumed by
+# supervisor.build_supervisor_graph / build_async_supervisor_graph
+AGENT_NODES = {name: make_agent_node(name) for name in get_registry()}
+AGENT_NODES["database_node"] = database_node
+ASYNC_AGENT_NODES = {name: make_async_agent_node(name) for name in get_registry()}
+ASYNC_AGENT_NODES["database_node"] = adatabase_node
+
+
+def agent_nodes_for(names: Iterable[str], prebuilt: dict[str, Callable] = AGENT_NODES) -> dict[str, Callable]:
+    """Node functions for `names`: the prebuilt ones, plus pooled nodes for agents added to the registry since import."""
+    return {name: prebuilt.get(name) or make_agent_node(name) for name in names}
+
+
+def async_agent_nodes_for(names: Iterable[str], prebuilt: dict[str, Callable] = ASYNC_AGENT_NODES) -> dict[str, Callable]:
+    return {name: prebuilt.get(name) or make_async_agent_node(name) for name in names}
@@ -1,45 +1,86 @@
-from langgraph.graph import StateGraph, END
-from src.state import MultiAgentState
-from planner_executor import planner_node, executor_node
+from planner_executor import (
+    MultiAgentState, planner_node, aplanner_node, executor_node,
+    make_parallel_stage_node, make_async_parallel_stage_node, PARALLEL_STAGE_NODE,
+)
 from src.nodes import database_node, github_node, knowledge_node
+from llm_pool import warm_up_model_pool
+from registry_service import bind_registry
+from agent_outputs import with_output_index
+from tracing import traced
 
-# -----------------------------
-# Build the Graph
-# -----------------------------
-builder = StateGraph(MultiAgentState)
-
-# Add planner and executor nodes
-builder.add_node("planner_node", planner_node)
-builder.add_node("executor_node", executor_node)
-
-# Add actual worker nodes (they run the logic, based on state["next_node"])
-builder.add_node("database_node", database_node)
-builder.add_node("github_node", github_node)
-builder.add_node("knowledge_node", knowledge_node)
-
-# -----------------------------
-# Set Entry Point
-# -----------------------------
-builder.set_entry_point("planner_node")
-
-# -----------------------------
-# Define Flow
-# -----------------------------
-# Planner → Executor
-builder.add_edge("planner_node", "executor_node")
-
-# Executor → next selected agent
-builder.add_conditional_edges(
-    "executor_node",
-    lambda state: state.get("next_node", "END")
-)
+# Each worker also records its answer in state["agent_outputs"] for the routers, and runs in a span
+WORKER_NODES = {
+    name: traced(name)(with_output_index(name, node_fn))
+    for name, node_fn in (
+        ("database_node", database_node),
+        ("github_node", github_node),
+        ("knowledge_node", knowledge_node),
+    )
+}
+
+
+def build_planner_graph(planner, parallel_stage, worker_nodes=WORKER_NODES, checkpointer=None):
+    from langgraph.graph import StateGraph   # heavy: loaded when a graph is built, not at import
+    from checkpoint import get_checkpointer
+
+    # -----------------------------
+    # Build the Graph
+    # -----------------------------
+    builder = StateGraph(MultiAgentState)
+
+    # Add planner and executor nodes; the planner only plans with agents this graph has nodes for
+    builder.add_node("planner_node", bind_registry(planner, worker_nodes))
+    builder.add_node("executor_node", executor_node)
+
+    # Add actual worker nodes (they run the logic, based on state["next_node"])
+    for node_name, node_fn in worker_nodes.items():
+        builder.add_node(node_name, node_fn)
+
+    # Independent plan steps ("database_node | github_node") fan out here and run concurrently
+    builder.add_node(PARALLEL_STAGE_NODE, parallel_stage)
+
+    # -----------------------------
+    # Set Entry Point
+    # -----------------------------
+    builder.set_entry_point("planner_node")
+
+    # -----------------------------
+    # Define Flow
+    # -----------------------------
+    # Planner → Executor
+    builder.add_edge("planner_node", "executor_node")
+
+    # Executor → next selected agent
+    builder.add_conditional_edges(
+        "executor_node",
+        lambda state: state.get("next_node", "END")
+    )
+
+    # Each agent returns to executor to continue the plan
+    for node_name in worker_nodes:
+        builder.add_edge(node_name, "executor_node")
+    builder.add_edge(PARALLEL_STAGE_NODE, "executor_node")
+
+    # -----------------------------
+    # Compile Graph
+    # -----------------------------
+    warm_up_model_pool()  # planner's first LLM call reuses a ready client
+    # Durable state per thread_id (CHECKPOINT_PATH or an explicit saver): a crashed run resumes
+    # from the last completed node instead of re-paying for the plan and finished agents
+    return builder.compile(checkpointer=checkpointer or get_checkpointer())
+
+
+def build_default_planner_graph(use_async: bool = False, checkpointer=None):
+    if use_async:
+        # Async variant for ainvoke/astream: the planner awaits the LLM and parallel stages are
+        # gathered on the event loop (sync workers are offloaded to threads by LangGraph / the stage node).
+        return build_planner_graph(aplanner_node, make_async_parallel_stage_node(WORKER_NODES), checkpointer=checkpointer)
+    return build_planner_graph(planner_node, make_parallel_stage_node(WORKER_NODES), checkpointer=checkpointer)
 
-# Each agent returns to executor to continue the plan
-builder.add_edge("database_node", "executor_node")
-builder.add_edge("github_node", "executor_node")
-builder.add_edge("knowledge_node", "executor_node")
 
-# -----------------------------
-# Compile Graph
-# -----------------------------
-graph = builder.compile()
+def __getattr__(name):
+    # `graph` / `async_graph` are compiled on first access (not at import) and shared via graph_cache
+    if name in ("graph", "async_graph"):
+        from graph_cache import get_compiled_graph
+        return get_compiled_graph("planner" if name == "graph" else "planner_async")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,288 @@
+# plan_cache.py
+
+import os
+import re
+import json
+import math
+import time
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Iterable, Any
+
+from tracing import record_cache
+
+
+# =========================
+# 1) Configuration
+# =========================
+PLAN_TEMPLATES_PATH = os.getenv(
+    "PLAN_TEMPLATES_PATH",
+    os.path.join(os.path.dirname(__file__), "config", "plan_templates.json"),
+)
+SHIPPED_PLAN_TEMPLATES_PATH = os.path.join(os.path.dirname(__file__), "plan_templates.json")   # used when the above isn't deployed
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "512"))
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL", "86400"))            # seconds, 0 = no expiry
+PLAN_CACHE_THRESHOLD = float(os.getenv("PLAN_CACHE_THRESHOLD", "0.8"))  # min similarity for reuse
+PLAN_CACHE_MATCHER = os.getenv("PLAN_CACHE_MATCHER", "tokens")          # "tokens" | "hashing"
+
+
+# =========================
+# 2) Query signature
+# =========================
+_WORD = re.compile(r"[a-z0-9_]+")
+_STOPWORDS = frozenset(
+    "a an the and or of for to in on at by with from is are was were be can could "
+    "you your me my please i it its this that what whats do does how".split()
+)
+
+
+def query_tokens(text: str) -> list[str]:
+    """Lowercased content words; numbers collapse to <num> so 'record 123' ~ 'record 456'."""
+    tokens = []
+    for word in _WORD.findall((text or "").lower()):
+        if word in _STOPWORDS:
+            continue
+        tokens.append("<num>" if word.isdigit() else word)
+    return tokens
+
+
+def query_signature(text: str) -> str:
+    return " ".join(sorted(set(query_tokens(text))))
+
+
+# =========================
+# 3) Similarity matchers
+# =========================
+class TokenSetMatcher:
+    """Jaccard overlap of content-word sets."""
+
+    def vectorize(self, text: str) -> frozenset:
+        return frozenset(query_tokens(text))
+
+    def similarity(self, a: frozenset, b: frozenset) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+
+class HashingVectorMatcher:
+    """Cosine similarity of hashed unigram+bigram counts — a cheap local embedding, no model needed."""
+
+    def __init__(self, dimensions: int = 1024):
+        self.dimensions = dimensions
+
+    def vectorize(self, text: str) -> dict[int, float]:
+        tokens = query_tokens(text)
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector: dict[int, float] = {}
+        for feature in features:
+            bucket = zlib.crc32(feature.encode("utf-8")) % self.dimensions
+            vector[bucket] = vector.get(bucket, 0.0) + 1.0
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {k: v / norm for k, v in vector.items()}
+
+    def similarity(self, a: dict[int, float], b: dict[int, float]) -> float:
+        if len(a) > len(b):
+            a, b = b, a
+        return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+MATCHERS = {"tokens": TokenSetMatcher, "hashing": HashingVectorMatcher}
+
+
+# =========================
+# 4) Plan cache
+# =========================
+def as_stages(plan: Iterable[Any]) -> tuple[tuple[str, ...], ...]:
+    """['a', 'b'] -> (('a',), ('b',)); nested lists are stages of independent steps."""
+    return tuple(
+        (step,) if isinstance(step, str) else tuple(step)
+        for step in plan
+        if step
+    )
+
+
+class _PlanEntry:
+    __slots__ = ("plan", "vector", "stored_at", "pinned")
+
+    def __init__(self, plan: tuple, vector: Any, stored_at: float, pinned: bool):
+        self.plan = plan
+        self.vector = vector
+        self.stored_at = stored_at
+        self.pinned = pinned
+
+
+_WARNED_PATHS: set[str] = set()   # one warning per missing path, not per PlanCache
+
+
+def _templates_file(path: str) -> Optional[str]:
+    if os.path.exists(path):
+        return path
+    shipped = SHIPPED_PLAN_TEMPLATES_PATH if os.path.exists(SHIPPED_PLAN_TEMPLATES_PATH) else None
+    if path not in _WARNED_PATHS:
+        _WARNED_PATHS.add(path)
+        print(f"⚠️ Plan templates not found at {path}; "
+              + (f"warm-starting from the shipped {shipped}" if shipped else "the plan cache starts empty"))
+    return shipped
+
+
+class PlanCache:
+    """
+    Query signature -> validated plan, stored as stages (lists of steps that may run in parallel).
+
+      - Exact signature hit first, then the best similarity match above `threshold`.
+      - At most `max_entries` learned plans (LRU), each expiring after `ttl` seconds.
+      - Templates from the warm-start file are pinned: never evicted, never expire.
+    """
+
+    def __init__(
+        self,
+        matcher: Any = None,
+        threshold: float = PLAN_CACHE_THRESHOLD,
+        max_entries: int = PLAN_CACHE_SIZE,
+        ttl: float = PLAN_CACHE_TTL,
+        warm_start_path: Optional[str] = PLAN_TEMPLATES_PATH,
+    ):
+        self.matcher = matcher or MATCHERS[PLAN_CACHE_MATCHER]()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries: "OrderedDict[str, _PlanEntry]" = OrderedDict()
+        self._learned = 0
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "evicted": 0, "expired": 0}
+
+        templates_path = _templates_file(warm_start_path) if warm_start_path else None
+        if templates_path:
+            self.load_templates(templates_path)
+
+    def load_templates(self, path: str) -> int:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        templates = data.get("templates", [])
+        for template in templates:
+            self._put(template["query"], template["plan"], pinned=True)
+        return len(templates)
+
+    def _expired(self, entry: _PlanEntry) -> bool:
+        return not entry.pinned and bool(self.ttl) and time.time() - entry.stored_at >= self.ttl
+
+    def _put(self, query: str, plan: Iterable[Any], pinned: bool = False) -> None:
+        signature = query_signature(query)
+        with self._lock:
+            previous = self._entries.pop(signature, None)
+            if previous is not None and not previous.pinned:
+                self._learned -= 1
+            if previous is not None and previous.pinned and not pinned:
+                # never let a learned plan replace a curated template
+                self._entries[signature] = previous
+                return
+            self._entries[signature] = _PlanEntry(
+                as_stages(plan), self.matcher.vectorize(query), time.time(), pinned
+            )
+            if not pinned:
+                self._learned += 1
+                self._evict()
+
+    def _evict(self) -> None:
+        if self._learned <= self.max_entries:
+            return
+        for signature, entry in list(self._entries.items()):
+            if not entry.pinned:
+                del self._entries[signature]
+                self._learned -= 1
+                self._stats["evicted"] += 1
+                if self._learned <= self.max_entries:
+                    return
+
+    def store(self, query: str, plan: Iterable[Any]) -> None:
+        """Remember a plan (flat steps or stages) that passed registry validation."""
+        plan = list(plan)
+        if plan:
+            self._put(query, plan)
+
+    def lookup(self, query: str, available: Optional[Iterable[str]] = None) -> Optional[list[list[str]]]:
+        """
+        Returns the cached plan stages restricted to `available` agents, or None on a
+        miss (including when none of the cached steps are still available).
+        """
+        plan = self._lookup(query, available)
+        record_cache("plan", plan is not None)
+        return plan
+
+    def _lookup(self, query: str, available: Optional[Iterable[str]]) -> Optional[list[list[str]]]:
+        allowed = set(available) if available is not None else None
+        signature = query_signature(query)
+
+        with self._lock:
+            entry = self._entries.get(signature)
+            if entry is not None and self._expired(entry):
+                del self._entries[signature]
+                self._learned -= 1
+                self._stats["expired"] += 1
+                entry = None
+            kind = "exact_hits"
+
+            if entry is None:
+                vector = self.matcher.vectorize(query)
+                best_score, best_signature = 0.0, None
+                for candidate_signature, candidate in self._entries.items():
+                    if self._expired(candidate):
+                        continue
+                    score = self.matcher.similarity(vector, candidate.vector)
+                    if score > best_score:
+                        best_score, best_signature = score, candidate_signature
+                if best_signature is not None and best_score >= self.threshold:
+                    signature, entry, kind = best_signature, self._entries[best_signature], "similar_hits"
+
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            plan = [
+                kept
+                for stage in entry.plan
+                if (kept := [step for step in stage if allowed is None or step in allowed])
+            ]
+            if not plan:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(signature)
+            self._stats[kind] += 1
+            return plan
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self._stats["exact_hits"] + self._stats["similar_hits"]
+            lookups = hits + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "learned": self._learned,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+
+# =========================
+# 5) Shared cache
+# =========================
+_PLAN_CACHE: Optional[PlanCache] = None
+_PLAN_CACHE_LOCK = threading.Lock()
+
+
+def get_plan_cache() -> PlanCache:
+    global _PLAN_CACHE
+    if _PLAN_CACHE is None:
+        with _PLAN_CACHE_LOCK:
+            if _PLAN_CACHE is None:
+                _PLAN_CACHE = PlanCache()
+    return _PLAN_CACHE
+
+
+def set_plan_cache(cache: Optional[PlanCache]) -> Optional[PlanCache]:
+    global _PLAN_CACHE
+    with _PLAN_CACHE_LOCK:
+        previous, _PLAN_CACHE = _PLAN_CACHE, cache
+    return previous
@@ -1,31 +1,43 @@
-import os
-import json
-from typing import Optional, Dict, Any
+import asyncio
+import contextvars
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from collections.abc import Set as AbstractSet
+from typing import Optional, Dict, Any, Callable
 from typing_extensions import TypedDict, Annotated
 
 from langgraph.schema import BaseMessage, HumanMessage, ToolMessage, AIMessage
-from langgraph.prebuilt import add_messages
-from LLM.Gemini import VertexAI
+from agent_outputs import get_agent_outputs_grouped, merge_agent_outputs
+from state_logs import AppendLog, append_log, log_delta, log_members
+from compaction import add_compacted_messages   # add_messages + history compaction / spill
+from llm_pool import invoke_llm, ainvoke_llm
+from plan_cache import get_plan_cache
+from prompt_budget import PromptBudget, aprepare, budgeted_output_summary, log_savings
+from prompt_templates import PromptTemplate
+from registry_service import get_registry
+from intent_classifier import classify_first_hop, log_routing_decision
+from tracing import traced
+from execution_controller import should_stop
+from route_parser import parse_plan, resolve_plan, aresolve_plan
 
 # -----------------------------
-# 🧠 Load Agent Registry
+# 🧠 Agent Registry: registry_service.get_registry() (hot-reloaded snapshot per decision)
 # -----------------------------
-REGISTRY_PATH = os.path.join(os.path.dirname(__file__), "config", "agent_registry.json")
-with open(REGISTRY_PATH, "r", encoding="utf-8") as f:
-    AGENT_REGISTRY = json.load(f)
 
 
 # -----------------------------
 # 📦 Shared State Definition
 # -----------------------------
 class MultiAgentState(TypedDict):
-    messages: Annotated[list[BaseMessage], add_messages]
-    feedback: list[str]
+    messages: Annotated[list[BaseMessage], add_compacted_messages]
+    feedback: Annotated[list[str], append_log]   # nodes return only the lines they add
     current_node: Optional[str]
     next_node: Optional[str]
-    visited: list[str]
+    visited: Annotated[list[str], append_log]    # nodes return only the nodes they add; O(1) `in`
+    agent_outputs: Annotated[dict[str, str], merge_agent_outputs]   # node -> first output, kept by the reducer
     plan: Optional[list[str]]
-    current_step: Optional[int]
+    plan_stages: Optional[list[list[str]]]   # steps within a stage are independent
+    current_step: Optional[int]              # index into plan_stages
 
 
 # -----------------------------
@@ -39,57 +51,12 @@ def get_last_user_input(messages: list[BaseMessage]) -> str:
 
 
 # -----------------------------
-# 🧾 Output summary for prompt
+# 🧠 LLM plan (cache miss path)
 # -----------------------------
-def get_agent_outputs_grouped(state: MultiAgentState) -> dict[str, str]:
-    outputs = {}
-    visited = state.get("visited", [])
-
-    tool_ai_messages = [msg for msg in state["messages"] if isinstance(msg, (ToolMessage, AIMessage))]
-
-    for i, msg in enumerate(tool_ai_messages):
-        if i < len(visited):
-            node = visited[i]
-            content = msg.content.strip()
-            if content and node not in outputs:
-                outputs[node] = content
-    return outputs
-
-
-# -----------------------------
-# 🧠 Planner Node (LLM makes a full plan)
-# -----------------------------
-def planner_node(state: MultiAgentState) -> MultiAgentState:
-    user_input = get_last_user_input(state["messages"])
-    visited = set(state.get("visited", []))
-
-    available_agents = [name for name in AGENT_REGISTRY if name not in visited]
-    if not available_agents:
-        state["feedback"].append("All agents visited. Routing to END.")
-        state["plan"] = []
-        state["current_step"] = 0
-        state["next_node"] = "END"
-        return state
-
-    agent_descriptions = "\n".join(
-        f"- {name}: {AGENT_REGISTRY[name]['prompt']}"
-        for name in available_agents
-    )
-
-    outputs_by_agent = get_agent_outputs_grouped(state)
-    output_summary = "\n".join(
-        f"- {agent}: {response}" for agent, response in outputs_by_agent.items()
-    ) or "No agent responses yet."
-
-    # 🔍 Refined Prompt
-    prompt = f"""
-You are the planner in a multi-agent system.
-
-User originally asked:
-{user_input}
-
-Agent responses so far:
-{output_summary}
+# 🔍 Refined Prompt — static instructions/examples first (prefix-cacheable), request data last
+PLANNER_PROMPT = PromptTemplate(
+    name="planner",
+    prefix="""You are the planner in a multi-agent system.
 
 Agents you can choose from:
 {agent_descriptions}
@@ -100,50 +67,287 @@ Your task is to decide which agents are absolutely necessary to complete the tas
 ❌ Do NOT include agents unless they are relevant to the user’s query.
 ✅ If the task is already answered, return: END
 
-Reply ONLY with a comma-separated list of agent names (e.g., knowledge_node, github_node).
+Reply ONLY with a comma-separated list of agent names (e.g., knowledge_node, github_node),
+using only: {agent_names}, END
+If steps don't depend on each other's output, join them with " | " so they run in parallel.
 
 Examples:
 - User: "What is GitHub?" → Return: knowledge_node
 - User: "Fetch issues from GitHub repo" → Return: github_node
 - User: "Find DB record and check for GitHub repo" → Return: database_node, github_node
+- User: "Get record 42 and the star count of repo X" → Return: database_node | github_node
 - User: "Explain what’s in the KB" → Return: knowledge_node
 - Task already answered → Return: END
-""".strip()
 
-    plan_text = VertexAI().getVertexModel().invoke(prompt).strip().lower()
+""",
+    suffix="""User originally asked:
+{user_input}
+
+Agent responses so far:
+{output_summary}""",
+)
+
+
+def build_planner_prompt(state: MultiAgentState, user_input: str, available_agents: list[str]) -> str:
+    budget = PromptBudget()
+    output_summary = budgeted_output_summary(budget, get_agent_outputs_grouped(state))
+
+    prompt = get_registry().templates.render(
+        PLANNER_PROMPT,
+        available_agents,
+        user_input=budget.fit("user_input", user_input),
+        output_summary=output_summary,
+    )
+    log_savings("Planner", budget.finish())
+    return prompt
+
+
+# LLM stream events name the planner explicitly (the tracing span is absent with TRACING_ENABLED=0)
+_ask = partial(invoke_llm, node="planner_node")
+_aask = partial(ainvoke_llm, node="planner_node")
+
+
+def plan_with_llm(state: MultiAgentState, user_input: str, available_agents: list[str]) -> list[list[str]]:
+    prompt = build_planner_prompt(state, user_input, available_agents)
+    plan_text = _ask(prompt).strip()
+    print("🧠 Planner LLM returned:", plan_text)
+    return resolve_plan("planner", prompt, plan_text, get_registry().names, _ask)
+
+
+async def aplan_with_llm(state: MultiAgentState, user_input: str, available_agents: list[str]) -> list[list[str]]:
+    prompt = await aprepare(build_planner_prompt, state, user_input, available_agents)
+    plan_text = (await _aask(prompt)).strip()
     print("🧠 Planner LLM returned:", plan_text)
+    return await aresolve_plan("planner", prompt, plan_text, get_registry().names, _aask)
+
+
+def parse_plan_stages(plan_text: str) -> list[list[str]]:
+    """'a | b, c' -> [['a', 'b'], ['c']] — commas order stages, '|' marks independent steps (route_parser.parse_plan)."""
+    return parse_plan(plan_text, get_registry().names) or []
+
+
+# -----------------------------
+# 🧠 Planner Node (LLM makes a full plan)
+# -----------------------------
+def _planning_inputs(state: MultiAgentState) -> tuple[str, AbstractSet[str], list[str]]:
+    user_input = get_last_user_input(state["messages"])
+    visited = log_members(state.get("visited"))
+    available_agents = [name for name in get_registry().names if name not in visited]
+    return user_input, visited, available_agents
+
 
-    plan = [step.strip() for step in plan_text.split(",") if step.strip() in AGENT_REGISTRY]
-    state["plan"] = plan
-    state["current_step"] = 0
+def _end_without_plan(feedback: list[str]) -> dict:
+    return {"feedback": feedback, "plan": [], "plan_stages": [], "current_step": 0, "next_node": "END"}
+
+
+def _all_agents_visited(feedback: list[str]) -> dict:
+    feedback.append("All agents visited. Routing to END.")
+    return _end_without_plan(feedback)
+
+
+def _cached_plan(feedback: list[str], user_input: str, visited: AbstractSet[str], available_agents: list[str]) -> Optional[list[list[str]]]:
+    # ♻️ Fresh request: reuse a validated plan for the same/near-duplicate question
+    stages = get_plan_cache().lookup(user_input, available_agents) if not visited else None
+    if stages:
+        feedback.append(f"Planner reused cached plan: {stages}")
+    return stages
+
+
+def _classified_plan(feedback: list[str], user_input: str, visited: AbstractSet[str]) -> Optional[list[list[str]]]:
+    # 🏷️ Fresh request, cache miss: a confident local classifier plans without the LLM
+    if visited:
+        return None
+    label = classify_first_hop("planner", user_input, lambda plan: bool(parse_plan_stages(plan)))
+    if not label:
+        return None
+    stages = parse_plan_stages(label)
+    feedback.append(f"Planner used classifier plan: {stages}")
+    return stages
+
+
+def _remember_plan(user_input: str, visited: AbstractSet[str], stages: list[list[str]]) -> None:
+    if stages and not visited:
+        get_plan_cache().store(user_input, stages)
+        # LLM-made first-hop plans are the classifier's training data
+        log_routing_decision("planner", user_input, ", ".join(" | ".join(stage) for stage in stages))
+
+
+def _apply_plan(feedback: list[str], stages: list[list[str]]) -> dict:
+    plan = [step for stage in stages for step in stage]
+    update = {"feedback": feedback, "plan": plan, "plan_stages": stages, "current_step": 0}
 
     if not plan:
-        state["feedback"].append("Planner could not generate a valid plan. Routing to END.")
-        state["next_node"] = "END"
+        feedback.append("Planner could not generate a valid plan. Routing to END.")
+        update["next_node"] = "END"
     else:
-        state["feedback"].append(f"Planner created plan: {plan}")
+        feedback.append(f"Planner created plan: {plan}")
+        if len(stages) < len(plan):
+            feedback.append(f"⚡ Independent steps run in parallel: {stages}")
         if len(plan) > 2:
-            state["feedback"].append("⚠️ Plan has multiple steps. Review if all are needed.")
+            feedback.append("⚠️ Plan has multiple steps. Review if all are needed.")
 
-    return state
+    return update
+
+
+# The planner returns only its update: this hop's feedback lines (added by the
+# append_log reducer) and the plan fields, never the mutated state
+@traced("planner_node", kind="router")
+def planner_node(state: MultiAgentState) -> dict:
+    feedback: list[str] = []
+    if should_stop({**state, "feedback": feedback}, "Planner"):
+        return _end_without_plan(feedback)
+    user_input, visited, available_agents = _planning_inputs(state)
+    if not available_agents:
+        return _all_agents_visited(feedback)
+
+    stages = _cached_plan(feedback, user_input, visited, available_agents)
+    if stages is None:
+        stages = _classified_plan(feedback, user_input, visited)
+    if stages is None:
+        stages = plan_with_llm(state, user_input, available_agents)
+        _remember_plan(user_input, visited, stages)
+    return _apply_plan(feedback, stages)
+
+
+@traced("planner_node", kind="router")
+async def aplanner_node(state: MultiAgentState) -> dict:
+    feedback: list[str] = []
+    if should_stop({**state, "feedback": feedback}, "Planner"):
+        return _end_without_plan(feedback)
+    user_input, visited, available_agents = _planning_inputs(state)
+    if not available_agents:
+        return _all_agents_visited(feedback)
+
+    stages = _cached_plan(feedback, user_input, visited, available_agents)
+    if stages is None:
+        stages = _classified_plan(feedback, user_input, visited)
+    if stages is None:
+        stages = await aplan_with_llm(state, user_input, available_agents)
+        _remember_plan(user_input, visited, stages)
+    return _apply_plan(feedback, stages)
 
 
 # -----------------------------
 # 🧭 Executor Node (routes to next)
 # -----------------------------
-def executor_node(state: MultiAgentState) -> MultiAgentState:
-    plan = state.get("plan", [])
+PARALLEL_STAGE_NODE = "parallel_stage_node"
+
+
+@traced("executor_node", kind="router")
+def executor_node(state: MultiAgentState) -> dict:
+    stages = state.get("plan_stages") or [[step] for step in state.get("plan") or []]
     step = state.get("current_step", 0)
 
-    if step >= len(plan):
+    if step >= len(stages):
         print("✅ Plan completed.")
-        state["next_node"] = "END"
-        return state
-
-    next_node = plan[step]
-    state["next_node"] = next_node
-    state["current_node"] = next_node
-    state["visited"].append(next_node)
-    state["current_step"] += 1
-    print(f"🚀 Executor routing to: {next_node}")
-    return state
+        return {"next_node": "END"}
+    feedback: list[str] = []
+    if should_stop({**state, "feedback": feedback}, "Executor"):   # remaining stages are skipped
+        return {"feedback": feedback, "next_node": "END"}
+
+    stage = stages[step]
+    next_node = stage[0] if len(stage) == 1 else PARALLEL_STAGE_NODE
+    print(f"🚀 Executor routing to: {next_node} {stage if len(stage) > 1 else ''}".rstrip())
+    # an update, not the mutated state: `visited` gets the stage through its reducer
+    return {"next_node": next_node, "current_node": next_node, "visited": list(stage), "current_step": step + 1}
+
+
+# -----------------------------
+# ⚡ Parallel stage (fan-out / deterministic merge)
+# -----------------------------
+def _current_stage(state: MultiAgentState) -> list[str]:
+    # executor_node has already advanced current_step past this stage
+    return (state.get("plan_stages") or [])[state["current_step"] - 1]
+
+
+def _worker_state(state: MultiAgentState, node_name: str) -> MultiAgentState:
+    # Private copies of the list fields, so workers never see each other's writes
+    return {
+        **state,
+        "messages": list(state["messages"]),
+        "feedback": AppendLog(state["feedback"]),
+        "visited": AppendLog(state.get("visited", [])),
+        "current_node": node_name,
+    }
+
+
+def _merge_stage_results(state: MultiAgentState, stage: list[str], workers: list[MultiAgentState],
+                         results: list[MultiAgentState]) -> MultiAgentState:
+    """
+    Merges worker results in plan order — not completion order — so every run produces
+    the same state. `workers` are the private states the results came from: a worker
+    that appended to its own logs and returned them added the items past the shared prefix.
+    """
+    base_messages = state["messages"]
+    base_feedback = state["feedback"]
+    base_visited = state.get("visited", [])
+
+    known_ids = {id(m) for m in base_messages} | {m.id for m in base_messages if getattr(m, "id", None)}
+    # Only the stage's additions are returned; the append_log reducers extend the logs
+    messages, feedback, visited = [], [], []
+    agent_outputs: dict[str, str] = {}
+    for worker, result in zip(workers, results):
+        agent_outputs = merge_agent_outputs(agent_outputs, result.get("agent_outputs"))
+        for msg in result.get("messages", []):
+            if id(msg) in known_ids or (getattr(msg, "id", None) and msg.id in known_ids):
+                continue
+            known_ids.add(id(msg))
+            messages.append(msg)
+        feedback += log_delta(worker["feedback"], result.get("feedback"), len(base_feedback))
+        visited += log_delta(worker["visited"], result.get("visited"), len(base_visited))
+
+    return {
+        "messages": messages,
+        "feedback": feedback + [f"⚡ Parallel stage finished: {stage}"],
+        "visited": visited,
+        "agent_outputs": agent_outputs,
+        "current_node": stage[-1],
+        "next_node": None,
+    }
+
+
+def make_parallel_stage_node(
+    node_fns: Dict[str, Callable[[MultiAgentState], MultiAgentState]],
+    max_workers: Optional[int] = None,
+) -> Callable[[MultiAgentState], MultiAgentState]:
+    """
+    Builds the node that runs every step of the current stage concurrently on a
+    thread pool. The stage takes as long as its slowest agent.
+    """
+    pool = ThreadPoolExecutor(max_workers=max_workers or len(node_fns), thread_name_prefix="plan-stage")
+
+    @traced(PARALLEL_STAGE_NODE)
+    def parallel_stage_node(state: MultiAgentState) -> MultiAgentState:
+        stage = _current_stage(state)
+        # map() yields in submission (= plan) order; each worker runs in a copy of this
+        # context so span parents and the event stream follow it onto the pool thread
+        workers = [_worker_state(state, name) for name in stage]
+        contexts = [contextvars.copy_context() for _ in stage]
+        results = list(pool.map(
+            lambda name, worker, context: context.run(node_fns[name], worker), stage, workers, contexts
+        ))
+        return _merge_stage_results(state, stage, workers, results)
+
+    return parallel_stage_node
+
+
+def make_async_parallel_stage_node(node_fns: Dict[str, Callable]) -> Callable:
+    """
+    Async twin of `make_parallel_stage_node`: coroutine workers are gathered on the
+    event loop, plain sync workers are pushed to a thread.
+    """
+
+    async def run(node_name: str, worker: MultiAgentState) -> MultiAgentState:
+        node_fn = node_fns[node_name]
+        if asyncio.iscoroutinefunction(node_fn):
+            return await node_fn(worker)
+        return await asyncio.to_thread(node_fn, worker)
+
+    @traced(PARALLEL_STAGE_NODE)
+    async def parallel_stage_node(state: MultiAgentState) -> MultiAgentState:
+        stage = _current_stage(state)
+        workers = [_worker_state(state, name) for name in stage]
+        results = await asyncio.gather(*(run(name, worker) for name, worker in zip(stage, workers)))   # keeps input order
+        return _merge_stage_results(state, stage, workers, list(results))
+
+    return parallel_stage_node
@@ -0,0 +1,96 @@
+# pool_slots.py
+
+import time
+import asyncio
+import threading
+from collections import deque
+
+
+class Slots:
+    """
+    Counting limit shared by threads and event loops (what a BoundedSemaphore is for
+    threads). Async callers wait on a future of their own loop, woken from
+    `release()` with `call_soon_threadsafe`, so a waiting coroutine holds no thread:
+    parking async waiters on `to_thread(semaphore.acquire)` starves the very threads
+    the slot holders need to finish and release.
+    """
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError("Slots limit must be >= 1")
+        self.limit = limit
+        self._free = limit
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._waiters: deque[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._free:
+                self._free -= 1
+                return True
+            return False
+
+    def acquire(self, timeout: float) -> bool:
+        """Blocks the calling thread up to `timeout` seconds (0 = forever). False on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._free, timeout or None):
+                return False
+            self._free -= 1
+            return True
+
+    async def aacquire(self, timeout: float) -> bool:
+        """Awaits a free slot up to `timeout` seconds (0 = forever) without leaving the loop."""
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            with self._lock:
+                if self._free:
+                    self._free -= 1
+                    return True
+                waiter = (loop, loop.create_future())
+                self._waiters.append(waiter)
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            try:
+                if remaining is not None and remaining <= 0:
+                    raise asyncio.TimeoutError
+                await asyncio.wait_for(waiter[1], remaining)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+                with self._lock:
+                    try:
+                        self._waiters.remove(waiter)
+                        woken = False
+                    except ValueError:   # a release already picked us: hand its wake-up on
+                        woken = True
+                    if woken:
+                        self._wake_one()
+                if isinstance(exc, asyncio.CancelledError):
+                    raise
+                return False
+
+    def release(self) -> None:
+        with self._lock:
+            if self._free >= self.limit:
+                raise ValueError("Slots released too many times")
+            self._free += 1
+            self._cond.notify()
+            self._wake_one()
+
+    def _wake_one(self) -> None:
+        # lock held; the woken waiter re-checks `_free` and parks again if a thread got there first
+        while self._waiters:
+            loop, future = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+                return
+            except RuntimeError:   # that loop is closed; try the next waiter
+                continue
+
+    def in_use(self) -> int:
+        with self._lock:
+            return self.limit - self._free
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
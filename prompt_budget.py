@@ -0,0 +1,183 @@
+# prompt_budget.py
+
+import os
+import math
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from tracing import record_cache
+from blob_store import blob_size, resolve, strip_handle
+
+
+# =========================
+# 1) Budgets (tokens per section)
+# =========================
+CHARS_PER_TOKEN = 4.0   # local estimate; close enough for Gemini on English/JSON text
+
+SECTION_BUDGETS = {
+    "user_input": int(os.getenv("PROMPT_BUDGET_USER_INPUT", "400")),
+    "last_output": int(os.getenv("PROMPT_BUDGET_LAST_OUTPUT", "600")),
+    "agent_output": int(os.getenv("PROMPT_BUDGET_AGENT_OUTPUT", "300")),   # per agent
+}
+SUMMARY_CACHE_SIZE = int(os.getenv("PROMPT_SUMMARY_CACHE_SIZE", "256"))
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def truncate_head_tail(text: str, max_tokens: int, head_ratio: float = 0.7) -> str:
+    """Keeps the beginning and the end (where status lines usually are) and drops the middle."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    keep = int(max_tokens * CHARS_PER_TOKEN)
+    head = int(keep * head_ratio)
+    tail = keep - head
+    omitted = estimate_tokens(text[head:len(text) - tail])
+    return f"{text[:head]}\n…[~{omitted} tokens omitted]…\n{text[len(text) - tail:] if tail else ''}"
+
+
+# =========================
+# 2) Cached summaries of oversized outputs
+# =========================
+class SummaryCache:
+    """
+    sha256(text) + budget -> summary. `summarizer(text, max_tokens)` is only called on
+    a miss, so the same DB dump / GitHub listing is summarized once however many
+    routing hops re-read it.
+    """
+
+    def __init__(self, summarizer: Callable[[str, int], str], max_entries: int = SUMMARY_CACHE_SIZE):
+        self.summarizer = summarizer
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text: str, max_tokens: int) -> str:
+        key = f"{hashlib.sha256(text.encode('utf-8')).hexdigest()}:{max_tokens}"
+        with self._lock:
+            summary = self._entries.get(key)
+            if summary is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                record_cache("summary", True)
+                return summary
+            self.misses += 1
+        record_cache("summary", False)
+        # a blob handle is summarized from its whole payload, loaded only on this miss
+        summary = truncate_head_tail(self.summarizer(resolve(text), max_tokens), max_tokens)
+        with self._lock:
+            self._entries[key] = summary
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return summary
+
+
+def llm_summarizer(text: str, max_tokens: int) -> str:
+    from llm_pool import invoke_llm
+
+    return invoke_llm(
+        f"Summarize this agent output in at most {max_tokens * 3 // 4} words. "
+        f"Keep IDs, counts, names and any error/status lines verbatim.\n\n{text}"
+    ).strip()
+
+
+_SUMMARIES: Optional[SummaryCache] = (
+    SummaryCache(llm_summarizer) if os.getenv("PROMPT_SUMMARIZE", "0") == "1" else None
+)
+
+
+def set_summary_cache(cache: Optional[SummaryCache]) -> Optional[SummaryCache]:
+    """Enable (or disable with None) summaries of oversized sections; default is head/tail truncation."""
+    global _SUMMARIES
+    previous, _SUMMARIES = _SUMMARIES, cache
+    return previous
+
+
+async def aprepare(prepare: Callable[..., Any], *args: Any) -> Any:
+    """
+    Runs a sync prompt-building step for an async router. With summaries on, a `fit`
+    miss is a blocking LLM call, so the step moves to a worker thread (to_thread
+    copies the contextvars: budget, span, stream sink) instead of stalling the loop.
+    """
+    if _SUMMARIES is None:
+        return prepare(*args)
+    return await asyncio.to_thread(prepare, *args)
+
+
+# =========================
+# 3) Per-prompt budget + savings report
+# =========================
+_TOTALS = {"prompts": 0, "trimmed_prompts": 0, "tokens_in": 0, "tokens_out": 0}
+_TOTALS_LOCK = threading.Lock()
+
+
+class PromptBudget:
+    """
+    Fits each variable section of one routing prompt into its token budget:
+
+        budget = PromptBudget()
+        last = budget.fit("last_output", last_text)
+        ...
+        budget.finish()   # -> {"tokens_in", "tokens_out", "tokens_saved", "sections"}
+    """
+
+    def __init__(self, budgets: Optional[dict[str, int]] = None):
+        self.budgets = {**SECTION_BUDGETS, **(budgets or {})}
+        self.sections: dict[str, tuple[int, int]] = {}
+
+    def fit(self, section: str, text: str, max_tokens: Optional[int] = None) -> str:
+        text = text or ""
+        limit = max_tokens if max_tokens is not None else self.budgets[section.split(":")[0]]
+        size = blob_size(text)   # out-of-line payload: only its preview is in `text`
+        before = estimate_tokens(text) if size is None else math.ceil(size / CHARS_PER_TOKEN)
+        if size is not None and _SUMMARIES is not None:
+            fitted = _SUMMARIES.get(text, limit)
+        elif size is not None:
+            fitted = truncate_head_tail(strip_handle(text), limit)
+        elif before <= limit:
+            fitted = text
+        elif _SUMMARIES is not None:
+            fitted = _SUMMARIES.get(text, limit)
+        else:
+            fitted = truncate_head_tail(text, limit)
+        self.sections[section] = (before, estimate_tokens(fitted))
+        return fitted
+
+    def finish(self) -> dict:
+        tokens_in = sum(before for before, _ in self.sections.values())
+        tokens_out = sum(after for _, after in self.sections.values())
+        with _TOTALS_LOCK:
+            _TOTALS["prompts"] += 1
+            _TOTALS["trimmed_prompts"] += tokens_out < tokens_in
+            _TOTALS["tokens_in"] += tokens_in
+            _TOTALS["tokens_out"] += tokens_out
+        return {
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "tokens_saved": tokens_in - tokens_out,
+            "sections": {name: {"before": b, "after": a} for name, (b, a) in self.sections.items() if a < b},
+        }
+
+
+def prompt_budget_stats() -> dict:
+    with _TOTALS_LOCK:
+        return {**_TOTALS, "tokens_saved": _TOTALS["tokens_in"] - _TOTALS["tokens_out"]}
+
+
+def budgeted_output_summary(budget: PromptBudget, outputs_by_agent: dict[str, str]) -> str:
+    """The "Agent responses so far" block, each response fitted to the per-agent budget."""
+    return "\n".join(
+        f"- {agent}: {budget.fit(f'agent_output:{agent}', response)}"
+        for agent, response in outputs_by_agent.items()
+    ) or "No agent responses yet."
+
+
+def log_savings(label: str, report: dict) -> None:
+    if report["tokens_saved"]:
+        print(f"✂️ {label} prompt trimmed: {report['tokens_in']} → {report['tokens_out']} tokens")
@@ -0,0 +1,122 @@
+# prompt_templates.py
+
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+
+# =========================
+# 1) Templates and rendered prompts
+# =========================
+@dataclass(frozen=True)
+class PromptTemplate:
+    """
+    A router prompt split into:
+      - `prefix`: static per (registry version, agent set). May only use
+        {agent_descriptions} and {agent_names}; rendered once and memoized.
+      - `suffix`: the per-request part (user input, agent outputs, ...).
+    Keeping every variable field in the suffix makes the prefix byte-identical across
+    requests, so the model backend can prefix/context-cache it.
+    """
+    name: str
+    prefix: str
+    suffix: str
+
+
+class RenderedPrompt(str):
+    """The full prompt text (a plain `str` for existing callers) plus its prefix/suffix split."""
+
+    prefix: str
+    suffix: str
+    prefix_key: str   # stable id of the static part, usable as a context-cache key
+
+    def __new__(cls, prefix: str, suffix: str, prefix_key: str):
+        prompt = super().__new__(cls, prefix + suffix)
+        prompt.prefix = prefix
+        prompt.suffix = suffix
+        prompt.prefix_key = prefix_key
+        return prompt
+
+
+# =========================
+# 2) Per-registry-version template registry
+# =========================
+def registry_fingerprint(registry: dict) -> str:
+    return hashlib.sha256(json.dumps(registry, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class PromptTemplates:
+    """
+    Precomputed prompt pieces for one registry version:
+      - one description line per agent, built once;
+      - description blocks and rendered prefixes memoized per frozenset of agents
+        (in registry order, so the text is stable whatever order callers pass).
+    """
+
+    def __init__(self, registry: dict):
+        self.version = registry_fingerprint(registry)
+        self._order = {name: i for i, name in enumerate(registry)}
+        self._lines = {
+            name: f"- {name}: {info.get('prompt', '[No description]')}"
+            for name, info in registry.items()
+        }
+        self._blocks: dict[frozenset, tuple[str, str]] = {}
+        self._prefixes: dict[tuple[str, frozenset], tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def _ordered(self, agents: frozenset) -> list[str]:
+        return sorted(agents, key=self._order.__getitem__)
+
+    def descriptions(self, agents: Optional[Iterable[str]] = None) -> str:
+        return self._block(self._key(agents))[0]
+
+    def _key(self, agents: Optional[Iterable[str]]) -> frozenset:
+        return frozenset(self._lines) if agents is None else frozenset(agents)
+
+    def _block(self, key: frozenset) -> tuple[str, str]:
+        block = self._blocks.get(key)
+        if block is None:
+            ordered = self._ordered(key)
+            block = ("\n".join(self._lines[name] for name in ordered), ", ".join(ordered))
+            with self._lock:
+                self._blocks[key] = block
+        return block
+
+    def prefix(self, template: PromptTemplate, agents: Optional[Iterable[str]] = None) -> tuple[str, str]:
+        """(prefix text, prefix_key) for this template and agent set."""
+        key = self._key(agents)
+        cached = self._prefixes.get((template.name, key))
+        if cached is None:
+            descriptions, names = self._block(key)
+            text = template.prefix.format(agent_descriptions=descriptions, agent_names=names)
+            cached = (text, f"{self.version}:{template.name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}")
+            with self._lock:
+                self._prefixes[(template.name, key)] = cached
+        return cached
+
+    def render(self, template: PromptTemplate, agents: Optional[Iterable[str]] = None, **fields) -> RenderedPrompt:
+        prefix, prefix_key = self.prefix(template, agents)
+        return RenderedPrompt(prefix, template.suffix.format(**fields), prefix_key)
+
+
+PROMPT_TEMPLATE_VERSIONS = 16   # registry contents kept; reloads of edited files must not pile up
+
+_BY_VERSION: "OrderedDict[str, PromptTemplates]" = OrderedDict()
+_TEMPLATES_LOCK = threading.Lock()
+
+
+def get_prompt_templates(registry: dict) -> PromptTemplates:
+    """Shared PromptTemplates for this registry content (the last PROMPT_TEMPLATE_VERSIONS versions kept)."""
+    version = registry_fingerprint(registry)
+    with _TEMPLATES_LOCK:
+        templates = _BY_VERSION.get(version)
+        if templates is None:
+            templates = _BY_VERSION[version] = PromptTemplates(registry)
+            while len(_BY_VERSION) > PROMPT_TEMPLATE_VERSIONS:
+                _BY_VERSION.popitem(last=False)
+        else:
+            _BY_VERSION.move_to_end(version)
+        return templates
@@ -0,0 +1,338 @@
+# registry_service.py
+
+import os
+import json
+import time
+import asyncio
+import functools
+import threading
+import contextvars
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any, Callable, Optional
+
+from prompt_templates import PromptTemplates, get_prompt_templates
+
+
+# =========================
+# 1) Configuration
+# =========================
+REGISTRY_PATH = os.getenv(
+    "AGENT_REGISTRY_PATH",
+    os.path.join(os.path.dirname(__file__), "config", "agent_registry.json"),
+)
+REGISTRY_RELOAD_INTERVAL = float(os.getenv("REGISTRY_RELOAD_INTERVAL", "1.0"))  # seconds between mtime checks
+REGISTRY_WATCH = os.getenv("REGISTRY_WATCH", "poll")                            # "poll" | "inotify" | "off"
+
+
+def load_agent_registry(path: str = REGISTRY_PATH) -> dict[str, dict]:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Agent registry file not found at: {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    # soft validation (schema-lite): require `prompt` and recommend `agent`
+    missing = [
+        name for name, info in data.items()
+        if not isinstance(info, dict) or "prompt" not in info
+    ]
+    if missing:
+        raise ValueError(
+            "Invalid agent_registry.json. Missing `prompt` field for: "
+            + ", ".join(missing)
+        )
+    return data
+
+
+def registry_version(path: str = REGISTRY_PATH) -> str:
+    """Cheap change detector for the registry file (mtime + size)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return "missing"
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+# =========================
+# 2) Immutable snapshot
+# =========================
+class RegistrySnapshot(Mapping):
+    """
+    One loaded version of the registry, never mutated after construction; reads as a
+    read-only `{node: info}` mapping. Derived data is computed once per version:
+
+      - `names` (registry order), `name_set` (O(1) validation, graph rebuild key);
+      - `routes`: valid router decisions (`names` + "END");
+      - `routing_map`: node -> node for `add_conditional_edges` (builders add END);
+      - `speculative`: nodes that may be started early;
+      - `templates` / `descriptions`: prompt description blocks (prompt_templates).
+    """
+
+    def __init__(self, agents: dict[str, dict], version: int = 1, file_version: str = ""):
+        self._agents = {name: dict(info) for name, info in agents.items()}   # private copy
+        self.version = version
+        self.file_version = file_version
+        self.loaded_at = time.time()
+        self.names = tuple(self._agents)
+        self.name_set = frozenset(self._agents)
+        self.routes = self.names + ("END",)
+        self.routing_map = MappingProxyType({name: name for name in self._agents})
+        self.speculative = tuple(name for name, info in self._agents.items() if info.get("speculative", True))
+        self.templates: PromptTemplates = get_prompt_templates(self._agents)
+        self.fingerprint = self.templates.version
+        self.descriptions = self.templates.descriptions()
+        self._restricted: dict[frozenset, "RegistrySnapshot"] = {}
+
+    def restrict(self, names: frozenset) -> "RegistrySnapshot":
+        """This version limited to `names` (a compiled graph's agent nodes), memoized per node set."""
+        if self.name_set <= names:
+            return self
+        restricted = self._restricted.get(names)
+        if restricted is None:
+            agents = {name: self._agents[name] for name in self.names if name in names}
+            restricted = self._restricted[names] = RegistrySnapshot(agents, self.version, self.file_version)
+        return restricted
+
+    def __getitem__(self, name: str) -> Mapping:
+        return MappingProxyType(self._agents[name])
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.name_set
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __repr__(self) -> str:
+        return f"RegistrySnapshot(version={self.version}, agents={list(self.names)})"
+
+
+# =========================
+# 3) Hot-reloading service
+# =========================
+class RegistryService:
+    """
+    Serves the current RegistrySnapshot and swaps in a new one when the file changes:
+
+      - "poll": `current()` stats the file at most once per `reload_interval`
+        (no thread; callers that hit the check while a reload runs keep the old snapshot);
+      - "inotify": a watcher thread reloads on write/rename (`inotify_simple`,
+        falls back to polling when it isn't installed);
+      - "off": only `reload()` swaps.
+
+    A file that fails to load or validate is reported and skipped; the previous
+    snapshot stays live. Listeners (`subscribe`) get `(old, new)` after every swap.
+    """
+
+    def __init__(
+        self,
+        path: str = REGISTRY_PATH,
+        reload_interval: float = REGISTRY_RELOAD_INTERVAL,
+        watch: str = REGISTRY_WATCH,
+    ):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.watch = watch
+        file_version = registry_version(path)
+        self._snapshot = RegistrySnapshot(load_agent_registry(path), 1, file_version)
+        self._failed_version: Optional[str] = None
+        self._next_check = time.monotonic() + reload_interval
+        self._lock = threading.Lock()
+        self._listeners: list[Callable[[RegistrySnapshot, RegistrySnapshot], None]] = []
+        self._stats = {"reloads": 0, "failed_reloads": 0, "node_set_changes": 0}
+        self._closed = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        if watch == "inotify":
+            self._start_inotify()
+
+    # ---- read path ----
+    def current(self) -> RegistrySnapshot:
+        if self.watch == "poll" and time.monotonic() >= self._next_check:
+            self._poll()
+        return self._snapshot
+
+    def _poll(self) -> None:
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = time.monotonic() + self.reload_interval
+            self._reload_if_changed()
+        finally:
+            self._lock.release()
+
+    # ---- reload / swap ----
+    def reload(self) -> bool:
+        """Re-reads the file now. Returns True when a new snapshot was swapped in."""
+        with self._lock:
+            return self._swap(registry_version(self.path))
+
+    def _reload_if_changed(self) -> bool:
+        file_version = registry_version(self.path)
+        if file_version in (self._snapshot.file_version, self._failed_version):
+            return False
+        return self._swap(file_version)
+
+    def _swap(self, file_version: str) -> bool:
+        try:
+            agents = load_agent_registry(self.path)
+        except (OSError, ValueError) as exc:   # json.JSONDecodeError is a ValueError
+            self._failed_version = file_version
+            self._stats["failed_reloads"] += 1
+            print(f"⚠️ Agent registry reload failed, keeping version {self._snapshot.version}: {exc}")
+            return False
+
+        old = self._snapshot
+        new = RegistrySnapshot(agents, old.version + 1, file_version)
+        self._snapshot = new                   # single reference swap: readers see old or new, never a mix
+        self._failed_version = None
+        self._stats["reloads"] += 1
+        if new.name_set != old.name_set:
+            self._stats["node_set_changes"] += 1
+        print(f"🔄 Agent registry v{new.version} loaded: {list(new.names)}")
+        for listener in list(self._listeners):
+            try:
+                listener(old, new)
+            except Exception as exc:
+                print(f"⚠️ Registry listener {listener!r} failed: {exc}")
+        return True
+
+    def subscribe(self, listener: Callable[[RegistrySnapshot, RegistrySnapshot], None]) -> Callable[[], None]:
+        """Calls `listener(old, new)` after each swap. Returns an unsubscribe function."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener) if listener in self._listeners else None
+
+    # ---- inotify watcher ----
+    def _start_inotify(self) -> None:
+        try:
+            import inotify_simple  # noqa: F401
+        except ImportError:
+            print("⚠️ inotify_simple not installed; polling the agent registry instead.")
+            self.watch = "poll"
+            return
+        self._watcher = threading.Thread(target=self._watch_inotify, name="registry-watch", daemon=True)
+        self._watcher.start()
+
+    def _watch_inotify(self) -> None:
+        from inotify_simple import INotify, flags
+
+        inotify = INotify()
+        # watch the directory: editors and deploys replace the file via rename
+        inotify.add_watch(os.path.dirname(os.path.abspath(self.path)),
+                          flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE)
+        name = os.path.basename(self.path)
+        try:
+            while not self._closed.is_set():
+                if any(event.name == name for event in inotify.read(timeout=1000)):
+                    with self._lock:
+                        self._reload_if_changed()
+        finally:
+            inotify.close()
+
+    # ---- metrics / lifecycle ----
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {**self._stats, "version": snapshot.version, "agents": len(snapshot), "watch": self.watch}
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._watcher is not None:
+            self._watcher.join()
+
+
+# =========================
+# 4) Shared service accessors
+# =========================
+_SERVICE: Optional[RegistryService] = None
+_SERVICE_LOCK = threading.Lock()
+
+
+def get_registry_service() -> RegistryService:
+    global _SERVICE
+    if _SERVICE is None:
+        with _SERVICE_LOCK:
+            if _SERVICE is None:
+                _SERVICE = RegistryService()
+    return _SERVICE
+
+
+def set_registry_service(service: Optional[RegistryService]) -> Optional[RegistryService]:
+    """Swaps the process-wide registry service (e.g. another file in tests). Returns the previous one."""
+    global _SERVICE
+    with _SERVICE_LOCK:
+        previous, _SERVICE = _SERVICE, service
+    return previous
+
+
+def get_registry() -> RegistrySnapshot:
+    """
+    The current registry snapshot. Take it once per routing decision and use it throughout.
+    Inside a router bound to a graph (`bind_registry`) it only holds that graph's agent nodes.
+    """
+    snapshot = get_registry_service().current()
+    names = _GRAPH_NODES.get()
+    return snapshot if names is None else snapshot.restrict(names)
+
+
+# =========================
+# 5) Graphs bound to the node set
+# =========================
+# Agent nodes of the graph whose router is running. A compiled graph keeps the edges
+# it was built with, so its routers must not offer agents added to the file since.
+_GRAPH_NODES: contextvars.ContextVar[Optional[frozenset]] = contextvars.ContextVar("graph_nodes", default=None)
+
+
+def bind_registry(fn: Callable, names) -> Callable:
+    """`fn` (router or router node) seeing only the agents in `names` through `get_registry()`."""
+    names = frozenset(names)
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def abound(*args, **kwargs):
+            token = _GRAPH_NODES.set(names)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _GRAPH_NODES.reset(token)
+        return abound
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        token = _GRAPH_NODES.set(names)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _GRAPH_NODES.reset(token)
+    return bound
+
+
+class RegistryBoundGraph:
+    """
+    Compiled graph that follows the registry: `build(snapshot)` runs again only when
+    agents are added or removed. Description / prompt edits reach the routers through
+    `get_registry()` without a rebuild, and in-flight runs finish on the graph they
+    started with (its routers are bound to its node set, see `bind_registry`). Everything else (`invoke`, `ainvoke`, `stream`, ...) is delegated.
+    """
+
+    def __init__(self, build: Callable[[RegistrySnapshot], Any], service: Optional[RegistryService] = None):
+        self._build = build
+        self._service = service
+        self._lock = threading.Lock()
+        self._graph: Any = None
+        self._names: Optional[frozenset] = None
+        self.rebuilds = 0
+
+    @property
+    def graph(self) -> Any:
+        snapshot = (self._service or get_registry_service()).current()
+        if snapshot.name_set != self._names:
+            with self._lock:
+                if snapshot.name_set != self._names:
+                    self._graph = self._build(snapshot)
+                    self._names = snapshot.name_set
+                    self.rebuilds += 1
+        return self._graph
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.graph, name)
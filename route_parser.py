@@ -0,0 +1,291 @@
+# route_parser.py
+
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Optional
+
+
+# =========================
+# 1) Configuration
+# =========================
+ROUTE_REPAIR = os.getenv("ROUTE_REPAIR", "1") == "1"                  # one corrective LLM call on an unusable reply
+ROUTE_PARSE_LOG_PATH = os.getenv("ROUTE_PARSE_LOG_PATH", "")          # JSONL of repairs / failures, "" = off
+ROUTE_MAX_WORDS = int(os.getenv("ROUTE_MAX_WORDS", "64"))             # words of a reply scanned for a route
+ROUTE_VOCABULARY_CACHE = 64                                           # agent sets kept
+
+END = "END"
+END_WORDS = ("end", "done", "finish", "finished", "stop", "complete", "completed")
+FUZZY_MIN_CHARS = 5   # shorter words must match exactly ("end" must not become "env")
+
+_WORD = re.compile(r"[a-z0-9]+(?:_[a-z0-9]+)*")
+_STAGE_SPLIT = re.compile(r",|;|\n|->|→|\bthen\b")
+_STEP_SPLIT = re.compile(r"\||&|\+|\band\b")
+
+# appended to the original prompt, so the model still has the context it decided on
+REPAIR_ROUTE_PROMPT = """{prompt}
+
+Your previous reply could not be used as a routing decision:
+\"\"\"{reply}\"\"\"
+
+Reply with exactly one of: {options}
+No other words."""
+
+REPAIR_PLAN_PROMPT = """{prompt}
+
+Your previous reply could not be used as a plan:
+\"\"\"{reply}\"\"\"
+
+Reply with a comma-separated list of agents from: {options}
+Join independent steps with " | ". Reply END if no agent is needed. No other words."""
+
+
+# =========================
+# 2) Vocabulary (registry names -> every accepted spelling)
+# =========================
+def _deletes(word: str) -> set[str]:
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def _normalize(text: str) -> str:
+    return text.lower().replace("-", "_")
+
+
+class RouteVocabulary:
+    """
+    Accepted spellings of each route, built once per agent set:
+
+      - the name, without its "_node" suffix, and with the "_" dropped
+        ("database_node", "database", "databasenode");
+      - END and its synonyms (when `allow_end`), accepted only as the whole reply:
+        "not complete yet" or "do not stop here" must not end a run;
+      - every one-character deletion of those spellings (SymSpell-style), so a single
+        typo, missing or extra letter still resolves with dict lookups only.
+
+    `lookup(word)` costs O(len(word)) whatever the number of agents. A spelling shared
+    by two routes resolves to neither.
+    """
+
+    def __init__(self, names: Iterable[str], allow_end: bool = True):
+        self.names = tuple(names)
+        self.allow_end = allow_end
+        self._exact: dict[str, Optional[str]] = {}
+        self._near: dict[str, set[str]] = {}
+        for name in self.names:
+            base = _normalize(name)
+            stem = base[: -len("_node")] if base.endswith("_node") else base
+            for alias in {base, stem, base.replace("_", ""), name.lower()}:
+                self._add(alias, name)
+        if allow_end:
+            for word in END_WORDS:
+                self._add(word, END)
+        for alias, route in self._exact.items():
+            if route is not None and len(alias) >= FUZZY_MIN_CHARS:
+                for near in _deletes(alias):
+                    self._near.setdefault(near, set()).add(route)
+
+    def _add(self, alias: str, route: str) -> None:
+        if alias in self._exact and self._exact[alias] != route:
+            self._exact[alias] = None   # ambiguous spelling
+        else:
+            self._exact[alias] = route
+
+    def lookup(self, word: str) -> tuple[Optional[str], str]:
+        """(route, "exact" | "fuzzy") for one word, (None, "") when it names no route."""
+        route = self._exact.get(word)
+        if route is not None or word in self._exact or len(word) < FUZZY_MIN_CHARS:
+            return route, "exact" if route else ""
+        candidates = set(self._near.get(word, ()))          # word is missing a letter
+        for near in _deletes(word):                           # extra or substituted letter
+            exact = self._exact.get(near)
+            if exact is not None and len(near) >= FUZZY_MIN_CHARS:
+                candidates.add(exact)
+            candidates |= self._near.get(near, set())
+        return (candidates.pop(), "fuzzy") if len(candidates) == 1 else (None, "")
+
+    def match(self, reply: str) -> tuple[Optional[str], str]:
+        """
+        (route, how) for a free-text reply: the whole reply as one spelling first,
+        then every word (and word pair, for "database node") of its first
+        ROUTE_MAX_WORDS. Exactly one distinct agent must be named; otherwise None.
+        END only counts as the whole reply ("END", "**Done.**").
+        """
+        text = _normalize(reply or "")
+        words = _WORD.findall(text)[:ROUTE_MAX_WORDS]
+        if not words:
+            return None, "empty"
+        route, how = self.lookup("_".join(words))
+        if route is not None:
+            return route, how
+
+        found: dict[str, str] = {}
+        for i, word in enumerate(words):
+            route, how = self.lookup(word)
+            if route is None and i + 1 < len(words):
+                route, how = self.lookup(f"{word}_{words[i + 1]}")
+            if route == END:   # a synonym inside a sentence is too easily negated
+                continue
+            if route is not None and route not in found:
+                found[route] = how
+        if len(found) == 1:
+            route, how = next(iter(found.items()))
+            return route, "word" if how == "exact" else how
+        return None, "ambiguous" if found else "unknown"
+
+
+_VOCABULARIES: "OrderedDict[tuple, RouteVocabulary]" = OrderedDict()
+_VOCABULARY_LOCK = threading.Lock()
+
+
+def get_vocabulary(names: Iterable[str], allow_end: bool = True) -> RouteVocabulary:
+    """Shared vocabulary per (agent set, allow_end); routers pass the same sets every hop."""
+    key = (tuple(names), allow_end)
+    with _VOCABULARY_LOCK:
+        vocabulary = _VOCABULARIES.get(key)
+        if vocabulary is not None:
+            _VOCABULARIES.move_to_end(key)
+            return vocabulary
+    vocabulary = RouteVocabulary(key[0], allow_end)
+    with _VOCABULARY_LOCK:
+        _VOCABULARIES[key] = vocabulary
+        while len(_VOCABULARIES) > ROUTE_VOCABULARY_CACHE:
+            _VOCABULARIES.popitem(last=False)
+    return vocabulary
+
+
+# =========================
+# 3) Parsing
+# =========================
+def route_options(names: Iterable[str], allow_end: bool = True) -> str:
+    """The enum the model is asked to answer with: "a, b, END"."""
+    return ", ".join(list(names) + ([END] if allow_end else []))
+
+
+def parse_route(reply: str, names: Iterable[str], allow_end: bool = True) -> tuple[Optional[str], str]:
+    """(route or END, how) from a router reply; (None, reason) when it names no single route."""
+    return get_vocabulary(names, allow_end).match(reply)
+
+
+def parse_plan(reply: str, names: Iterable[str]) -> Optional[list[list[str]]]:
+    """
+    'a | b, c' -> [['a', 'b'], ['c']]: commas (or ";", "->", "then", new lines) order
+    stages, "|" (or "&", "+", "and") marks independent steps. Steps are matched like
+    routes, duplicates dropped. [] for END; None when nothing usable was found.
+    """
+    vocabulary = get_vocabulary(names, allow_end=True)
+    stages, seen, ended = [], set(), False
+    for chunk in _STAGE_SPLIT.split((reply or "").lower()):   # before "-" is normalized: "->" splits
+        stage = []
+        for step in _STEP_SPLIT.split(chunk):
+            step = re.sub(r"^\s*(?:\d+[.)]|[-*•])\s*", "", step)   # list markers: "1.", "-", "*"
+            if not _WORD.search(step):
+                continue
+            route, _ = vocabulary.match(step)
+            if route == END:
+                ended = True
+            elif route is not None and route not in seen:
+                seen.add(route)
+                stage.append(route)
+        if stage:
+            stages.append(stage)
+    return stages if stages or ended else None
+
+
+# =========================
+# 4) Parse with one bounded repair
+# =========================
+_STATS = {"replies": 0, "exact": 0, "word": 0, "fuzzy": 0, "plan": 0, "repaired": 0, "failed": 0}
+_STATS_LOCK = threading.Lock()
+_LOG_LOCK = threading.Lock()
+
+
+def _record(router: str, reply: str, outcome: str, repaired_reply: Optional[str] = None, result=None) -> None:
+    with _STATS_LOCK:
+        _STATS["replies"] += 1
+        _STATS[outcome] = _STATS.get(outcome, 0) + 1
+    if outcome not in ("repaired", "failed"):
+        return
+    if outcome == "failed":
+        print(f"⚠️ {router}: unusable routing reply {reply!r}" + (f", repair {repaired_reply!r}" if repaired_reply else ""))
+    if ROUTE_PARSE_LOG_PATH:
+        line = json.dumps({"router": router, "reply": reply, "repair": repaired_reply, "outcome": outcome,
+                           "result": result, "ts": time.time()}, ensure_ascii=False)
+        with _LOG_LOCK, open(ROUTE_PARSE_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def route_parser_stats() -> dict:
+    with _STATS_LOCK:
+        return dict(_STATS)
+
+
+def resolve_route(router: str, prompt: str, reply: str, names: Iterable[str], ask: Callable[[str], str],
+                  allow_end: bool = True) -> Optional[str]:
+    """
+    Route named by `reply` (the answer to `prompt`). An unusable reply gets one repair:
+    `ask` (the router's own LLM call) is given the prompt again, the bad reply and the
+    exact options. None if that fails too; the caller decides what None means (usually END).
+    """
+    names = tuple(names)
+    route, how = parse_route(reply, names, allow_end)
+    if route is not None:
+        _record(router, reply, how)
+        return route
+    if not ROUTE_REPAIR:
+        _record(router, reply, "failed")
+        return None
+    repaired = ask(REPAIR_ROUTE_PROMPT.format(prompt=prompt.rstrip(), reply=reply.strip()[:500], options=route_options(names, allow_end)))
+    route, _ = parse_route(repaired, names, allow_end)
+    _record(router, reply, "repaired" if route is not None else "failed", repaired, route)
+    return route
+
+
+async def aresolve_route(router: str, prompt: str, reply: str, names: Iterable[str],
+                         ask: Callable[[str], Awaitable[str]], allow_end: bool = True) -> Optional[str]:
+    names = tuple(names)
+    route, how = parse_route(reply, names, allow_end)
+    if route is not None:
+        _record(router, reply, how)
+        return route
+    if not ROUTE_REPAIR:
+        _record(router, reply, "failed")
+        return None
+    repaired = await ask(REPAIR_ROUTE_PROMPT.format(prompt=prompt.rstrip(), reply=reply.strip()[:500], options=route_options(names, allow_end)))
+    route, _ = parse_route(repaired, names, allow_end)
+    _record(router, reply, "repaired" if route is not None else "failed", repaired, route)
+    return route
+
+
+def resolve_plan(router: str, prompt: str, reply: str, names: Iterable[str], ask: Callable[[str], str]) -> list[list[str]]:
+    """Plan stages from `reply`, with the same single repair; [] when there is no usable plan."""
+    names = tuple(names)
+    stages = parse_plan(reply, names)
+    if stages is not None:
+        _record(router, reply, "plan")
+        return stages
+    if not ROUTE_REPAIR:
+        _record(router, reply, "failed")
+        return []
+    repaired = ask(REPAIR_PLAN_PROMPT.format(prompt=prompt.rstrip(), reply=reply.strip()[:500], options=route_options(names)))
+    stages = parse_plan(repaired, names)
+    _record(router, reply, "repaired" if stages is not None else "failed", repaired, stages)
+    return stages or []
+
+
+async def aresolve_plan(router: str, prompt: str, reply: str, names: Iterable[str],
+                        ask: Callable[[str], Awaitable[str]]) -> list[list[str]]:
+    names = tuple(names)
+    stages = parse_plan(reply, names)
+    if stages is not None:
+        _record(router, reply, "plan")
+        return stages
+    if not ROUTE_REPAIR:
+        _record(router, reply, "failed")
+        return []
+    repaired = await ask(REPAIR_PLAN_PROMPT.format(prompt=prompt.rstrip(), reply=reply.strip()[:500], options=route_options(names)))
+    stages = parse_plan(repaired, names)
+    _record(router, reply, "repaired" if stages is not None else "failed", repaired, stages)
+    return stages or []
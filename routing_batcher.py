@@ -0,0 +1,226 @@
+# routing_batcher.py
+
+import os
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional
+
+from llm_pool import ModelPool, get_model_pool, invoke_llm, ainvoke_llm, LLM_POOL_SIZE
+from tracing import span, annotate, add_queue_time, llm_call_attributes
+from execution_controller import charge_llm
+
+
+# =========================
+# 1) Batching configuration
+# =========================
+ROUTING_BATCH_WINDOW_MS = float(os.getenv("ROUTING_BATCH_WINDOW_MS", "0"))   # 0 = batching off
+ROUTING_BATCH_SIZE = int(os.getenv("ROUTING_BATCH_SIZE", "16"))
+ROUTING_BATCH_TIMEOUT = float(os.getenv("ROUTING_BATCH_TIMEOUT", "60"))   # seconds a caller waits for its reply, 0 = forever
+
+
+# =========================
+# 2) Micro-batcher
+# =========================
+class _Pending:
+    __slots__ = ("prompt", "future", "enqueued_at")
+
+    def __init__(self, prompt: str):
+        self.prompt = prompt
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class RoutingBatcher:
+    """
+    Collects routing prompts from concurrent conversations and sends them as one
+    `batch` call:
+
+      - A batch closes `window` seconds after its first prompt arrived, or as soon
+        as it holds `max_batch` prompts, whichever comes first.
+      - Closed batches run on up to `max_inflight` threads (default: the model pool
+        size), so the next window fills while earlier batches are in flight.
+      - Each caller gets its own decision back (or the batch's exception), and gives
+        up with TimeoutError after `timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        window: float = ROUTING_BATCH_WINDOW_MS / 1000,
+        max_batch: int = ROUTING_BATCH_SIZE,
+        pool: Optional[ModelPool] = None,
+        max_inflight: int = LLM_POOL_SIZE,
+        timeout: float = ROUTING_BATCH_TIMEOUT,
+    ):
+        if max_batch < 1:
+            raise ValueError("RoutingBatcher max_batch must be >= 1")
+        self.window = window
+        self.max_batch = max_batch
+        self.pool = pool          # None = the shared pool at dispatch time
+        self.timeout = timeout or None
+        self._queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="route-batch")
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {"prompts": 0, "batches": 0, "errors": 0, "largest_batch": 0, "wait_seconds": 0.0}
+
+    # ---- submit ----
+    def submit(self, prompt: str) -> Future:
+        pending = _Pending(prompt)
+        # checked and enqueued under the lock close() takes, so nothing lands behind its sentinel
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("RoutingBatcher is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect_loop, name="route-batcher", daemon=True)
+                self._thread.start()
+            self._queue.put(pending)
+        return pending.future
+
+    def route(self, prompt: str) -> str:
+        with span("llm.batch_route", "llm", **llm_call_attributes(prompt)):
+            future = self.submit(prompt)
+            try:
+                decision = future.result(self.timeout)
+            except FutureTimeout:
+                future.cancel()   # not sent if its batch hasn't gone out yet
+                raise
+            return self._traced_result(prompt, future, decision)
+
+    async def aroute(self, prompt: str) -> str:
+        with span("llm.batch_route", "llm", **llm_call_attributes(prompt)):
+            future = self.submit(prompt)
+            decision = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+            return self._traced_result(prompt, future, decision)
+
+    @staticmethod
+    def _traced_result(prompt: str, future: Future, decision: str) -> str:
+        add_queue_time(getattr(future, "queue_seconds", 0.0))   # time spent waiting for the batch to close
+        annotate(batch_size=getattr(future, "batch_size", 1), **llm_call_attributes(prompt, decision))
+        return decision
+
+    # ---- collect / dispatch ----
+    def _collect(self) -> Optional[list[_Pending]]:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:          # close(): flush what we have, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _collect_loop(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch: list[_Pending]) -> None:
+        # callers that timed out (cancelled futures) are not sent
+        batch = [item for item in batch if item.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        sent_at = time.monotonic()
+        with self._lock:
+            self._stats["prompts"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+            self._stats["wait_seconds"] += sum(sent_at - item.enqueued_at for item in batch)
+        try:
+            decisions = (self.pool or get_model_pool()).batch([item.prompt for item in batch])
+            if len(decisions) != len(batch):
+                raise RuntimeError(f"Batch returned {len(decisions)} replies for {len(batch)} prompts")
+        except Exception as exc:
+            with self._lock:
+                self._stats["errors"] += 1
+            for item in batch:
+                item.future.set_exception(exc)
+            return
+        for item, decision in zip(batch, decisions):
+            item.future.queue_seconds = sent_at - item.enqueued_at
+            item.future.batch_size = len(batch)
+            item.future.set_result(decision)
+
+    # ---- metrics / lifecycle ----
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        batches = max(1, stats["batches"])
+        stats["avg_batch_size"] = stats["prompts"] / batches
+        stats["avg_wait_ms"] = 1000 * stats.pop("wait_seconds") / max(1, stats["prompts"])
+        return stats
+
+    def close(self) -> None:
+        """Flushes queued prompts, then stops the collector and waits for in-flight batches."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+        self._executor.shutdown(wait=True)
+        # anything the collector didn't pick up fails instead of waiting forever
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item.future.set_running_or_notify_cancel():
+                item.future.set_exception(RuntimeError("RoutingBatcher closed before the prompt was sent"))
+
+
+# =========================
+# 3) Shared batcher accessors
+# =========================
+_BATCHER: Optional[RoutingBatcher] = RoutingBatcher() if ROUTING_BATCH_WINDOW_MS > 0 else None
+_BATCHER_LOCK = threading.Lock()
+
+
+def get_routing_batcher() -> Optional[RoutingBatcher]:
+    """The process-wide batcher, or None when batching is off (ROUTING_BATCH_WINDOW_MS=0)."""
+    return _BATCHER
+
+
+def set_routing_batcher(batcher: Optional[RoutingBatcher]) -> Optional[RoutingBatcher]:
+    """Turns batching on (or off with None). Returns the previous batcher."""
+    global _BATCHER
+    with _BATCHER_LOCK:
+        previous, _BATCHER = _BATCHER, batcher
+    return previous
+
+
+def route_llm(prompt: str, node: Optional[str] = None) -> str:
+    """Routing-decision LLM call: batched with other conversations when a batcher is set."""
+    batcher = _BATCHER
+    if batcher is None:
+        return invoke_llm(prompt, node)
+    decision = batcher.route(prompt)
+    charge_llm(prompt, decision)   # batched calls bypass invoke_llm's accounting
+    return decision
+
+
+async def aroute_llm(prompt: str, node: Optional[str] = None) -> str:
+    batcher = _BATCHER
+    if batcher is None:
+        return await ainvoke_llm(prompt, node)
+    decision = await batcher.aroute(prompt)
+    charge_llm(prompt, decision)
+    return decision
@@ -0,0 +1,208 @@
+# routing_cache.py
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Iterable
+
+from tracing import record_cache
+from registry_service import REGISTRY_PATH, registry_version   # same file + change detector as the registry service
+
+
+# =========================
+# 1) Configuration
+# =========================
+
+ROUTING_CACHE_SIZE = int(os.getenv("ROUTING_CACHE_SIZE", "2048"))
+ROUTING_CACHE_TTL = float(os.getenv("ROUTING_CACHE_TTL", "3600"))     # seconds, 0 = no expiry
+ROUTING_CACHE_PATH = os.getenv("ROUTING_CACHE_PATH", "")              # SQLite file, "" = memory only
+
+
+# =========================
+# 2) Fingerprinting
+# =========================
+_WS = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Case/whitespace-insensitive form of a prompt field (trailing punctuation dropped)."""
+    return _WS.sub(" ", (text or "").lower()).strip().rstrip(".!?")
+
+
+def routing_fingerprint(
+    router: str,
+    user_input: str,
+    last_output: str,
+    candidates: Iterable[str],
+) -> str:
+    payload = json.dumps(
+        [router, normalize_text(user_input), normalize_text(last_output), sorted(candidates)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# =========================
+# 3) LRU + TTL cache
+# =========================
+class RoutingCache:
+    """
+    fingerprint -> routing decision.
+
+      - In-memory LRU bounded by `max_entries`, entries expire after `ttl` seconds.
+      - Optional SQLite file (`path`) so decisions survive restarts; memory misses
+        fall through to it and hits are promoted back into the LRU.
+      - Everything is dropped when the registry file changes (checked by mtime/size,
+        at most once per `check_interval` seconds).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ROUTING_CACHE_SIZE,
+        ttl: float = ROUTING_CACHE_TTL,
+        path: Optional[str] = ROUTING_CACHE_PATH or None,
+        registry_path: str = REGISTRY_PATH,
+        check_interval: float = 1.0,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.registry_path = registry_path
+        self.check_interval = check_interval
+
+        self._entries: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidations": 0, "disk_hits": 0}
+        self._version = registry_version(registry_path)
+        self._last_check = time.monotonic()
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS routes ("
+                " key TEXT PRIMARY KEY, decision TEXT NOT NULL,"
+                " stored_at REAL NOT NULL, registry_version TEXT NOT NULL)"
+            )
+            self._db.execute("DELETE FROM routes WHERE registry_version != ?", (self._version,))
+            self._db.commit()
+
+    # ---- registry invalidation ----
+    def _check_registry(self) -> None:
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        version = registry_version(self.registry_path)
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+            self._stats["invalidations"] += 1
+            if self._db is not None:
+                self._db.execute("DELETE FROM routes WHERE registry_version != ?", (version,))
+                self._db.commit()
+
+    def _fresh(self, stored_at: float) -> bool:
+        return not self.ttl or time.time() - stored_at < self.ttl
+
+    # ---- public API ----
+    def get(self, key: str) -> Optional[str]:
+        decision = self._get(key)
+        record_cache("routing", decision is not None)
+        return decision
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            self._check_registry()
+            entry = self._entries.get(key)
+            if entry is not None:
+                decision, stored_at = entry
+                if self._fresh(stored_at):
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return decision
+                del self._entries[key]
+                self._stats["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT decision, stored_at FROM routes WHERE key = ? AND registry_version = ?",
+                    (key, self._version),
+                ).fetchone()
+                if row and self._fresh(row[1]):
+                    self._insert(key, row[0], row[1])
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                    return row[0]
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, decision: str) -> None:
+        stored_at = time.time()
+        with self._lock:
+            self._check_registry()
+            self._insert(key, decision, stored_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO routes (key, decision, stored_at, registry_version) VALUES (?, ?, ?, ?)",
+                    (key, decision, stored_at, self._version),
+                )
+                self._db.commit()
+
+    def _insert(self, key: str, decision: str, stored_at: float) -> None:
+        self._entries[key] = (decision, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evicted"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM routes")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "registry_version": self._version,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+# =========================
+# 4) Shared cache
+# =========================
+_CACHE: Optional[RoutingCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_routing_cache() -> RoutingCache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = RoutingCache()
+    return _CACHE
+
+
+def set_routing_cache(cache: Optional[RoutingCache]) -> Optional[RoutingCache]:
+    global _CACHE
+    with _CACHE_LOCK:
+        previous, _CACHE = _CACHE, cache
+    return previous
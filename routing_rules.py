@@ -0,0 +1,273 @@
+# routing_rules.py
+
+import os
+import re
+import json
+import threading
+from collections.abc import Set as AbstractSet
+from dataclasses import dataclass, field
+from typing import Optional, Iterable
+
+from tracing import record_cache, annotate
+
+
+# =========================
+# 1) Rule file location
+# =========================
+# Lives next to the agent registry (config/agent_registry.json)
+RULES_PATH = os.getenv(
+    "ROUTING_RULES_PATH",
+    os.path.join(os.path.dirname(__file__), "config", "routing_rules.json"),
+)
+# Default rules shipped with the code, used when RULES_PATH isn't deployed: the
+# routers' inline checks moved into these rules, so they must not silently vanish
+SHIPPED_RULES_PATH = os.path.join(os.path.dirname(__file__), "routing_rules.json")
+
+
+def _rules_file(path: str) -> Optional[str]:
+    if os.path.exists(path):
+        return path
+    if os.path.exists(SHIPPED_RULES_PATH):
+        print(f"⚠️ Routing rules not found at {path}; using the shipped {SHIPPED_RULES_PATH}")
+        return SHIPPED_RULES_PATH
+    print(f"⚠️ Routing rules not found at {path}; rule fast paths are off")
+    return None
+
+
+# =========================
+# 2) Rule model
+# =========================
+@dataclass(frozen=True)
+class RoutingRule:
+    """
+    One declarative fast-path rule. A rule fires when any of its keywords
+    (case-insensitive substrings) or regexes matches `texts[field]`.
+
+      - `routers`: router names the rule applies to (empty = every router).
+      - `first_hop`: True = only before any agent ran, False = only after, None = always.
+      - `unless_visited`: skip the rule once any of these nodes has run.
+    """
+    name: str
+    route: str
+    field: str = "last_output"
+    keywords: tuple[str, ...] = ()
+    regex: tuple[str, ...] = ()
+    routers: tuple[str, ...] = ()
+    first_hop: Optional[bool] = None
+    unless_visited: tuple[str, ...] = ()
+
+    def applies_to(self, router: str) -> bool:
+        return not self.routers or router in self.routers
+
+    def pattern(self) -> str:
+        parts = [re.escape(kw.lower()) for kw in self.keywords]
+        parts += [f"(?:{rx})" for rx in self.regex]
+        return "|".join(parts)
+
+
+@dataclass(frozen=True)
+class RuleMatch:
+    rule: str
+    route: str
+
+
+def load_routing_rules(path: str = RULES_PATH) -> list[RoutingRule]:
+    path = _rules_file(path)
+    if path is None:
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    rules = []
+    for i, raw in enumerate(data.get("rules", [])):
+        name = raw.get("name", f"rule_{i}")
+        if "route" not in raw or not (raw.get("keywords") or raw.get("regex")):
+            raise ValueError(
+                f"Invalid routing rule '{name}': needs `route` and at least one keyword or regex."
+            )
+        for rx in raw.get("regex", []):
+            try:
+                re.compile(rx)
+            except re.error as e:
+                raise ValueError(f"Invalid regex in routing rule '{name}': {e}") from e
+        rules.append(RoutingRule(
+            name=name,
+            route=raw["route"],
+            field=raw.get("field", "last_output"),
+            keywords=tuple(raw.get("keywords", [])),
+            regex=tuple(raw.get("regex", [])),
+            routers=tuple(raw.get("routers", [])),
+            first_hop=raw.get("first_hop"),
+            unless_visited=tuple(raw.get("unless_visited", [])),
+        ))
+    return rules
+
+
+# =========================
+# 3) Compiled matcher
+# =========================
+# Compiled matchers kept per set of eligible rules (cleared when full)
+MAX_COMPILED_MATCHERS = int(os.getenv("ROUTING_RULES_MAX_COMPILED", "256"))
+
+
+class _FieldMatcher:
+    """
+    The rules eligible for one call on one (router, field), compiled into a single regex.
+
+    Every rule becomes a named alternative inside one zero-width lookahead, so a
+    single scan reports, at each position, the highest-priority rule matching
+    there. Only rules whose conditions already hold are compiled in, so a rule
+    that could not fire never hides a lower-priority one matching the same text.
+    """
+
+    def __init__(self, indexed_rules: list[tuple[int, RoutingRule]]):
+        self.group_to_rule = {f"r{i}": i for i, _ in indexed_rules}
+        alternatives = "|".join(f"(?P<r{i}>{rule.pattern()})" for i, rule in indexed_rules)
+        self.regex = re.compile(f"(?=(?:{alternatives}))", re.IGNORECASE)
+        self.best_possible = min(i for i, _ in indexed_rules)
+
+    def best_match(self, text: str) -> Optional[int]:
+        best = None
+        for m in self.regex.finditer(text):
+            index = self.group_to_rule[m.lastgroup]
+            if best is None or index < best:
+                best = index
+            if index == self.best_possible:
+                break
+        return best
+
+
+# =========================
+# 4) Rule engine
+# =========================
+class RoutingRuleEngine:
+    """Resolves the next node without an LLM call when a rule fires, and counts hits per router."""
+
+    def __init__(self, rules: Iterable[RoutingRule]):
+        self.rules = list(rules)
+        self._by_router: dict[str, dict[str, list[tuple[int, RoutingRule]]]] = {}
+        self._compiled: dict[tuple[int, ...], _FieldMatcher] = {}
+        self._lock = threading.Lock()
+        self._evaluations: dict[str, int] = {}
+        self._hits: dict[str, int] = {}
+        self._rule_hits: dict[str, int] = {}
+
+    def _rules_for(self, router: str) -> dict[str, list[tuple[int, RoutingRule]]]:
+        by_field = self._by_router.get(router)
+        if by_field is None:
+            by_field = {}
+            for i, rule in enumerate(self.rules):
+                if rule.applies_to(router):
+                    by_field.setdefault(rule.field, []).append((i, rule))
+            with self._lock:
+                self._by_router[router] = by_field
+        return by_field
+
+    def _matcher(self, indexed_rules: list[tuple[int, RoutingRule]]) -> _FieldMatcher:
+        # keyed by the eligible rule ids: a handful of (visited, allowed) shapes per router
+        key = tuple(i for i, _ in indexed_rules)
+        matcher = self._compiled.get(key)
+        if matcher is None:
+            matcher = _FieldMatcher(indexed_rules)
+            with self._lock:
+                if len(self._compiled) >= MAX_COMPILED_MATCHERS:
+                    self._compiled.clear()
+                self._compiled[key] = matcher
+        return matcher
+
+    def resolve(
+        self,
+        router: str,
+        texts: dict[str, str],
+        visited: Iterable[str] = (),
+        allowed: Optional[Iterable[str]] = None,
+    ) -> Optional[RuleMatch]:
+        """
+        Returns the highest-priority rule whose patterns match and whose conditions
+        hold, or None (caller falls back to the LLM). `allowed` restricts the routes
+        a rule may return (e.g. unvisited agents + END).
+        """
+        visited = visited if isinstance(visited, AbstractSet) else set(visited)
+        allowed = set(allowed) if allowed is not None else None
+
+        # conditions first: only rules that could fire take part in the scan
+        best = None
+        for field_name, indexed_rules in self._rules_for(router).items():
+            text = texts.get(field_name)
+            if not text:
+                continue
+            eligible = [
+                (i, rule) for i, rule in indexed_rules
+                if (best is None or i < best) and self._eligible(rule, visited, allowed)
+            ]
+            if eligible:
+                index = self._matcher(eligible).best_match(text)
+                if index is not None:
+                    best = index
+
+        match = None
+        if best is not None:
+            rule = self.rules[best]
+            match = RuleMatch(rule=rule.name, route=rule.route)
+
+        with self._lock:
+            self._evaluations[router] = self._evaluations.get(router, 0) + 1
+            if match:
+                self._hits[router] = self._hits.get(router, 0) + 1
+                self._rule_hits[match.rule] = self._rule_hits.get(match.rule, 0) + 1
+        record_cache("routing_rules", match is not None)
+        if match:
+            annotate(routing_rule=match.rule)
+        return match
+
+    @staticmethod
+    def _eligible(rule: RoutingRule, visited: AbstractSet, allowed: Optional[set[str]]) -> bool:
+        if rule.first_hop is not None and rule.first_hop != (not visited):
+            return False
+        if not visited.isdisjoint(rule.unless_visited):
+            return False
+        return allowed is None or rule.route in allowed
+
+    def stats(self) -> dict:
+        """Hit rate overall and per router; every hit is one LLM round-trip saved."""
+        with self._lock:
+            evaluations = sum(self._evaluations.values())
+            hits = sum(self._hits.values())
+            return {
+                "evaluations": evaluations,
+                "hits": hits,
+                "llm_calls_saved": hits,
+                "hit_rate": hits / evaluations if evaluations else 0.0,
+                "by_router": {
+                    router: {
+                        "evaluations": count,
+                        "hits": self._hits.get(router, 0),
+                        "hit_rate": self._hits.get(router, 0) / count,
+                    }
+                    for router, count in self._evaluations.items()
+                },
+                "by_rule": dict(self._rule_hits),
+            }
+
+
+# =========================
+# 5) Shared engine
+# =========================
+_ENGINE: Optional[RoutingRuleEngine] = None
+_ENGINE_LOCK = threading.Lock()
+
+
+def get_rule_engine() -> RoutingRuleEngine:
+    global _ENGINE
+    if _ENGINE is None:
+        with _ENGINE_LOCK:
+            if _ENGINE is None:
+                _ENGINE = RoutingRuleEngine(load_routing_rules())
+    return _ENGINE
+
+
+def set_rule_engine(engine: Optional[RoutingRuleEngine]) -> Optional[RoutingRuleEngine]:
+    global _ENGINE
+    with _ENGINE_LOCK:
+        previous, _ENGINE = _ENGINE, engine
+    return previous
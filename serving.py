@@ -0,0 +1,450 @@
+# serving.py
+#
+# Multi-process serving runtime for the compiled supervisor graphs. One Python process
+# is bound by the GIL for prompt building, JSON parsing and message handling, so the
+# graph runs in a pre-forked pool of worker processes, each holding its own warm
+# compiled graph, model pool and agent pool.
+#   python -m serving http --port 8080 --workers 4
+#   python -m serving jsonl < requests.jsonl > responses.jsonl
+
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import asyncio
+import argparse
+import importlib
+import itertools
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Optional
+
+from blob_store import message_content, require_durable_store, resolve
+
+
+# =========================
+# 1) Configuration
+# =========================
+SERVE_VARIANT = os.getenv("SERVE_VARIANT", "supervisor")                       # graph_cache variant
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", str(os.cpu_count() or 1)))     # worker processes
+SERVE_WORKER_THREADS = int(os.getenv("SERVE_WORKER_THREADS", "8"))            # conversations in flight per worker
+SERVE_MAX_PENDING = int(os.getenv("SERVE_MAX_PENDING", "256"))                # queued + running before rejecting
+SERVE_DRAIN_TIMEOUT = float(os.getenv("SERVE_DRAIN_TIMEOUT", "30"))           # seconds to finish in-flight work
+SERVE_REQUEST_TIMEOUT = float(os.getenv("SERVE_REQUEST_TIMEOUT", "120"))      # seconds an HTTP request waits (then 504)
+SERVE_HOST = os.getenv("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.getenv("SERVE_PORT", "8080"))
+
+# imported in the parent before forking, so workers share the loaded code pages
+_PRELOAD = ("langchain_core.messages", "langgraph.graph", "graph_cache")
+
+
+class Overloaded(RuntimeError):
+    """Raised by `submit` when the pending queue is full or the runtime is draining."""
+
+
+def _variant_module(variant: str) -> str:
+    return "nodes_new" if variant.startswith("planner") else "supervisor"
+
+
+def request_state(text: str) -> dict:
+    from langchain_core.messages import HumanMessage
+
+    return {
+        "messages": [HumanMessage(content=text)],
+        "feedback": [],
+        "current_node": None,
+        "next_node": None,
+        "visited": [],
+        "agent_outputs": {},
+    }
+
+
+def response_payload(result: dict) -> dict:
+    # the caller gets full payloads: blob handles are resolved here, at the edge
+    messages = result.get("messages") or []
+    output = result.get("partial_answer") or (message_content(messages[-1]) if messages else "")
+    return {
+        "output": output,
+        "visited": list(result.get("visited") or []),
+        "agent_outputs": {node: resolve(text) for node, text in (result.get("agent_outputs") or {}).items()},
+        "execution": result.get("execution"),   # budget consumption; `stopped` says why a run ended early
+    }
+
+
+# =========================
+# 2) Worker process
+# =========================
+def _run_job(variant: str, job: tuple, results, slots: threading.Semaphore) -> None:
+    from graph_cache import get_compiled_graph
+
+    job_id, text, thread_id = job
+    config = {"configurable": {"thread_id": thread_id}} if thread_id else None
+    try:
+        # cache hit unless the agent registry changed: then this job gets the rebuilt graph
+        graph, is_async = get_compiled_graph(variant), variant.endswith("_async")
+        state = request_state(text)
+        if is_async:
+            result = asyncio.run(graph.ainvoke(state, config))
+        else:
+            result = graph.invoke(state, config)
+        results.put(("done", job_id, response_payload(result), None))
+    except Exception as exc:
+        results.put(("done", job_id, None, f"{type(exc).__name__}: {exc}"))
+    finally:
+        slots.release()
+
+
+def _worker_main(index: int, variant: str, tasks, results, threads: int,
+                 initializer: Optional[Callable], initargs: tuple) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)   # the parent owns shutdown and drains us
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        if initializer is not None:
+            initializer(*initargs)
+        require_durable_store("Serving")   # any worker may pick up the next turn of a thread
+        from graph_cache import get_compiled_graph
+
+        get_compiled_graph(variant)   # compile + warm the model pool in this process
+    except Exception as exc:
+        results.put(("failed", index, f"{type(exc).__name__}: {exc}"))
+        return
+    results.put(("ready", index, os.getpid()))
+
+    # take a job only when a thread is free, so queued work stays available to idle workers
+    slots = threading.Semaphore(threads)
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"serve-{index}") as executor:
+        while True:
+            slots.acquire()
+            job = tasks.get()
+            if job is None:   # drain sentinel; the executor finishes in-flight jobs on exit
+                break
+            results.put(("start", job[0], index))
+            executor.submit(_run_job, variant, job, results, slots)
+    results.put(("exit", index, os.getpid()))
+
+
+# =========================
+# 3) Runtime (parent process)
+# =========================
+class ServingRuntime:
+    """
+    Pre-fork pool of graph workers behind a bounded request queue.
+
+      - `start()` imports the graph modules once, forks `workers` processes and waits
+        until each has compiled its graph (pools and clients are created after the
+        fork, never shared across processes).
+      - `submit(text)` returns a Future resolved with `response_payload`; beyond
+        `max_pending` queued + running requests it raises Overloaded (backpressure).
+      - `drain()` stops admissions, lets in-flight requests finish, then stops the
+        workers. A worker that dies is replaced; its in-flight requests fail.
+    """
+
+    def __init__(
+        self,
+        variant: str = SERVE_VARIANT,
+        workers: int = SERVE_WORKERS,
+        worker_threads: int = SERVE_WORKER_THREADS,
+        max_pending: int = SERVE_MAX_PENDING,
+        initializer: Optional[Callable] = None,
+        initargs: tuple = (),
+    ):
+        self.variant = variant
+        self.workers = workers
+        self.worker_threads = worker_threads
+        self.max_pending = max_pending
+        self.initializer = initializer
+        self.initargs = initargs
+        methods = mp.get_all_start_methods()
+        self._ctx = mp.get_context("fork" if "fork" in methods else "spawn")
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._processes: dict[int, Any] = {}
+        self._futures: dict[int, Future] = {}
+        self._running: dict[int, set[int]] = {}      # worker index -> job ids it started
+        self._live: set[int] = set()                 # workers that reported ready
+        self._start_errors: list[str] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._ready = threading.Semaphore(0)
+        self._idle = threading.Condition(self._lock)
+        self._draining = False
+        self._collector: Optional[threading.Thread] = None
+        self._stats = {"completed": 0, "failed": 0, "rejected": 0, "restarts": 0}
+
+    # ---- lifecycle ----
+    def start(self, timeout: float = 120.0) -> "ServingRuntime":
+        for module in _PRELOAD + (_variant_module(self.variant),):
+            importlib.import_module(module)
+        for index in range(self.workers):
+            self._spawn(index)
+        self._collector = threading.Thread(target=self._collect, name="serve-collector", daemon=True)
+        self._collector.start()
+        deadline = time.monotonic() + timeout
+        for _ in range(self.workers):
+            if not self._ready.acquire(timeout=max(0.0, deadline - time.monotonic())) or self._start_errors:
+                self.drain(timeout=0)
+                raise RuntimeError(self._start_errors[0] if self._start_errors
+                                   else f"Serving workers not ready after {timeout:.0f}s")
+        print(f"🚀 Serving '{self.variant}' on {self.workers} workers x {self.worker_threads} threads")
+        return self
+
+    def _spawn(self, index: int) -> None:
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.variant, self._tasks, self._results, self.worker_threads,
+                  self.initializer, self.initargs),
+            name=f"serve-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+
+    def _collect(self) -> None:
+        exited = 0
+        while exited < self.workers:
+            try:
+                message = self._results.get(timeout=0.5)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            kind = message[0]
+            if kind == "start":
+                self._running.setdefault(message[2], set()).add(message[1])
+            elif kind == "done":
+                _, job_id, payload, error = message
+                for jobs in self._running.values():
+                    jobs.discard(job_id)
+                self._resolve(job_id, payload, error)
+            elif kind == "ready":
+                self._live.add(message[1])
+                self._ready.release()
+            elif kind == "failed":
+                self._start_errors.append(f"Serving worker {message[1]} failed to start: {message[2]}")
+                self._ready.release()
+            elif kind == "exit":
+                exited += 1
+
+    def _resolve(self, job_id: int, payload: Optional[dict], error: Optional[str]) -> None:
+        with self._lock:
+            future = self._futures.pop(job_id, None)
+            self._stats["failed" if error else "completed"] += 1
+            self._idle.notify_all()
+        if future is None:
+            return
+        if error:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(payload)
+
+    def _check_workers(self) -> None:
+        if self._draining:
+            return
+        for index in list(self._live):
+            process = self._processes[index]
+            if not process.is_alive():
+                print(f"⚠️ Serving worker {index} (pid {process.pid}) died with exit code {process.exitcode}; restarting")
+                self._stats["restarts"] += 1
+                self._live.discard(index)
+                for job_id in self._running.pop(index, set()):
+                    self._resolve(job_id, None, "worker died while handling the request")
+                self._spawn(index)
+
+    # ---- requests ----
+    def submit(self, text: str, thread_id: Optional[str] = None) -> Future:
+        with self._lock:
+            if self._draining:
+                raise Overloaded("draining")
+            if len(self._futures) >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise Overloaded(f"{len(self._futures)} requests pending")
+            job_id = next(self._ids)
+            future = Future()
+            self._futures[job_id] = future
+        self._tasks.put((job_id, text, thread_id))
+        return future
+
+    def invoke(self, text: str, thread_id: Optional[str] = None, timeout: Optional[float] = None) -> dict:
+        return self.submit(text, thread_id).result(timeout)
+
+    def drain(self, timeout: float = SERVE_DRAIN_TIMEOUT) -> bool:
+        """Stops admissions, waits for pending requests, stops the workers. True when nothing was cut off."""
+        with self._lock:
+            self._draining = True
+            clean = self._idle.wait_for(lambda: not self._futures, timeout=timeout)
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes.values():
+            process.join(timeout=max(timeout, 1.0))
+            if process.is_alive():
+                process.terminate()
+        if self._collector is not None:
+            self._collector.join(timeout=1.0)
+        print(f"🛑 Serving drained ({'clean' if clean else 'timed out'}): {self.stats()}")
+        return clean
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._futures)
+        return {
+            **self._stats,
+            "pending": pending,
+            "workers": sum(process.is_alive() for process in self._processes.values()),
+            "draining": self._draining,
+        }
+
+    def __enter__(self) -> "ServingRuntime":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.drain()
+
+
+# =========================
+# 4) Front ends
+# =========================
+def make_http_server(
+    runtime: ServingRuntime,
+    host: str = SERVE_HOST,
+    port: int = SERVE_PORT,
+    request_timeout: float = SERVE_REQUEST_TIMEOUT,
+) -> ThreadingHTTPServer:
+    """
+    POST /invoke {"input": "...", "thread_id": optional} -> 200 response_payload,
+    503 + Retry-After when overloaded or draining, 504 after `request_timeout` seconds
+    (a hung job no longer pins its handler thread or server_close()). GET /healthz -> runtime stats.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: dict, headers: Optional[dict] = None) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path != "/healthz":
+                return self._send(404, {"error": "not found"})
+            stats = runtime.stats()
+            self._send(503 if stats["draining"] else 200, stats)
+
+        def do_POST(self) -> None:
+            if self.path != "/invoke":
+                return self._send(404, {"error": "not found"})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                text = body["input"]
+            except (ValueError, KeyError, TypeError):
+                return self._send(400, {"error": 'expected JSON body {"input": "..."}'})
+            try:
+                future = runtime.submit(text, body.get("thread_id"))
+            except Overloaded as exc:
+                return self._send(503, {"error": f"overloaded: {exc}"}, {"Retry-After": "1"})
+            try:
+                self._send(200, future.result(timeout=request_timeout))
+            except FutureTimeout:
+                self._send(504, {"error": f"no response within {request_timeout:g}s"})
+            except Exception as exc:
+                self._send(500, {"error": str(exc)})
+
+        def log_message(self, format, *args) -> None:   # keep stdout for the routers' output
+            pass
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 128   # listen backlog; the default 5 resets bursts of new connections
+        daemon_threads = False     # server_close() waits for in-flight handlers before the drain
+
+    return Server((host, port), Handler)
+
+
+def serve_jsonl(runtime: ServingRuntime, lines, out=sys.stdout) -> int:
+    """
+    One request per line ({"id", "input", "thread_id"}), one response line each, in
+    completion order. Reading pauses while `max_pending` requests are in flight.
+    """
+    write_lock = threading.Lock()
+    slots = threading.Semaphore(runtime.max_pending)
+    count = 0
+
+    def emit(record: dict) -> None:
+        with write_lock:
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+    def finished(request_id, future: Future) -> None:
+        try:
+            emit({"id": request_id, **future.result()})
+        except Exception as exc:
+            emit({"id": request_id, "error": str(exc)})
+        finally:
+            slots.release()
+
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            text = request["input"]
+        except (ValueError, KeyError, TypeError):
+            emit({"id": None, "error": f"bad request line: {line.strip()[:80]}"})
+            continue
+        slots.acquire()
+        try:
+            future = runtime.submit(text, request.get("thread_id"))
+        except Overloaded as exc:
+            slots.release()
+            emit({"id": request.get("id"), "error": f"overloaded: {exc}"})
+            continue
+        future.add_done_callback(lambda f, request_id=request.get("id", count): finished(request_id, f))
+        count += 1
+
+    for _ in range(runtime.max_pending):   # wait for the last responses
+        slots.acquire()
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the supervisor graph from a pre-forked worker pool")
+    parser.add_argument("frontend", choices=["http", "jsonl"])
+    parser.add_argument("--variant", default=SERVE_VARIANT)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--threads", type=int, default=SERVE_WORKER_THREADS, help="conversations in flight per worker")
+    parser.add_argument("--max-pending", type=int, default=SERVE_MAX_PENDING)
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--request-timeout", type=float, default=SERVE_REQUEST_TIMEOUT, help="seconds before an HTTP 504")
+    args = parser.parse_args()
+
+    runtime = ServingRuntime(args.variant, args.workers, args.threads, args.max_pending).start()
+    if args.frontend == "jsonl":
+        try:
+            serve_jsonl(runtime, sys.stdin)
+        finally:
+            runtime.drain()
+        return
+
+    server = make_http_server(runtime, args.host, args.port, args.request_timeout)
+
+    def shutdown(signum, frame) -> None:
+        # graceful drain: stop accepting, finish in-flight requests, then stop workers
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    print(f"🌐 Listening on http://{args.host}:{args.port} (POST /invoke, GET /healthz)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        runtime.drain()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# speculation.py
+
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Optional, Iterable
+
+from plan_cache import get_plan_cache
+
+
+# =========================
+# 1) Configuration
+# =========================
+SPECULATION_MAX_WASTE = float(os.getenv("SPECULATION_MAX_WASTE", "5.0"))     # wasted agent-seconds per window
+SPECULATION_WINDOW = float(os.getenv("SPECULATION_WINDOW", "60.0"))          # seconds
+SPECULATION_MAX_INFLIGHT = int(os.getenv("SPECULATION_MAX_INFLIGHT", "8"))
+SPECULATION_MIN_CONFIDENCE = float(os.getenv("SPECULATION_MIN_CONFIDENCE", "0.5"))
+
+START = "__start__"
+
+
+# =========================
+# 2) Next-node predictor
+# =========================
+class TransitionPredictor:
+    """
+    Guesses the next agent:
+      - first hop: first step of the cached/templated plan for the user's question;
+      - later hops: the most frequent observed successor of the last visited node.
+    """
+
+    def __init__(self, min_confidence: float = SPECULATION_MIN_CONFIDENCE):
+        self.min_confidence = min_confidence
+        self._counts: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, previous: str, decision: str) -> None:
+        with self._lock:
+            successors = self._counts.setdefault(previous, {})
+            successors[decision] = successors.get(decision, 0) + 1
+
+    def predict(self, previous: str, user_input: str, candidates: Iterable[str]) -> Optional[str]:
+        candidates = list(candidates)
+        if previous == START and user_input:
+            stages = get_plan_cache().lookup(user_input, candidates)
+            if stages:
+                return stages[0][0]
+
+        with self._lock:
+            successors = dict(self._counts.get(previous, {}))
+        total = sum(successors.values())
+        if not total:
+            return None
+        best, count = max(successors.items(), key=lambda item: item[1])
+        if best not in candidates or count / total < self.min_confidence:
+            return None
+        return best
+
+
+# =========================
+# 3) Speculator (budget + metrics)
+# =========================
+class Speculator:
+    """
+    Decides whether to start a speculative agent run and accounts for the outcome.
+
+    Wasted work (agent time spent on a guess the router rejected) is capped at
+    `max_waste` agent-seconds per sliding `window`; once spent, speculation pauses
+    until old waste ages out.
+    """
+
+    def __init__(
+        self,
+        predictor: Optional[TransitionPredictor] = None,
+        max_waste: float = SPECULATION_MAX_WASTE,
+        window: float = SPECULATION_WINDOW,
+        max_inflight: int = SPECULATION_MAX_INFLIGHT,
+        allowed: Optional[Iterable[str]] = None,
+    ):
+        self.predictor = predictor or TransitionPredictor()
+        self.max_waste = max_waste
+        self.window = window
+        self.max_inflight = max_inflight
+        self.allowed = set(allowed) if allowed is not None else None
+
+        self._waste: deque[tuple[float, float]] = deque()   # (finished_at, seconds)
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "attempts": 0, "hits": 0, "misses": 0, "cancelled": 0, "failed": 0,
+            "skipped_budget": 0, "no_prediction": 0, "saved_seconds": 0.0, "wasted_seconds": 0.0,
+        }
+
+    def _waste_in_window(self, now: float) -> float:
+        while self._waste and now - self._waste[0][0] > self.window:
+            self._waste.popleft()
+        return sum(seconds for _, seconds in self._waste)
+
+    def predict(self, previous: str, user_input: str, candidates: Iterable[str]) -> Optional[str]:
+        candidates = [c for c in candidates if self.allowed is None or c in self.allowed]
+        guess = self.predictor.predict(previous, user_input, candidates)
+        if guess is None:
+            with self._lock:
+                self._stats["no_prediction"] += 1
+        return guess
+
+    def try_start(self) -> bool:
+        with self._lock:
+            if self._inflight >= self.max_inflight or self._waste_in_window(time.monotonic()) >= self.max_waste:
+                self._stats["skipped_budget"] += 1
+                return False
+            self._inflight += 1
+            self._stats["attempts"] += 1
+            return True
+
+    def commit(self, overlap_seconds: float) -> None:
+        """The router agreed with the guess; `overlap_seconds` of routing latency was hidden."""
+        with self._lock:
+            self._inflight -= 1
+            self._stats["hits"] += 1
+            self._stats["saved_seconds"] += overlap_seconds
+
+    def fail(self, started_at: float) -> None:
+        """The router agreed but the speculative run raised: no hit, its time is charged as waste."""
+        finished = time.monotonic()
+        with self._lock:
+            self._inflight -= 1
+            self._stats["failed"] += 1
+            self._waste.append((finished, finished - started_at))
+            self._stats["wasted_seconds"] += finished - started_at
+
+    def discard(self, future: Future, started_at: float) -> None:
+        """The router picked something else: cancel if not started, otherwise charge the work as waste."""
+        with self._lock:
+            self._stats["misses"] += 1
+        if future.cancel():
+            with self._lock:
+                self._inflight -= 1
+                self._stats["cancelled"] += 1
+            return
+
+        def charge(_):
+            finished = time.monotonic()
+            with self._lock:
+                self._inflight -= 1
+                self._waste.append((finished, finished - started_at))
+                self._stats["wasted_seconds"] += finished - started_at
+
+        future.add_done_callback(charge)
+
+    def observe(self, previous: str, decision: str) -> None:
+        self.predictor.observe(previous, decision)
+
+    def stats(self) -> dict:
+        with self._lock:
+            decided = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "inflight": self._inflight,
+                "hit_rate": self._stats["hits"] / decided if decided else 0.0,
+                "waste_in_window": self._waste_in_window(time.monotonic()),
+            }
@@ -0,0 +1,280 @@
+# state_logs.py
+
+import asyncio
+import weakref
+import operator
+import functools
+import itertools
+import threading
+from collections.abc import Sequence, Set as AbstractSet
+from typing import Callable, Iterable, Iterator, Optional
+
+
+# -----------------------------
+# 📜 Append-only logs for state["feedback"] / state["visited"]
+# -----------------------------
+class _Spine:
+    """
+    Items shared by every log cut from it. Only ever appended at the end, so the
+    first `n` items seen by a log of length `n` never change under it.
+    """
+
+    __slots__ = ("items", "first", "parent", "lock", "__weakref__")
+
+    def __init__(self, items: Iterable = (), parent: Optional[tuple] = None):
+        self.items: list = []
+        self.first: dict = {}      # item -> index of its first occurrence
+        self.parent = parent       # (weakref to the spine this one was forked from, shared length)
+        self.lock = threading.Lock()
+        self.push(items)
+
+    def push(self, items: Iterable) -> None:
+        for item in items:
+            try:
+                self.first.setdefault(item, len(self.items))
+            except TypeError:   # unhashable items are still stored, just not indexed
+                pass
+            self.items.append(item)
+
+
+class AppendLog(Sequence):
+    """
+    Persistent append-only log: a length over a shared spine, plus the spine's
+    first-index table so `item in log` is O(1).
+
+    `log + items` (and `append` / `extend`) adds to the end of the spine when `log` is
+    its newest cut, so the cost depends only on the new items and every earlier log
+    still sees exactly what it saw before. Growing an older cut forks a spine of its
+    own (one copy, then O(new) again). Reads (len, indexing, slicing, iteration,
+    ==, pickling) behave like the list it stands for; `list(log)` for a real list.
+    """
+
+    __slots__ = ("_spine", "_len")
+
+    def __init__(self, items: Iterable = ()):
+        if isinstance(items, AppendLog):   # same history, nothing copied
+            self._spine, self._len = items._spine, items._len
+        else:
+            self._spine = _Spine(items)
+            self._len = len(self._spine.items)
+
+    @classmethod
+    def _cut(cls, spine: _Spine, length: int) -> "AppendLog":
+        log = cls.__new__(cls)
+        log._spine, log._len = spine, length
+        return log
+
+    def _grow(self, items: Iterable) -> tuple[_Spine, int]:
+        items = list(items)
+        spine = self._spine
+        if not items:
+            return spine, self._len
+        with spine.lock:
+            if len(spine.items) == self._len:   # newest cut: extend the shared spine
+                spine.push(items)
+                return spine, len(spine.items)
+        fork = _Spine(spine.items[:self._len], parent=(weakref.ref(spine), self._len))
+        fork.push(items)
+        return fork, len(fork.items)
+
+    # ---- growing ----
+    def __add__(self, items: Iterable) -> "AppendLog":
+        return self._cut(*self._grow(items))
+
+    def __radd__(self, items: Iterable) -> list:
+        return list(items) + list(self)
+
+    def append(self, item) -> None:
+        self._spine, self._len = self._grow((item,))
+
+    def extend(self, items: Iterable) -> None:
+        self._spine, self._len = self._grow(items)
+
+    def __iadd__(self, items: Iterable) -> "AppendLog":
+        self.extend(items)
+        return self
+
+    def copy(self) -> "AppendLog":
+        return self._cut(self._spine, self._len)
+
+    # ---- reading ----
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step == 1:
+                return self._spine.items[start:stop]
+            return [self._spine.items[i] for i in range(start, stop, step)]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("AppendLog index out of range")
+        return self._spine.items[index]
+
+    def __iter__(self) -> Iterator:
+        return itertools.islice(self._spine.items, self._len)
+
+    def __reversed__(self) -> Iterator:
+        return reversed(self._spine.items[:self._len])
+
+    def __contains__(self, item) -> bool:
+        try:
+            first = self._spine.first.get(item)
+        except TypeError:
+            return any(item == x for x in self)
+        return first is not None and first < self._len
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, AppendLog) and other._spine is self._spine:
+            return other._len == self._len
+        if isinstance(other, (AppendLog, list, tuple)):
+            return len(other) == self._len and all(map(operator.eq, self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def __reduce__(self):
+        return (AppendLog, (list(self),))
+
+    def members(self) -> AbstractSet:
+        """Set view of the distinct (hashable) items; O(1) to create and to query."""
+        return _Members(self)
+
+    # ---- shared history ----
+    def _lineage(self) -> Iterator[tuple[_Spine, int]]:
+        spine, length = self._spine, self._len
+        while spine is not None:
+            yield spine, length
+            if spine.parent is None:
+                return
+            ref, shared = spine.parent
+            spine, length = ref(), min(length, shared)
+
+    def shared_prefix(self, other: "AppendLog") -> int:
+        """Length of the history both logs were cut from (0 when they share none)."""
+        limits = {id(spine): length for spine, length in other._lineage()}
+        for spine, length in self._lineage():
+            if id(spine) in limits:
+                return min(length, limits[id(spine)])
+        return 0
+
+
+class _Members(AbstractSet):
+    """`AppendLog.members()`: the items of one cut, answered from the spine's index."""
+
+    __slots__ = ("_log",)
+
+    def __init__(self, log: AppendLog):
+        self._log = log
+
+    def __contains__(self, item) -> bool:
+        return item in self._log
+
+    def __iter__(self) -> Iterator:
+        log = self._log
+        return (item for item, first in log._spine.first.items() if first < log._len)
+
+    def __len__(self) -> int:
+        log = self._log
+        if len(log._spine.items) == log._len:
+            return len(log._spine.first)
+        return sum(1 for _ in self)
+
+
+def append_log(left: Optional[Sequence], right: Optional[Sequence]) -> AppendLog:
+    """
+    Reducer for `feedback` / `visited`: `Annotated[list[str], append_log]`.
+
+    Nodes return only the items they add (`{"visited": ["database_node"]}`); the result
+    is a new cut of the log, O(new items), and the previous state's log is unchanged.
+    Also accepted: the log itself (nodes that mutate and return `state`) and the
+    legacy full list `state["feedback"] + [line]`, recognized by the history it shares
+    with `left` (only the items past that history are added, never the whole log again).
+    """
+    log = left if isinstance(left, AppendLog) else AppendLog(left or ())
+    if not right or right is log:
+        return log
+    if isinstance(right, AppendLog):
+        shared = right.shared_prefix(log)
+        if shared == len(log):   # `log + [...]`: already the merged log
+            return right
+        right = right[shared:]
+    return log + right
+
+
+def log_delta(base: Sequence, returned: Optional[Sequence], base_len: Optional[int] = None) -> list:
+    """
+    Items a node added, from what it returned: its new items; for a log cut from
+    `base` (`base` itself after appending in place, or `base + [...]`), the items past
+    the history they share, or past `base_len` (the length before the node ran).
+    """
+    if not returned:
+        return []
+    if returned is base:
+        return list(base[base_len:]) if base_len is not None else []
+    if isinstance(returned, AppendLog) and isinstance(base, AppendLog):
+        shared = returned.shared_prefix(base)
+        return list(returned[shared if base_len is None else min(shared, base_len):])
+    return list(returned)
+
+
+# -----------------------------
+# 🧭 Routers as nodes (their feedback goes through the reducer)
+# -----------------------------
+def routing_node(router: Callable) -> Callable:
+    """
+    Runs a router (sync or async) as a graph node. The lines it appends to
+    `state["feedback"]` land in a list of this hop's own, returned as the node's
+    update with the decision in `next_node`; branch on it with `routed`:
+
+        builder.add_node("supervisor", routing_node(supervisor))
+        builder.add_conditional_edges("supervisor", routed, routing_map)
+    """
+    if asyncio.iscoroutinefunction(router):
+        @functools.wraps(router)
+        async def aroute(state: dict) -> dict:
+            feedback: list = []
+            decision = await router({**state, "feedback": feedback})
+            return {"feedback": feedback, "next_node": decision}
+        return aroute
+
+    @functools.wraps(router)
+    def route(state: dict) -> dict:
+        feedback: list = []
+        decision = router({**state, "feedback": feedback})
+        return {"feedback": feedback, "next_node": decision}
+    return route
+
+
+def routed(state: dict) -> str:
+    """Conditional edge after a `routing_node`: the decision it left in `next_node`."""
+    return state["next_node"]
+
+
+def log_members(value: Optional[list]) -> AbstractSet:
+    """O(1)-membership view of a log (e.g. `name in log_members(state["visited"])`)."""
+    if isinstance(value, AppendLog):
+        return value.members()
+    return set(value or ())
+
+
+# -----------------------------
+# 💬 Message reducer (langgraph imported on first use)
+# -----------------------------
+_ADD_MESSAGES = None
+
+
+def add_messages(left, right):
+    """
+    `langgraph.prebuilt.add_messages` for `Annotated[list[BaseMessage], add_messages]`,
+    resolved on the first reduce so importing a state schema doesn't load langgraph.
+    """
+    global _ADD_MESSAGES
+    if _ADD_MESSAGES is None:
+        from langgraph.prebuilt import add_messages as _ADD_MESSAGES
+    return _ADD_MESSAGES(left, right)
@@ -0,0 +1,176 @@
+# streaming.py
+
+import time
+import queue
+import asyncio
+import threading
+import contextvars
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, Optional
+
+from tracing import current_span
+
+
+# =========================
+# 1) Event sink
+# =========================
+# Set for the duration of one streamed graph run; producers check it and emit deltas.
+# Unset (the default), every producer takes its plain invoke path.
+_SINK: contextvars.ContextVar[Optional[Callable[[dict], None]]] = contextvars.ContextVar("stream_sink", default=None)
+
+
+def streaming_enabled() -> bool:
+    return _SINK.get() is not None
+
+
+def emit(event: str, name: str, node: Optional[str] = None, **data) -> None:
+    """
+    Sends one `astream_events`-style event to the current run's consumer (no-op when
+    nothing is streaming). Events carry only the delta in `data`, never the state.
+    """
+    sink = _SINK.get()
+    if sink is not None:
+        sink({"event": event, "name": name, "metadata": {"langgraph_node": node}, "data": data, "ts": time.time()})
+
+
+def chunk_text(chunk: Any) -> str:
+    """Text of a streamed chunk: a plain string or a message(-chunk) with string content."""
+    content = chunk if isinstance(chunk, str) else getattr(chunk, "content", "")
+    return content if isinstance(content, str) else ""
+
+
+def stream_node() -> Optional[str]:
+    """Name of the node / router running now (tracing.traced opens a span named after it)."""
+    span = current_span()
+    return span.name if span is not None else None
+
+
+# =========================
+# 2) Producers
+# =========================
+def collect_llm_stream(chunks: Iterable[Any], node: Optional[str] = None) -> str:
+    """Forwards each completion chunk as `on_llm_stream` and returns the joined completion."""
+    parts = []
+    for chunk in chunks:
+        text = chunk_text(chunk)
+        if text:
+            parts.append(text)
+            emit("on_llm_stream", "llm", node, chunk=text)
+    return "".join(parts)
+
+
+async def acollect_llm_stream(chunks: AsyncIterator[Any], node: Optional[str] = None) -> str:
+    parts = []
+    async for chunk in chunks:
+        text = chunk_text(chunk)
+        if text:
+            parts.append(text)
+            emit("on_llm_stream", "llm", node, chunk=text)
+    return "".join(parts)
+
+
+def _agent_event(node: str, mode: str, payload: Any) -> Optional[dict]:
+    # "messages" payloads are (message chunk, metadata); "values" is the agent state after a step
+    if mode == "values":
+        return payload
+    message = payload[0] if isinstance(payload, tuple) else payload
+    text = chunk_text(message)
+    if text:
+        emit("on_chat_model_stream", node, node, chunk=text, message_type=type(message).__name__)
+    return None
+
+
+def stream_agent(agent: Any, state: dict, node: str) -> dict:
+    """
+    Runs a react agent with `stream_mode=["messages", "values"]`: message chunks (tool
+    results, answer tokens) are emitted as they arrive, the last "values" state is
+    returned like `invoke` would.
+    """
+    emit("on_chat_model_start", node, node)
+    result = None
+    for mode, payload in agent.stream(state, stream_mode=["messages", "values"]):
+        values = _agent_event(node, mode, payload)
+        if values is not None:
+            result = values
+    emit("on_chat_model_end", node, node)
+    return result
+
+
+async def astream_agent(agent: Any, state: dict, node: str) -> dict:
+    emit("on_chat_model_start", node, node)
+    result = None
+    async for mode, payload in agent.astream(state, stream_mode=["messages", "values"]):
+        values = _agent_event(node, mode, payload)
+        if values is not None:
+            result = values
+    emit("on_chat_model_end", node, node)
+    return result
+
+
+def emit_text(node: str, text: str) -> None:
+    """For nodes that produce their output in one piece (no underlying stream)."""
+    if text:
+        emit("on_chat_model_stream", node, node, chunk=text, message_type="str")
+
+
+# =========================
+# 3) Consumers
+# =========================
+_DONE = object()
+
+
+def stream_events(graph: Any, state: dict, config: Optional[dict] = None) -> Iterator[dict]:
+    """
+    Runs `graph.invoke` on a background thread and yields its events as they happen;
+    the last event is `on_chain_end` with the final state as `data["output"]`.
+    Breaking out early stops the iteration, not the run.
+    """
+    events: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+
+    def run() -> None:
+        _SINK.set(events.put)
+        try:
+            result = graph.invoke(state, config)
+            events.put({"event": "on_chain_end", "name": "graph", "metadata": {"langgraph_node": None},
+                        "data": {"output": result}, "ts": time.time()})
+        except BaseException as exc:
+            events.put(exc)
+        finally:
+            events.put(_DONE)
+
+    # a fresh context copy: the sink stays local to this run even when callers share threads
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), name="graph-stream", daemon=True).start()
+    while True:
+        event = events.get()
+        if event is _DONE:
+            return
+        if isinstance(event, BaseException):
+            raise event
+        yield event
+
+
+async def astream_events(graph: Any, state: dict, config: Optional[dict] = None) -> AsyncIterator[dict]:
+    """Async twin of `stream_events` over `graph.ainvoke`; sync nodes on worker threads can emit too."""
+    loop = asyncio.get_running_loop()
+    events: "asyncio.Queue[Any]" = asyncio.Queue()
+
+    def sink(event: dict) -> None:
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    token = _SINK.set(sink)
+    try:
+        task = asyncio.create_task(graph.ainvoke(state, config))   # the task keeps its own copy of the sink
+    finally:
+        _SINK.reset(token)
+    # scheduled after every event the run emitted before finishing
+    task.add_done_callback(lambda _: loop.call_soon_threadsafe(events.put_nowait, _DONE))
+    try:
+        while True:
+            event = await events.get()
+            if event is _DONE:
+                break
+            yield event
+        yield {"event": "on_chain_end", "name": "graph", "metadata": {"langgraph_node": None},
+               "data": {"output": task.result()}, "ts": time.time()}
+    finally:
+        if not task.done():
+            task.cancel()
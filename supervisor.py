@@ -1,65 +1,90 @@
 # src/supervisor.py
 
-import os
-import json
+import time
+import weakref
+import contextvars
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict
 from typing_extensions import TypedDict, Annotated
 
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import add_messages
 from langchain_core.messages import BaseMessage, HumanMessage
 
-from nodes import AGENT_NODES             # name -> node_fn (defined in nodes.py)
-from LLM.Gemini import VertexAI           # your Vertex wrapper
+from agent_outputs import merge_agent_outputs
+from state_logs import append_log, log_delta, log_members, routed, routing_node
+from compaction import add_compacted_messages   # add_messages + history compaction / spill
+
+from nodes import AGENT_NODES, ASYNC_AGENT_NODES, agent_nodes_for, async_agent_nodes_for   # name -> node_fn
+from llm_pool import warm_up_model_pool                             # pooled Vertex clients
+from routing_batcher import route_llm, aroute_llm                   # batched across conversations when enabled
+from agent_pool import warm_up_agent_pool                           # pooled worker agents
+from routing_rules import get_rule_engine             # zero-LLM fast path
+from routing_cache import get_routing_cache, routing_fingerprint
+from speculation import Speculator, START
+from prompt_budget import PromptBudget, aprepare, log_savings
+from prompt_templates import PromptTemplate
+from registry_service import RegistrySnapshot, RegistryBoundGraph, bind_registry, get_registry, load_agent_registry, REGISTRY_PATH
+from intent_classifier import classify_first_hop, log_routing_decision   # local first-hop routing
+from tracing import traced
+from execution_controller import should_stop   # hop / deadline / LLM budget per request
+from route_parser import resolve_route, aresolve_route   # registry-matched replies, one repair
+from streaming import emit_text, chunk_text
 
 
 # =========================
 # 1) Shared state schema
 # =========================
 class MultiAgentState(TypedDict):
-    messages: Annotated[list[BaseMessage], add_messages]
-    feedback: list[str]
+    messages: Annotated[list[BaseMessage], add_compacted_messages]
+    feedback: Annotated[list[str], append_log]   # nodes return only the lines they add
     current_node: Optional[str]
     next_node: Optional[str]
-    visited: list[str]
+    visited: Annotated[list[str], append_log]    # nodes return only the nodes they add; O(1) `in`
+    agent_outputs: Annotated[dict[str, str], merge_agent_outputs]   # node -> first output
 
 
 # =========================
-# 2) Registry loader
+# 2) Registry
 # =========================
-REGISTRY_PATH = os.path.join(os.path.dirname(__file__), "config", "agent_registry.json")
-
-def load_agent_registry(path: str) -> Dict[str, dict]:
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"Agent registry file not found at: {path}")
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    # soft validation (schema-lite): require `prompt` and recommend `agent`
-    missing = [
-        name for name, info in data.items()
-        if not isinstance(info, dict) or "prompt" not in info
-    ]
-    if missing:
-        raise ValueError(
-            "Invalid agent_registry.json. Missing `prompt` field for: "
-            + ", ".join(missing)
-        )
-    return data
-
-AGENT_REGISTRY = load_agent_registry(REGISTRY_PATH)
+# Served by registry_service (hot reload, versioned snapshots). Routers take one
+# snapshot per decision via get_registry(), limited to their graph's nodes;
+# `load_agent_registry` / `REGISTRY_PATH` are re-exported for existing callers.
 
 
 # =========================
 # 3) LLM-based supervisor
 # =========================
-def supervisor(state: MultiAgentState) -> str:
+# Static part first (cacheable by the backend), per-request part last
+SUPERVISOR_PROMPT = PromptTemplate(
+    name="supervisor",
+    prefix="""
+You are the supervisor of a multi-agent system.
+
+Available agents:
+{agent_descriptions}
+
+Reply with ONLY one of: {agent_names}, END
+(END when the task is complete). Do not add extra words.
+
+""",
+    suffix="""The last message was:
+\"\"\"{last_text}\"\"\"
+
+Which agent should handle this next?
+""",
+)
+
+
+def _prepare_route(state: MultiAgentState) -> tuple[Optional[str], str, str, RegistrySnapshot]:
     """
-    Router:
-      - On first hop: routes using the user's message.
-      - On later hops: routes using the last node's output (the last message in state).
-      - Writes a simple trace to state['feedback'].
+    Everything before the model call, shared by the sync and async routers.
+    Returns (decision, routing_prompt, cache_key, registry); decision is set when a
+    rule or the routing cache already answered, or the request's budget is spent.
+    `registry` is the one snapshot the whole decision is made against.
     """
+    registry = get_registry()
+    if should_stop(state, "Supervisor"):
+        return "END", "", "", registry
 
     # Get the latest message (Human/AI/Tool)
     if state["messages"]:
@@ -72,64 +97,287 @@ def supervisor(state: MultiAgentState) -> str:
     else:
         last_text = ""
 
-    # Build agent descriptions from registry
-    agent_descriptions = "\n".join(
-        f"- {node_name}: {info['prompt']}"
-        for node_name, info in AGENT_REGISTRY.items()
+    visited = log_members(state.get("visited"))
+
+    # Fast path: a matching rule decides without a model call
+    rule = get_rule_engine().resolve(
+        "supervisor.supervisor",
+        {"last_output": last_text, "user_input": last_text},
+        visited=visited,
+        allowed=registry.routes,
     )
+    if rule:
+        state["feedback"].append(f"Supervisor routed to: {rule.route} (rule: {rule.rule})")
+        return rule.route, "", "", registry
 
-    routing_prompt = f"""
-You are the supervisor of a multi-agent system.
+    # Recurring prompt: reuse the previous decision
+    cache_key = routing_fingerprint("supervisor.supervisor", "", last_text, registry.names)
+    cached = get_routing_cache().get(cache_key)
+    if cached:
+        state["feedback"].append(f"Supervisor routed to: {cached} (cached)")
+        return cached, "", cache_key, registry
 
-Available agents:
-{agent_descriptions}
+    # First hop: a confident local classifier picks the agent from the user's text
+    if not visited:
+        intent = classify_first_hop("supervisor", last_text, registry.__contains__)
+        if intent:
+            state["feedback"].append(f"Supervisor routed to: {intent} (classifier)")
+            return intent, "", cache_key, registry
 
-The last message was:
-\"\"\"{last_text}\"\"\"
+    # Long DB dumps / listings are cut to the section budget (head + tail kept)
+    budget = PromptBudget()
+
+    # Agent descriptions come precomputed from the template registry
+    routing_prompt = registry.templates.render(
+        SUPERVISOR_PROMPT, last_text=budget.fit("last_output", last_text)
+    )
+    log_savings("Supervisor", budget.finish())
+    return None, routing_prompt, cache_key, registry
 
-Which agent should handle this next?
-Reply with ONLY the agent node name exactly as listed above (e.g., database_node). Do not add extra words.
-"""
 
-    model = VertexAI().getVertexModel()
-    decision = model.invoke(routing_prompt).strip().lower()
+def _finish_route(state: MultiAgentState, decision: Optional[str], cache_key: str, registry: RegistrySnapshot) -> str:
+    """`decision`: the parsed reply (agent name or "END"), None when even the repair failed."""
 
-    if decision not in AGENT_REGISTRY:
+    if decision is not None:
+        # only usable answers are worth replaying
+        get_routing_cache().put(cache_key, decision)
+    if decision not in registry:
         decision = "END"
+    elif not log_members(state.get("visited")) and state["messages"]:
+        # first-hop LLM decisions are the classifier's training data
+        log_routing_decision("supervisor", getattr(state["messages"][-1], "content", ""), decision)
 
     # trace for debugging/audit
     state["feedback"].append(f"Supervisor routed to: {decision}")
     return decision
 
 
+# LLM stream events name the router explicitly (the tracing span is absent with TRACING_ENABLED=0)
+_ask = partial(route_llm, node="supervisor")
+_aask = partial(aroute_llm, node="supervisor")
+
+
+@traced("supervisor", kind="router")
+def supervisor(state: MultiAgentState) -> str:
+    """
+    Router:
+      - On first hop: routes using the user's message.
+      - On later hops: routes using the last node's output (the last message in state).
+      - Tries the declarative routing rules, then the routing cache; the LLM is only called on a miss.
+      - Writes a simple trace to state['feedback'] (this hop's own list under `routing_node`).
+    """
+    decision, routing_prompt, cache_key, registry = _prepare_route(state)
+    if decision:
+        return decision
+    parsed = resolve_route("supervisor", routing_prompt, _ask(routing_prompt), registry.names, _ask)
+    return _finish_route(state, parsed, cache_key, registry)
+
+
+@traced("supervisor", kind="router")
+async def asupervisor(state: MultiAgentState) -> str:
+    """Async twin of `supervisor`: awaits the model instead of blocking the event loop."""
+    decision, routing_prompt, cache_key, registry = await aprepare(_prepare_route, state)
+    if decision:
+        return decision
+    parsed = await aresolve_route("supervisor", routing_prompt, await _aask(routing_prompt), registry.names, _aask)
+    return _finish_route(state, parsed, cache_key, registry)
+
+
 # =========================
-# 4) Graph builder
+# 4) Speculative supervisor (opt-in)
 # =========================
-def build_supervisor_graph():
+RE_ROUTE = "supervisor"   # next_node after a committed speculative run: route again
+
+
+def _last_user_input(messages: list[BaseMessage]) -> str:
+    for msg in reversed(messages):
+        if isinstance(msg, HumanMessage):
+            return msg.content.strip()
+    return ""
+
+
+def make_speculative_supervisor_node(agent_nodes: Dict[str, object], speculator: Speculator, max_workers: int = 4):
     """
-    Build a graph with:
-      - One node per entry in agent_registry.json
-      - Each node returns to the 'supervisor' router
-      - The router decides the next node name via LLM
+    Supervisor as a node: while the routing LLM call is in flight, the predicted
+    agent already runs on a worker thread against a private copy of the state.
+      - Router agrees  -> the agent's update is committed and we route again.
+      - Router differs -> the run is cancelled (or its result dropped) and charged
+                          to the speculator's waste budget.
+      - Run raised     -> charged as waste; the agent runs again as a normal hop.
+    The speculation threads are exposed as `.executor` (shut down with the graph).
     """
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculate")
+
+    @traced("supervisor", kind="router")
+    def speculative_supervisor(state: MultiAgentState) -> MultiAgentState:
+        feedback: list[str] = []   # this hop's lines only; the append_log reducer adds them
+        route_state = {**state, "feedback": feedback}
+        visited = state.get("visited", [])
+        previous = visited[-1] if visited else START
+
+        decision, routing_prompt, cache_key, registry = _prepare_route(route_state)
+        if decision:
+            speculator.observe(previous, decision)
+            return {"feedback": feedback, "next_node": decision}
+
+        predicted = speculator.predict(previous, _last_user_input(state["messages"]), agent_nodes)
+        future = None
+        if predicted and speculator.try_start():
+            started_at = time.monotonic()
+            # agent nodes return their additions instead of mutating the logs,
+            # so the live feedback/visited logs can be shared without copying; the
+            # copied context carries the budget, span parent and event stream along
+            future = pool.submit(
+                contextvars.copy_context().run,
+                agent_nodes[predicted], {**state, "messages": list(state["messages"])},
+            )
+
+        try:
+            parsed = resolve_route("supervisor", routing_prompt, _ask(routing_prompt), registry.names, _ask)
+        except Exception:
+            if future is not None:
+                speculator.discard(future, started_at)   # release the in-flight slot
+            raise
+        decision = _finish_route(route_state, parsed, cache_key, registry)
+        speculator.observe(previous, decision)
+
+        if future is None:
+            return {"feedback": feedback, "next_node": decision}
+
+        if decision == predicted:
+            overlap = time.monotonic() - started_at
+            try:
+                update = future.result()
+            except Exception as e:
+                speculator.fail(started_at)
+                print(f"⚠️ Speculative {predicted} failed: {e}")
+                feedback.append(f"⚡ Speculative {predicted} failed; running it normally")
+                return {"feedback": feedback, "next_node": decision}
+            speculator.commit(overlap)
+            # the speculation thread has no stream sink: emit the committed answer now
+            if update.get("messages"):
+                emit_text(predicted, chunk_text(update["messages"][-1]))
+            feedback.extend(log_delta(state["feedback"], update.get("feedback")))
+            feedback.append(f"⚡ Speculative {predicted} committed")
+            return {**update, "feedback": feedback, "next_node": RE_ROUTE}
+
+        speculator.discard(future, started_at)
+        feedback.append(f"⚡ Speculative {predicted} discarded (router chose {decision})")
+        return {"feedback": feedback, "next_node": decision}
+
+    speculative_supervisor.executor = pool
+    return speculative_supervisor
+
+
+# =========================
+# 5) Graph builder
+# =========================
+def _build_graph(
+    router,
+    agent_nodes: Dict[str, object],
+    registry_attr: str,
+    speculator: Optional[Speculator] = None,
+    checkpointer=None,
+    registry: Optional[RegistrySnapshot] = None,
+):
+    from langgraph.graph import StateGraph, END   # heavy: only when a graph is actually built
+    from checkpoint import get_checkpointer       # durable, delta-encoded state (opt-in)
+
+    registry = registry or get_registry()
+
+    # Open the shared LLM clients and build one instance per agent now,
+    # so neither the first routing hop nor the first agent visit pays setup
+    warm_up_model_pool()
+    warm_up_agent_pool(list(registry.names))
+
     builder = StateGraph(MultiAgentState)
 
     # Add nodes dynamically, ensuring node function exists
-    for node_name in AGENT_REGISTRY.keys():
-        node_fn = AGENT_NODES.get(node_name)
+    for node_name in registry.names:
+        node_fn = agent_nodes.get(node_name)
         if node_fn is None:
             raise ValueError(
                 f"Missing node function for '{node_name}'. "
-                f"Define it in nodes.py and expose it via AGENT_NODES."
+                f"Define it in nodes.py and expose it via {registry_attr}."
             )
         builder.add_node(node_name, node_fn)
         builder.add_edge(node_name, "supervisor")
 
-    # Router mapping
-    routing_map = {name: name for name in AGENT_REGISTRY.keys()}
-    routing_map["END"] = END
+    # Router mapping; the routers only see the agents this graph has edges for,
+    # whatever is added to the registry while it is compiled
+    routing_map = {**registry.routing_map, "END": END}
 
-    builder.add_conditional_edges("supervisor", supervisor, routing_map)
+    # the supervisor is a real node: its feedback goes through the reducer, its decision to next_node
+    if speculator is None:
+        supervisor_node = routing_node(router)
+    else:
+        supervisor_node = make_speculative_supervisor_node(agent_nodes, speculator)
+        routing_map[RE_ROUTE] = "supervisor"
+    builder.add_node("supervisor", bind_registry(supervisor_node, registry.name_set))
+    builder.add_conditional_edges("supervisor", routed, routing_map)
     builder.set_entry_point("supervisor")
 
-    return builder.compile()
+    graph = builder.compile(checkpointer=checkpointer or get_checkpointer())
+    if speculator is not None:
+        # the speculation threads live as long as the graph (registry rebuilds drop old graphs)
+        weakref.finalize(graph, supervisor_node.executor.shutdown, wait=False)
+    return graph
+
+
+def build_supervisor_graph(
+    speculative: bool = False,
+    speculator: Optional[Speculator] = None,
+    checkpointer=None,
+    registry: Optional[RegistrySnapshot] = None,
+):
+    """
+    Build a graph with:
+      - One node per entry in agent_registry.json
+      - Each node returns to the 'supervisor' router
+      - The router decides the next node name via LLM
+      - speculative=True: the likely next agent starts while the LLM decides
+        (agents with `"speculative": false` in the registry are never started early;
+        pass your own `speculator` to read its hit-rate and waste metrics)
+      - checkpointer: saver to persist every hop (defaults to checkpoint.get_checkpointer(),
+        i.e. the SQLite saver at CHECKPOINT_PATH when set); invoke with
+        `thread_config(thread_id)` and resume a crashed run with input None
+      - registry: snapshot to build against (default: the current one)
+    """
+    registry = registry or get_registry()
+    if speculative and speculator is None:
+        speculator = Speculator(allowed=registry.speculative)
+    return _build_graph(
+        supervisor, agent_nodes_for(registry.names, AGENT_NODES), "AGENT_NODES",
+        speculator if speculative else None, checkpointer, registry,
+    )
+
+
+def build_async_supervisor_graph(checkpointer=None, registry: Optional[RegistrySnapshot] = None):
+    """
+    Same topology as `build_supervisor_graph`, wired with `asupervisor` and the async
+    worker nodes. Drive it with `ainvoke`/`astream` so one event loop can serve many
+    conversations concurrently.
+    """
+    registry = registry or get_registry()
+    return _build_graph(
+        asupervisor, async_agent_nodes_for(registry.names, ASYNC_AGENT_NODES), "ASYNC_AGENT_NODES",
+        checkpointer=checkpointer, registry=registry,
+    )
+
+
+def build_live_supervisor_graph(speculative: bool = False, speculator: Optional[Speculator] = None, checkpointer=None):
+    """
+    `build_supervisor_graph` that follows the agent registry: agents added to or removed
+    from agent_registry.json get a rebuilt graph on the next invocation, without a
+    restart; other registry edits apply without any rebuild.
+    """
+    if speculative and speculator is None:
+        speculator = Speculator(allowed=get_registry().speculative)
+    return RegistryBoundGraph(
+        lambda registry: build_supervisor_graph(speculative, speculator, checkpointer, registry)
+    )
+
+
+def build_live_async_supervisor_graph(checkpointer=None):
+    """Registry-following twin of `build_async_supervisor_graph`."""
+    return RegistryBoundGraph(lambda registry: build_async_supervisor_graph(checkpointer, registry))
@@ -1,28 +1,27 @@
 # supervisor.py
 
-import os
-import json
+from functools import partial
 from typing import Optional
 from typing_extensions import TypedDict, Annotated
 
 from langgraph.schema import BaseMessage, HumanMessage
-from langgraph.prebuilt import add_messages
-from LLM.Gemini import VertexAI
-
-
-# --- Load agent registry ---
-REGISTRY_PATH = os.path.join(os.path.dirname(__file__), "config", "agent_registry.json")
-with open(REGISTRY_PATH, "r", encoding="utf-8") as f:
-    AGENT_REGISTRY = json.load(f)
+from state_logs import add_messages, append_log, routing_node
+from llm_pool import invoke_llm
+from routing_rules import get_rule_engine
+from prompt_budget import PromptBudget, log_savings
+from registry_service import get_registry   # hot-reloaded snapshot, taken once per decision
+from tracing import traced
+from execution_controller import should_stop
+from route_parser import resolve_route, route_options
 
 
 # --- Define MultiAgentState ---
 class MultiAgentState(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
-    feedback: list[str]
+    feedback: Annotated[list[str], append_log]   # nodes return only the lines they add
     current_node: Optional[str]
     next_node: Optional[str]
-    visited: list[str]
+    visited: Annotated[list[str], append_log]
 
 
 def get_last_human_message(messages: list[BaseMessage]) -> str:
@@ -37,7 +36,7 @@ def supervisor_router(state: MultiAgentState) -> str:
     return "database_node"
 
 
-
+@traced("should_continue", kind="router")
 def should_continue(state: MultiAgentState) -> str:
     if not state["messages"]:
         return "END"
@@ -46,7 +45,11 @@ def should_continue(state: MultiAgentState) -> str:
     last_output = getattr(last_msg, "content", "").strip().lower()
     user_input = get_last_human_message(state["messages"]).strip()
 
-    # 🛑 Prevent infinite routing or fallback loops
+    # 🛑 Hop / deadline / LLM budget for this request
+    if should_stop(state, "Supervisor"):
+        return "END"
+
+    # 🛑 knowledge_node is the last-resort fallback: nothing to route to after it
     if state.get("current_node") == "knowledge_node":
         state["feedback"].append("Terminating after knowledge_node.")
         return "END"
@@ -55,16 +58,24 @@ def should_continue(state: MultiAgentState) -> str:
         state["feedback"].append("Knowledge node already visited, stopping.")
         return "END"
 
-    if any(kw in last_output for kw in ["no relevant info", "task complete", "nothing found"]):
-        state["feedback"].append("Output indicates completion, stopping.")
-        return "END"
+    registry = get_registry()
 
-    # 🧠 Descriptions for Gemini
-    descriptions = "\n".join(
-        f"- {name}: {cfg.get('prompt', '[No description]')}" for name, cfg in AGENT_REGISTRY.items()
+    # ⚡ Declarative rules (completion markers etc.) before paying for Gemini
+    rule = get_rule_engine().resolve(
+        "supervisor_new.should_continue",
+        {"last_output": last_output, "user_input": user_input},
+        visited=state.get("visited", []),
+        allowed=registry.routes,
     )
+    if rule:
+        state["feedback"].append(f"Rule '{rule.rule}' routed to: {rule.route}")
+        return rule.route
+
+    # 🧠 Descriptions for Gemini
+    descriptions = registry.descriptions
 
-    # 🧠 Gemini prompt
+    # 🧠 Gemini prompt (variable sections capped by token budget)
+    budget = PromptBudget()
     prompt = f"""
 You are the supervisor of a multi-agent system.
 
@@ -72,24 +83,26 @@ Available agents:
 {descriptions}
 
 The user originally asked:
-{user_input}
+{budget.fit("user_input", user_input)}
 
 The last agent replied:
-{last_output}
+{budget.fit("last_output", last_output)}
 
 Which agent should handle this next?
-Reply with ONLY the node name. If the task is complete, reply END.
+Reply with ONLY one of: {route_options(registry.names)}. If the task is complete, reply END.
 """
+    log_savings("Supervisor", budget.finish())
 
-    decision = VertexAI().getVertexModel().invoke(prompt).strip().lower()
+    ask = partial(invoke_llm, node="should_continue")   # stream events name the router even without tracing
+    decision = resolve_route("should_continue", prompt, ask(prompt), registry.names, ask) or "END"
     print("🤖 LLM routing decision:", decision)
 
     state["feedback"].append(f"Should continue to: {decision}")
-    return decision if decision in AGENT_REGISTRY else "END"
-
+    return decision
 
 
 # --- Follow-up routing using rules + LLM fallback ---
+@traced("should_continue_old", kind="router")
 def should_continue_old(state: MultiAgentState) -> str:
     if not state["messages"]:
         return "END"
@@ -97,33 +110,30 @@ def should_continue_old(state: MultiAgentState) -> str:
     last = state["messages"][-1]
     content = getattr(last, "content", "")
     msg_type = type(last).__name__
-    content_lower = content.lower()
-    last_output = getattr(last_msg, "content", "").strip().lower()
     user_input = get_last_human_message(state["messages"]).strip()
 
+    if should_stop(state, "[Supervisor]"):
+        return "END"
+
     state["feedback"].append(f"[Supervisor] Last message: [{msg_type}] {content}")
 
-    # --- Step 1: Rule-based routing ---
-    if "no data" in content_lower or "not found" in content_lower:
-        decision = "github_node"
-    elif "github" in content_lower:
-        decision = "knowledge_node"
-    elif "record found" in content_lower or "✅" in content_lower:
-        decision = "END"
-    else:
-        decision = None
+    registry = get_registry()
 
-    if decision:
-        state["feedback"].append(f"[Supervisor] Rule-based route to: {decision}")
-        return decision
+    # --- Step 1: Rule-based routing (routing_rules.json) ---
+    rule = get_rule_engine().resolve(
+        "supervisor_new.should_continue_old",
+        {"last_output": content, "user_input": user_input},
+        visited=state.get("visited", []),
+        allowed=registry.routes,
+    )
+    if rule:
+        state["feedback"].append(f"[Supervisor] Rule-based route to: {rule.route} ({rule.rule})")
+        return rule.route
 
     # --- Step 2: Gemini fallback ---
-    descriptions_list = []
-    for node_name, config in AGENT_REGISTRY.items():
-        agent_purpose = config.get("prompt", "[No description]")
-        descriptions_list.append(f"- {node_name}: {agent_purpose}")
-    descriptions = "\n".join(descriptions_list)
+    descriptions = registry.descriptions
 
+    budget = PromptBudget()
     prompt = f"""
 You are the supervisor of a multi-agent system.
 
@@ -131,17 +141,27 @@ Available agents:
 {descriptions}
 
 The last message was from: {msg_type}
-{content}
+{budget.fit("last_output", content)}
 
 Which agent should handle this next?
-Reply ONLY with the node name. If the task is complete, reply END.
+Reply ONLY with one of: {route_options(registry.names)}. If the task is complete, reply END.
 """
+    log_savings("Supervisor", budget.finish())
 
-    decision = VertexAI().getVertexModel().invoke(prompt).strip().lower()
+    ask = partial(invoke_llm, node="should_continue_old")   # stream events name the router even without tracing
+    decision = resolve_route("should_continue_old", prompt, ask(prompt), registry.names, ask) or "END"
     print("LLM decision (fallback):", decision)
 
     state["feedback"].append(f"[Supervisor] Gemini fallback route to: {decision}")
-    return decision if decision in AGENT_REGISTRY else "END"
+    return decision
+
+
+# --- Graph nodes: each router's feedback goes through the append_log reducer ---
+#   builder.add_node("supervisor", should_continue_node)
+#   builder.add_conditional_edges("supervisor", state_logs.routed, routing_map)
+supervisor_router_node = routing_node(supervisor_router)
+should_continue_node = routing_node(should_continue)
+should_continue_old_node = routing_node(should_continue_old)
 
 
 # --- Test Harness ---
@@ -178,5 +198,6 @@ if __name__ == "__main__":
     next_node = should_continue(state)
     print("➡️  Next node:", next_node)
     print("📋 Feedback:", state["feedback"])
+    print("⚡ Rule stats:", get_rule_engine().stats())
 
     print("\n✅ Supervisor Test Complete")
@@ -1,17 +1,17 @@
 # supervisor.py
-import os
-import json
+from functools import partial
 from typing import Optional
 from typing_extensions import TypedDict, Annotated
 
 from langgraph.schema import BaseMessage, HumanMessage
-from langgraph.prebuilt import add_messages
-from LLM.Gemini import VertexAI
+from state_logs import add_messages
+from llm_pool import invoke_llm
+from routing_rules import get_rule_engine
+from registry_service import get_registry   # hot-reloaded snapshot, taken once per decision
+from tracing import traced
+from execution_controller import should_stop
+from route_parser import resolve_route, route_options
 
-# --- Load agent registry ---
-REGISTRY_PATH = os.path.join(os.path.dirname(__file__), "config", "agent_registry.json")
-with open(REGISTRY_PATH, "r", encoding="utf-8") as f:
-    AGENT_REGISTRY = json.load(f)
 
 # --- Define MultiAgentState ---
 class MultiAgentState(TypedDict):
@@ -29,6 +29,7 @@ def supervisor_router(state: MultiAgentState) -> str:
 
 
 # --- Follow-up routing using Gemini ---
+@traced("should_continue", kind="router")
 def should_continue(state: MultiAgentState) -> str:
     if not state["messages"]:
         return "END"
@@ -37,12 +38,24 @@ def should_continue(state: MultiAgentState) -> str:
     content = getattr(last, "content", "")
     msg_type = type(last).__name__
 
-    # ✅ Clear and readable descriptions
-    descriptions_list = []
-    for node_name, config in AGENT_REGISTRY.items():
-        agent_purpose = config.get("prompt", "[No description]")
-        descriptions_list.append(f"- {node_name}: {agent_purpose}")
-    descriptions = "\n".join(descriptions_list)
+    if should_stop(state, "Supervisor"):
+        return "END"
+
+    registry = get_registry()
+
+    # ⚡ Rule fast path before the Gemini call
+    rule = get_rule_engine().resolve(
+        "supervisor_test.should_continue",
+        {"last_output": content},
+        visited=state.get("visited", []),
+        allowed=registry.routes,
+    )
+    if rule:
+        state["feedback"].append(f"Rule '{rule.rule}' routed to: {rule.route}")
+        return rule.route
+
+    # ✅ Clear and readable descriptions (built once per registry version)
+    descriptions = registry.descriptions
 
     prompt = f"""
 You are the supervisor of a multi-agent system.
@@ -54,14 +67,15 @@ The last message was from: {msg_type}
 {content}
 
 Which agent should handle this next?
-Reply with ONLY the node name. If the task is complete, reply END.
+Reply with ONLY one of: {route_options(registry.names)}. If the task is complete, reply END.
 """
 
-    decision = VertexAI().getVertexModel().invoke(prompt).strip().lower()
+    ask = partial(invoke_llm, node="should_continue")   # stream events name the router even without tracing
+    decision = resolve_route("should_continue", prompt, ask(prompt), registry.names, ask) or "END"
     print("LLM decision (follow-up):", decision)
 
     state["feedback"].append(f"Should continue to: {decision}")
-    return decision if decision in AGENT_REGISTRY else "END"
+    return decision
 
 
 # --- Test harness ---
@@ -1,10 +1,16 @@
 import os
-from langgraph.graph import StateGraph
+from functools import partial
 from langgraph.schema import BaseMessage, HumanMessage, ToolMessage
 from typing_extensions import TypedDict, Annotated
 from typing import Optional
-from LLM.Gemini import VertexAI  # Use your actual Gemini wrapper
-from langgraph.prebuilt import add_messages
+from llm_pool import invoke_llm, warm_up_model_pool  # Pooled Gemini clients
+from state_logs import add_messages   # langgraph loaded on first use
+from routing_rules import get_rule_engine
+from checkpoint import get_checkpointer, thread_config
+from tracing import traced
+from execution_controller import should_stop
+from route_parser import resolve_route
+from streaming import emit_text, stream_events
 
 # --- Shared State ---
 class MultiAgentState(TypedDict):
@@ -15,8 +21,10 @@ class MultiAgentState(TypedDict):
     visited: list[str]
 
 # --- Simulated database agent ---
+@traced("database_node")
 def database_node(state: MultiAgentState) -> MultiAgentState:
     response = "database_node: No data found for invoice 123"  # Simulated result
+    emit_text("database_node", response)
     tool_msg = ToolMessage(content=response, tool_call_id="db-1")
     state["messages"].append(tool_msg)
     state["visited"].append("database_node")
@@ -24,8 +32,10 @@ def database_node(state: MultiAgentState) -> MultiAgentState:
     return state
 
 # --- Simulated knowledge agent ---
+@traced("knowledge_node")
 def knowledge_node(state: MultiAgentState) -> MultiAgentState:
     response = "knowledge_node: No relevant info found. Task complete."  # Simulated result
+    emit_text("knowledge_node", response)
     tool_msg = ToolMessage(content=response, tool_call_id="kn-1")
     state["messages"].append(tool_msg)
     state["visited"].append("knowledge_node")
@@ -50,31 +60,36 @@ def get_tool_outputs(state: MultiAgentState) -> dict[str, str]:
     return outputs
 
 # --- Initial supervisor (force to database) ---
+@traced("supervisor_router", kind="router")
 def supervisor_router(state: MultiAgentState) -> str:
     state["feedback"].append("Initial route: database_node")
     return "database_node"
 
 # --- Follow-up supervisor logic ---
+@traced("should_continue", kind="router")
 def should_continue(state: MultiAgentState) -> str:
     user_input = get_last_human_message(state["messages"]).strip()
     last_output = state["messages"][-1].content.strip().lower()
 
     outputs = get_tool_outputs(state)
-    db_result = outputs.get("database_node", "").lower()
-    kn_result = outputs.get("knowledge_node", "").lower()
 
-    if "no data" in db_result or "no record" in db_result:
-        state["feedback"].append("DB failed → try knowledge_node")
-        return "knowledge_node"
-
-    if "task complete" in kn_result or "no relevant" in kn_result:
-        state["feedback"].append("Knowledge fallback triggered → END")
-        return "END"
+    # DB miss → knowledge_node, knowledge fallback done → END (see routing_rules.json)
+    rule = get_rule_engine().resolve(
+        "test_script.should_continue",
+        {"last_output": last_output, **outputs},
+        visited=state["visited"],
+    )
+    if rule:
+        state["feedback"].append(f"Rule {rule.rule} → {rule.route}")
+        return rule.route
 
     if len(state["visited"]) >= 2:
         state["feedback"].append("Too many hops → END")
         return "END"
 
+    if should_stop(state, "should_continue"):
+        return "END"
+
     # fallback to LLM
     prompt = f"""
 User asked: {user_input}
@@ -83,14 +98,18 @@ Last response: {last_output}
 Available agents: database_node, knowledge_node
 Who should run next? Reply with ONLY one node or END.
 """
-    decision = VertexAI().getVertexModel().invoke(prompt).strip().lower()
+    ask = partial(invoke_llm, node="should_continue")   # stream events name the router even without tracing
+    decision = resolve_route("should_continue", prompt, ask(prompt), ("database_node", "knowledge_node"), ask) or "END"
     print("🤖 LLM fallback decision:", decision)
 
     state["feedback"].append(f"Should continue to: {decision}")
-    return decision if decision in ["database_node", "knowledge_node"] else "END"
+    return decision
 
 # --- Build the graph ---
-def build_graph():
+def build_graph(checkpointer=None):
+    from langgraph.graph import StateGraph
+
+    warm_up_model_pool()
     builder = StateGraph(MultiAgentState)
 
     builder.set_entry_point("supervisor")
@@ -113,7 +132,7 @@ def build_graph():
         "END": "__end__"
     })
 
-    return builder.compile()
+    return builder.compile(checkpointer=checkpointer or get_checkpointer())
 
 # --- Run test ---
 if __name__ == "__main__":
@@ -128,13 +147,15 @@ if __name__ == "__main__":
     }
 
     print("🔁 Starting graph stream...\n")
-    for step in graph.stream(initial_state):
-        print(f"📍 Step: {step['node']}")
-        print(f"🧠 Feedback: {step['state']['feedback']}")
-        print("🗨️  Messages:")
-        for msg in step["state"]["messages"]:
-            print(f"   - [{msg.__class__.__name__}] {msg.content}")
-        print("-" * 40)
-        if step["node"] == "__end__":
+    # deltas arrive as the nodes produce them; the final state comes once, at the end
+    for event in stream_events(graph, initial_state, thread_config("test_script")):
+        if event["event"] in ("on_chat_model_stream", "on_llm_stream"):
+            print(f"📍 {event['metadata']['langgraph_node']}: {event['data']['chunk']}", flush=True)
+        elif event["event"] == "on_chain_end":
+            final_state = event["data"]["output"]
+            print("-" * 40)
+            print(f"🧠 Feedback: {final_state['feedback']}")
+            print("🗨️  Messages:")
+            for msg in final_state["messages"]:
+                print(f"   - [{msg.__class__.__name__}] {msg.content}")
             print("✅ Reached END of graph.")
-            break
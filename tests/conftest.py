@@ -0,0 +1,8 @@
+# tests/conftest.py
+#
+# Modules live at the repository root; make them importable however pytest is started.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,134 @@
+# tests/test_agent_pool.py
+
+import json
+import asyncio
+import threading
+
+import pytest
+
+from agent_pool import AgentPool
+from registry_service import RegistryService, set_registry_service
+
+REGISTRY = {
+    "database_node": {"agent": "get_db_agent", "prompt": "Handles database queries."},
+    "github_node": {"agent": "get_github_agent", "prompt": "Handles GitHub queries."},
+}
+
+
+class EchoAgent:
+    def __init__(self, gate: threading.Event = None):
+        self.gate = gate
+        self.closed = False
+
+    def invoke(self, state: dict) -> dict:
+        if self.gate is not None:
+            self.gate.wait(5)
+        return {"messages": list(state.get("messages") or []) + ["done"]}
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def registry_service(tmp_path):
+    path = tmp_path / "agent_registry.json"
+    path.write_text(json.dumps(REGISTRY))
+    service = RegistryService(str(path), watch="off")
+    previous = set_registry_service(service)
+    yield service, path
+    set_registry_service(previous)
+
+
+def test_instances_are_reused(registry_service):
+    built = []
+    pool = AgentPool(factories={"get_db_agent": lambda: built.append(1) or EchoAgent()})
+    for _ in range(3):
+        assert pool.invoke("database_node", {"messages": []})["messages"] == ["done"]
+    assert len(built) == 1
+    assert pool.stats()["database_node"]["invocations"] == 3
+    pool.close()
+
+
+def test_registry_edit_during_a_call_does_not_drop_it(registry_service):
+    service, path = registry_service
+    gate, started = threading.Event(), threading.Event()
+
+    class SlowAgent(EchoAgent):
+        def invoke(self, state):
+            started.set()
+            return super().invoke(state)
+
+    pool = AgentPool(factories={"get_db_agent": lambda: SlowAgent(gate)})
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(pool.invoke("database_node", {"messages": []}))
+        except Exception as exc:
+            errors.append(exc)
+
+    caller = threading.Thread(target=call)
+    caller.start()
+    assert started.wait(5)
+    edited = {**REGISTRY, "database_node": {**REGISTRY["database_node"], "prompt": "Edited prompt."}}
+    path.write_text(json.dumps(edited))
+    assert service.reload()
+    gate.set()
+    caller.join(5)
+
+    assert errors == [] and results[0]["messages"] == ["done"]
+    # the edited entry gets a fresh slot; the old instance was closed, not reused
+    assert pool.invoke("database_node", {"messages": []})["messages"] == ["done"]
+    assert pool.stats()["database_node"]["constructed"] == 1
+    pool.close()
+
+
+def test_many_async_waiters_do_not_starve_the_agents(registry_service):
+    # 60 waiters, 2 slots: waiting must not hold the threads the running agents need
+    class SlowAgent(EchoAgent):
+        def invoke(self, state):
+            threading.Event().wait(0.02)
+            return super().invoke(state)
+
+    pool = AgentPool(factories={"get_db_agent": SlowAgent}, max_concurrency=2, acquire_timeout=3)
+
+    async def main():
+        calls = (pool.ainvoke("database_node", {"messages": []}) for _ in range(60))
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [r for r in results if isinstance(r, Exception)] == []
+    assert pool.stats()["database_node"]["constructed"] <= 2
+    pool.close()
+
+
+def test_cancelled_async_checkout_returns_the_slot(registry_service):
+    gate = threading.Event()
+    pool = AgentPool(factories={"get_db_agent": lambda: EchoAgent(gate)}, max_concurrency=1)
+
+    async def main():
+        holder = asyncio.ensure_future(pool.ainvoke("database_node", {"messages": []}))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.ensure_future(pool.ainvoke("database_node", {"messages": []}))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        gate.set()
+        await holder
+        return await asyncio.wait_for(pool.ainvoke("database_node", {"messages": []}), 2)
+
+    assert asyncio.run(main())["messages"] == ["done"]
+    assert pool.stats()["database_node"]["in_use"] == 0
+    pool.close()
+
+
+def test_failed_invoke_drops_the_instance(registry_service):
+    class Broken(EchoAgent):
+        def invoke(self, state):
+            raise RuntimeError("tool crashed")
+
+    pool = AgentPool(factories={"get_db_agent": Broken})
+    with pytest.raises(RuntimeError):
+        pool.invoke("database_node", {"messages": []})
+    stats = pool.stats()["database_node"]
+    assert stats["evicted_error"] == 1 and stats["idle"] == 0 and stats["errors"] == 1
+    pool.close()
@@ -0,0 +1,53 @@
+# tests/test_blob_store.py
+
+import os
+import time
+
+import blob_store
+from blob_store import BlobStore
+
+
+def _age(store: BlobStore, key: str, seconds: float) -> None:
+    past = time.time() - seconds
+    os.utime(store._file(key), (past, past))
+
+
+def _wait_for_prune(store: BlobStore) -> None:
+    deadline = time.monotonic() + 2
+    while store._pruning and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_default_path_does_not_depend_on_the_cwd():
+    assert os.path.isabs(blob_store.BLOB_STORE_PATH)
+
+
+def test_relative_path_is_anchored_at_creation(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = BlobStore(path="blobs")
+    assert store.path == str(tmp_path / "blobs")
+
+
+def test_put_prunes_expired_blobs(tmp_path):
+    store = BlobStore(path=str(tmp_path), ttl=60, prune_interval=3600)
+    old, kept = store.put("old payload"), store.put("kept payload")
+    _age(store, old, 120)
+    _age(store, kept, 120)
+    assert store.put("kept payload") == kept   # re-put: a live handle restarts the TTL
+    store.prune_interval = 0
+    store.put("new payload")
+    _wait_for_prune(store)
+    assert old not in store and kept in store
+    assert store.stats()["pruned"] == 1
+
+
+def test_prune_is_rate_limited_and_can_be_off(tmp_path):
+    store = BlobStore(path=str(tmp_path), ttl=60, prune_interval=3600)
+    key = store.put("payload")
+    _age(store, key, 120)
+    store.put("another payload")
+    assert key in store
+
+    forever = BlobStore(path=str(tmp_path), ttl=0, prune_interval=0)
+    forever.put("third payload")
+    assert key in forever
@@ -0,0 +1,73 @@
+# tests/test_checkpoint.py
+
+import pytest
+
+pytest.importorskip("langgraph")
+
+from checkpoint import SqliteDeltaSaver
+
+THREAD = {"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}
+
+
+def _put(saver, parent_config, checkpoint_id, parent_versions, values):
+    """Stores one checkpoint of `values` on top of `parent_versions`, as the graph loop would."""
+    new_versions = {
+        channel: saver.get_next_version(parent_versions.get(channel), None) for channel in values
+    }
+    versions = {**parent_versions, **new_versions}
+    checkpoint = {
+        "v": 1, "id": checkpoint_id, "ts": checkpoint_id,
+        "channel_values": dict(values), "channel_versions": versions, "versions_seen": {},
+    }
+    config = saver.put(parent_config, checkpoint, {"step": len(checkpoint_id)}, new_versions)
+    return config, versions
+
+
+def _messages(saver, config):
+    return saver.get_tuple(config).checkpoint["channel_values"]["messages"]
+
+
+@pytest.fixture
+def saver():
+    saver = SqliteDeltaSaver(":memory:", max_delta_chain=4)
+    yield saver
+    saver.close()
+
+
+def test_versions_are_ordered_and_unique(saver):
+    first = saver.get_next_version(None, None)
+    assert saver.get_next_version(first, None) > first
+    assert saver.get_next_version(first, None) != saver.get_next_version(first, None)
+    assert saver.get_next_version(3, None).startswith(f"{4:032}.")
+
+
+def test_deltas_round_trip(saver):
+    a, b, c = ["a"], ["b"], ["c"]
+    config, versions = _put(saver, THREAD, "0001", {}, {"messages": a})
+    config, versions = _put(saver, config, "0002", versions, {"messages": a + b})
+    config, versions = _put(saver, config, "0003", versions, {"messages": a + b + c})
+    assert saver.stats()["delta_blobs"] >= 1
+    assert _messages(saver, config) == ["a", "b", "c"]
+    assert _messages(saver, THREAD) == ["a", "b", "c"]
+
+
+def test_fork_from_an_older_checkpoint_keeps_both_branches(saver):
+    root = ["root"]
+    base_config, base_versions = _put(saver, THREAD, "0001", {}, {"messages": root})
+    main = root + ["main"]
+    main_config, main_versions = _put(saver, base_config, "0002", base_versions, {"messages": main})
+    tail_config, _ = _put(saver, main_config, "0003", main_versions, {"messages": main + ["tail"]})
+
+    # resume from the first checkpoint (update_state / an old checkpoint_id): same parent versions
+    fork = root + ["fork"]
+    fork_config, fork_versions = _put(saver, base_config, "0004", base_versions, {"messages": fork})
+    assert fork_versions["messages"] != main_versions["messages"]
+
+    assert _messages(saver, main_config) == ["root", "main"]
+    assert _messages(saver, tail_config) == ["root", "main", "tail"]
+    assert _messages(saver, fork_config) == ["root", "fork"]
+
+    # the fork continues as its own delta chain
+    more_config, _ = _put(saver, fork_config, "0005", fork_versions, {"messages": fork + ["more"]})
+    assert _messages(saver, more_config) == ["root", "fork", "more"]
+    assert _messages(saver, tail_config) == ["root", "main", "tail"]
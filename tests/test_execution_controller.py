@@ -0,0 +1,27 @@
+# tests/test_execution_controller.py
+
+import execution_controller
+from execution_controller import execution_budget, should_stop
+
+
+def _state(hops: int) -> dict:
+    return {"visited": [f"node_{i}" for i in range(hops)], "feedback": []}
+
+
+def test_bare_graph_falls_back_to_the_hop_limit(monkeypatch):
+    monkeypatch.setattr(execution_controller, "EXEC_FALLBACK_MAX_HOPS", 4)
+    assert should_stop(_state(3), "Supervisor") is None
+
+    state = _state(4)
+    assert should_stop(state, "Supervisor").startswith("hop limit (4/4")
+    assert state["feedback"] and "Routing to END" in state["feedback"][0]
+    assert should_stop(_state(2), "Supervisor", max_hops=2) is not None
+
+
+def test_open_budget_counts_only_this_requests_hops(monkeypatch):
+    monkeypatch.setattr(execution_controller, "EXEC_FALLBACK_MAX_HOPS", 4)
+    with execution_budget(max_hops=2, deadline_s=0) as budget:
+        assert should_stop(_state(10), "Supervisor") is None   # earlier turns of the thread
+        assert should_stop(_state(11), "Supervisor") is None
+        assert should_stop(_state(12), "Supervisor") == "hop limit (2/2)"
+    assert budget.report()["stopped"] == "hop limit (2/2)"
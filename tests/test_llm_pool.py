@@ -0,0 +1,100 @@
+# tests/test_llm_pool.py
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+from llm_pool import ModelPool
+
+
+class InvokeOnlyModel:
+    """A client without `ainvoke`: async callers run its invoke in a worker thread."""
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+
+    def invoke(self, prompt: str) -> str:
+        time.sleep(self.latency)
+        return prompt
+
+
+def test_reuses_clients_up_to_size():
+    pool = ModelPool(factory=InvokeOnlyModel, size=2)
+    assert [pool.invoke(str(i)) for i in range(5)] == ["0", "1", "2", "3", "4"]
+    assert pool.stats()["created"] == 1
+
+
+def test_many_async_waiters_do_not_starve_invoke_only_clients():
+    # 60 waiters, 2 slots: waiting must not hold the threads the slot holders need
+    pool = ModelPool(factory=InvokeOnlyModel, size=2, acquire_timeout=3)
+
+    async def main():
+        return await asyncio.gather(*(pool.ainvoke(str(i)) for i in range(60)), return_exceptions=True)
+
+    started = time.monotonic()
+    results = asyncio.run(main())
+    assert [r for r in results if isinstance(r, Exception)] == []
+    assert results == [str(i) for i in range(60)]
+    assert time.monotonic() - started < 3
+    assert pool.stats()["created"] <= 2
+
+
+def test_async_checkout_never_builds_clients_on_the_loop():
+    built_on = []
+
+    def factory():
+        built_on.append(threading.current_thread())
+        return InvokeOnlyModel(latency=0)
+
+    checked_on = []
+    pool = ModelPool(factory=factory, size=1, health_check=lambda model: checked_on.append(threading.current_thread()) or True)
+
+    async def main():
+        await pool.ainvoke("a")
+        await pool.ainvoke("b")
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(main())
+    assert built_on and loop_thread not in built_on
+    assert checked_on and loop_thread not in checked_on
+
+
+def test_cancelled_async_waiter_returns_its_slot():
+    pool = ModelPool(factory=lambda: InvokeOnlyModel(latency=0.2), size=1)
+
+    async def main():
+        holder = asyncio.ensure_future(pool.ainvoke("held"))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.ensure_future(pool.ainvoke("cancelled"))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await holder
+        return await asyncio.wait_for(pool.ainvoke("after"), 1)
+
+    assert asyncio.run(main()) == "after"
+    assert pool._slots.in_use() == 0
+
+
+def test_async_acquire_timeout():
+    pool = ModelPool(factory=lambda: InvokeOnlyModel(latency=0.5), size=1, acquire_timeout=0.1)
+
+    async def main():
+        return await asyncio.gather(pool.ainvoke("a"), pool.ainvoke("b"), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert results[0] == "a" and isinstance(results[1], TimeoutError)
+    assert pool._slots.in_use() == 0
+
+
+def test_failed_invoke_evicts_the_client():
+    class Broken(InvokeOnlyModel):
+        def invoke(self, prompt):
+            raise RuntimeError("connection reset")
+
+    pool = ModelPool(factory=Broken, size=1)
+    with pytest.raises(RuntimeError):
+        pool.invoke("x")
+    assert pool.stats()["evicted"] == 1 and pool.stats()["idle"] == 0
+    assert pool._slots.in_use() == 0
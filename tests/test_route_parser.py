@@ -0,0 +1,150 @@
+# tests/test_route_parser.py
+
+import asyncio
+
+import pytest
+
+import route_parser
+from route_parser import END, parse_plan, parse_route, resolve_route, aresolve_route, resolve_plan
+
+NAMES = ("database_node", "github_node", "knowledge_node")
+
+
+# =========================
+# 1) Accepted reply shapes
+# =========================
+@pytest.mark.parametrize("reply, route", [
+    ("database_node", "database_node"),
+    (" GITHUB_NODE.\n", "github_node"),
+    ("**knowledge_node**", "knowledge_node"),
+    ("`database_node`", "database_node"),
+    ("I would route this to github_node next.", "github_node"),
+    ('{"next": "knowledge_node"}', "knowledge_node"),
+    ("database", "database_node"),
+    ("github node", "github_node"),
+    ("knowledgenode", "knowledge_node"),
+    ("database-node", "database_node"),
+    ("databse_node", "database_node"),     # missing letter
+    ("githubb_node", "github_node"),       # extra letter
+    ("knowledje_node", "knowledge_node"),  # substituted letter
+])
+def test_agent_replies(reply, route):
+    assert parse_route(reply, NAMES)[0] == route
+
+
+@pytest.mark.parametrize("reply", ["END", "end", "**END**", "Done.", "finished", "  Complete\n"])
+def test_end_as_whole_reply(reply):
+    assert parse_route(reply, NAMES) == (END, "exact")
+
+
+def test_end_not_offered():
+    assert parse_route("END", NAMES, allow_end=False)[0] is None
+
+
+# =========================
+# 2) Rejected reply shapes (left to the repair call)
+# =========================
+@pytest.mark.parametrize("reply", [
+    "The task is not complete yet.",
+    "Do not stop here",
+    "We should not end yet, more data is needed",
+    "I'm done thinking, but more data is needed",
+])
+def test_end_words_inside_sentences_are_not_end(reply):
+    assert parse_route(reply, NAMES) == (None, "unknown")
+
+
+@pytest.mark.parametrize("reply, reason", [
+    ("", "empty"),
+    ("   \n", "empty"),
+    ("Let me think about which agent fits best here.", "unknown"),
+    ("database_node or github_node", "ambiguous"),
+    ("env", "unknown"),   # short words are never fuzzy-matched
+])
+def test_unusable_replies(reply, reason):
+    assert parse_route(reply, NAMES) == (None, reason)
+
+
+def test_agent_named_next_to_end_word():
+    assert parse_route("database_node, then END", NAMES)[0] == "database_node"
+
+
+def test_spelling_shared_by_two_agents_is_ambiguous():
+    names = ("search_node", "search")
+    assert parse_route("search", names)[0] is None
+
+
+# =========================
+# 3) Plans
+# =========================
+@pytest.mark.parametrize("reply, stages", [
+    ("database_node, github_node", [["database_node"], ["github_node"]]),
+    ("database_node | github_node, knowledge_node", [["database_node", "github_node"], ["knowledge_node"]]),
+    ("database_node -> github_node", [["database_node"], ["github_node"]]),
+    ("1. database\n2. github", [["database_node"], ["github_node"]]),
+    ("database_node and github_node", [["database_node", "github_node"]]),
+    ("database_node, database_node", [["database_node"]]),
+    ("database_node, END", [["database_node"]]),
+    ("END", []),
+])
+def test_plans(reply, stages):
+    assert parse_plan(reply, NAMES) == stages
+
+
+@pytest.mark.parametrize("reply", ["", "No agent is needed until the task is not done", "weather_node"])
+def test_unusable_plans(reply):
+    assert parse_plan(reply, NAMES) is None
+
+
+# =========================
+# 4) One bounded repair
+# =========================
+class Ask:
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return self.replies.pop(0)
+
+
+def test_usable_reply_needs_no_repair():
+    ask = Ask()
+    assert resolve_route("test", "PROMPT", "github_node", NAMES, ask) == "github_node"
+    assert ask.prompts == []
+
+
+def test_repair_resends_prompt_and_options():
+    ask = Ask("knowledge_node")
+    assert resolve_route("test", "PROMPT", "Not complete yet.", NAMES, ask) == "knowledge_node"
+    assert len(ask.prompts) == 1
+    assert ask.prompts[0].startswith("PROMPT")
+    assert "Not complete yet." in ask.prompts[0]
+    assert "database_node, github_node, knowledge_node, END" in ask.prompts[0]
+
+
+def test_failed_repair_returns_none_after_one_call():
+    ask = Ask("still thinking", "github_node")
+    assert resolve_route("test", "PROMPT", "hmm", NAMES, ask) is None
+    assert len(ask.prompts) == 1
+
+
+def test_repair_disabled(monkeypatch):
+    monkeypatch.setattr(route_parser, "ROUTE_REPAIR", False)
+    ask = Ask("github_node")
+    assert resolve_route("test", "PROMPT", "hmm", NAMES, ask) is None
+    assert ask.prompts == []
+
+
+def test_async_repair():
+    async def ask(prompt):
+        return "database_node"
+
+    assert asyncio.run(aresolve_route("test", "PROMPT", "hmm", NAMES, ask)) == "database_node"
+
+
+def test_plan_repair():
+    ask = Ask("database_node | github_node")
+    assert resolve_plan("test", "PROMPT", "Let me see.", NAMES, ask) == [["database_node", "github_node"]]
+    assert "Reply with a comma-separated list" in ask.prompts[0]
@@ -0,0 +1,96 @@
+# tests/test_routing_batcher.py
+
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from routing_batcher import RoutingBatcher
+
+
+class EchoBatchModel:
+    """Answers every prompt with its upper-cased text; `gate` holds batches back."""
+
+    def __init__(self, gate: threading.Event = None):
+        self.gate = gate
+        self.started = threading.Event()
+        self.batches = []
+
+    def batch(self, prompts: list[str]) -> list[str]:
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append(list(prompts))
+        return [prompt.upper() for prompt in prompts]
+
+
+def test_concurrent_prompts_share_a_batch():
+    model = EchoBatchModel()
+    batcher = RoutingBatcher(window=0.05, max_batch=16, pool=model, max_inflight=2)
+    with ThreadPoolExecutor(8) as threads:
+        decisions = list(threads.map(batcher.route, [f"p{i}" for i in range(8)]))
+    batcher.close()
+    assert decisions == [f"P{i}" for i in range(8)]
+    assert len(model.batches) < 8 and batcher.stats()["prompts"] == 8
+
+
+def test_async_route():
+    batcher = RoutingBatcher(window=0.01, pool=EchoBatchModel(), max_inflight=1)
+
+    async def main():
+        return await asyncio.gather(batcher.aroute("a"), batcher.aroute("b"))
+
+    assert asyncio.run(main()) == ["A", "B"]
+    batcher.close()
+
+
+def test_batch_error_reaches_every_caller():
+    class Broken(EchoBatchModel):
+        def batch(self, prompts):
+            raise RuntimeError("quota exceeded")
+
+    batcher = RoutingBatcher(window=0.01, pool=Broken(), max_inflight=1)
+    with pytest.raises(RuntimeError, match="quota"):
+        batcher.route("a")
+    batcher.close()
+    assert batcher.stats()["errors"] == 1
+
+
+class SlowPutQueue(queue.Queue):
+    """Widens the gap between a submitter's closed-check and its enqueue."""
+
+    def put(self, item, block=True, timeout=None):
+        if item is not None:
+            time.sleep(0.05)
+        super().put(item, block, timeout)
+
+
+def test_submit_racing_close_never_strands_a_prompt():
+    batcher = RoutingBatcher(window=0.001, pool=EchoBatchModel(), max_inflight=1)
+    batcher._queue = SlowPutQueue()
+    futures = []
+    submitter = threading.Thread(target=lambda: futures.append(batcher.submit("racing")))
+    submitter.start()
+    time.sleep(0.01)
+    batcher.close()
+    submitter.join()
+    assert futures[0].result(1) == "RACING"
+    with pytest.raises(RuntimeError):
+        batcher.submit("late")
+
+
+def test_route_times_out_and_is_not_sent():
+    gate = threading.Event()
+    model = EchoBatchModel(gate)
+    batcher = RoutingBatcher(window=0.01, pool=model, max_inflight=1, timeout=0.1)
+    first = batcher.submit("held")            # occupies the only in-flight slot
+    assert model.started.wait(2)
+    with pytest.raises(TimeoutError):
+        batcher.route("late")
+    gate.set()
+    assert first.result(2) == "HELD"
+    batcher.close()
+    assert model.batches == [["held"]]
@@ -0,0 +1,96 @@
+# tests/test_routing_rules.py
+
+import json
+
+import pytest
+
+from routing_rules import RoutingRule, RoutingRuleEngine, load_routing_rules
+
+ROUTER = "supervisor_new.should_continue"
+
+
+def _engine(*rules):
+    return RoutingRuleEngine(rules)
+
+
+def test_highest_priority_match_wins():
+    engine = _engine(
+        RoutingRule(name="done", route="END", keywords=("task complete",)),
+        RoutingRule(name="task", route="database_node", keywords=("task",)),
+    )
+    match = engine.resolve(ROUTER, {"last_output": "Task complete."})
+    assert (match.rule, match.route) == ("done", "END")
+
+
+def test_longer_lower_priority_match_does_not_shadow():
+    engine = _engine(
+        RoutingRule(name="short", route="END", keywords=("found",)),
+        RoutingRule(name="long", route="github_node", keywords=("not found anywhere",)),
+    )
+    assert engine.resolve(ROUTER, {"last_output": "not found anywhere"}).rule == "short"
+
+
+def test_route_not_allowed_does_not_hide_a_lower_priority_rule():
+    engine = _engine(
+        RoutingRule(name="a", route="database_node", keywords=("orders",)),
+        RoutingRule(name="b", route="END", keywords=("orders",)),
+    )
+    match = engine.resolve(ROUTER, {"last_output": "orders"}, allowed={"END"})
+    assert (match.rule, match.route) == ("b", "END")
+
+
+def test_first_hop_rule_does_not_hide_a_lower_priority_rule():
+    engine = _engine(
+        RoutingRule(name="a", route="database_node", keywords=("orders",), first_hop=True),
+        RoutingRule(name="b", route="END", keywords=("orders",)),
+    )
+    assert engine.resolve(ROUTER, {"last_output": "orders"}).rule == "a"
+    assert engine.resolve(ROUTER, {"last_output": "orders"}, visited=["database_node"]).rule == "b"
+
+
+def test_unless_visited_does_not_hide_a_lower_priority_rule():
+    engine = _engine(
+        RoutingRule(name="a", route="knowledge_node", keywords=("no data",), unless_visited=("knowledge_node",)),
+        RoutingRule(name="b", route="END", regex=(r"no\s+data",)),
+    )
+    assert engine.resolve(ROUTER, {"last_output": "No data"}, visited={"database_node"}).rule == "a"
+    assert engine.resolve(ROUTER, {"last_output": "No data"}, visited={"knowledge_node"}).rule == "b"
+
+
+def test_rules_on_other_fields_and_routers():
+    engine = _engine(
+        RoutingRule(name="other_router", route="END", keywords=("sql",), routers=("elsewhere",)),
+        RoutingRule(name="input", route="database_node", field="user_input", keywords=("sql",)),
+        RoutingRule(name="output", route="END", keywords=("sql",)),
+    )
+    texts = {"user_input": "run some SQL", "last_output": "sql done"}
+    assert engine.resolve(ROUTER, texts).rule == "input"
+    assert engine.resolve(ROUTER, texts, allowed={"END"}).rule == "output"
+    assert engine.resolve("elsewhere", texts).rule == "other_router"
+    assert engine.resolve(ROUTER, {"last_output": "nothing relevant"}) is None
+
+
+def test_stats_count_hits_per_router_and_rule():
+    engine = _engine(RoutingRule(name="done", route="END", keywords=("done",)))
+    engine.resolve(ROUTER, {"last_output": "done"})
+    engine.resolve(ROUTER, {"last_output": "working"})
+    stats = engine.stats()
+    assert stats["evaluations"] == 2 and stats["hits"] == 1 and stats["hit_rate"] == 0.5
+    assert stats["by_rule"] == {"done": 1}
+
+
+def test_load_rejects_invalid_rules(tmp_path):
+    path = tmp_path / "routing_rules.json"
+    path.write_text(json.dumps({"rules": [{"name": "no_route", "keywords": ["x"]}]}))
+    with pytest.raises(ValueError):
+        load_routing_rules(str(path))
+    path.write_text(json.dumps({"rules": [{"name": "bad", "route": "END", "regex": ["("]}]}))
+    with pytest.raises(ValueError):
+        load_routing_rules(str(path))
+
+
+def test_shipped_rules_load():
+    from routing_rules import SHIPPED_RULES_PATH
+
+    rules = load_routing_rules(SHIPPED_RULES_PATH)
+    assert rules and all(rule.route for rule in rules)
@@ -0,0 +1,134 @@
+# tests/test_state_logs.py
+
+import pickle
+import time
+
+import pytest
+
+from state_logs import AppendLog, append_log, log_delta, log_members, routed, routing_node
+
+
+def _reduce(log, *updates):
+    for update in updates:
+        log = append_log(log, update)
+    return log
+
+
+# -----------------------------
+# Reducer
+# -----------------------------
+def test_delta_updates_are_appended():
+    log = _reduce(None, ["a"], ["b", "c"], [])
+    assert list(log) == ["a", "b", "c"]
+    assert isinstance(log, AppendLog)
+
+
+def test_earlier_states_are_unchanged():
+    first = append_log([], ["a"])
+    second = append_log(first, ["b"])
+    third = append_log(second, ["c"])
+    assert list(first) == ["a"] and list(second) == ["a", "b"] and list(third) == ["a", "b", "c"]
+    assert "c" not in second and "c" in third
+
+
+def test_legacy_full_list_return_is_not_re_appended():
+    log = _reduce(None, ["a"], ["b"])
+    for line in ("c", "d", "e"):
+        log = append_log(log, log + [line])   # baseline nodes: state["feedback"] + [line]
+    assert list(log) == ["a", "b", "c", "d", "e"]
+
+
+def test_in_place_append_then_return_state():
+    log = append_log(None, ["a"])
+    log.append("b")
+    assert list(append_log(log, log)) == ["a", "b"]
+
+
+def test_parallel_legacy_returns_fork_and_merge():
+    log = append_log(None, ["a"])
+    left, right = log + ["x"], log + ["y"]   # two branches cut from the same state
+    merged = _reduce(log, left, right)
+    assert list(merged) == ["a", "x", "y"]
+    assert list(left) == ["a", "x"] and list(right) == ["a", "y"]
+
+
+def test_plain_list_is_a_delta():
+    log = append_log(None, ["a", "b"])
+    assert list(append_log(log, ["a"])) == ["a", "b", "a"]
+
+
+def test_append_cost_does_not_grow_with_length():
+    def per_hop(log, hops):
+        start = time.perf_counter()
+        for i in range(hops):
+            log = append_log(log, [i])
+        return log, (time.perf_counter() - start) / hops
+
+    log, early = per_hop(None, 200)
+    log = _reduce(log, list(range(50000)))
+    _, late = per_hop(log, 200)
+    assert late < early * 20 + 20e-6
+
+
+# -----------------------------
+# AppendLog reads
+# -----------------------------
+def test_reads_behave_like_a_list():
+    log = append_log(None, ["a", "b", "a", ["unhashable"]])
+    assert len(log) == 4 and log[0] == "a" and log[-1] == ["unhashable"]
+    assert log[1:3] == ["b", "a"] and log[::-1] == list(reversed(log))
+    assert log == ["a", "b", "a", ["unhashable"]] and ["unhashable"] in log
+    assert log.index("b") == 1 and log.count("a") == 2
+    with pytest.raises(IndexError):
+        log[4]
+    assert pickle.loads(pickle.dumps(log)) == log
+
+
+def test_members_only_cover_the_cut():
+    short = append_log(None, ["a", "b"])
+    longer = append_log(short, ["c", "a"])
+    assert set(log_members(short)) == {"a", "b"} and len(log_members(short)) == 2
+    assert "c" not in log_members(short) and "c" in log_members(longer)
+    assert len(log_members(longer)) == 3
+    assert log_members(["x"]) == {"x"}
+
+
+# -----------------------------
+# log_delta
+# -----------------------------
+def test_log_delta():
+    base = AppendLog(["a", "b"])
+    assert log_delta(base, ["c"]) == ["c"]
+    assert log_delta(base, base + ["c"]) == ["c"]
+    assert log_delta(base, None) == []
+
+    worker = AppendLog(base)
+    worker.append("c")                     # appended in place and returned
+    assert log_delta(worker, worker, len(base)) == ["c"]
+    assert log_delta(worker, worker + ["d"], len(base)) == ["c", "d"]
+
+
+# -----------------------------
+# routing_node
+# -----------------------------
+def _router(state):
+    state["feedback"].append("routed to b")
+    return "b"
+
+
+def test_routing_node_returns_feedback_as_an_update():
+    state = {"feedback": append_log(None, ["earlier"]), "next_node": None}
+    update = routing_node(_router)(state)
+    assert update == {"feedback": ["routed to b"], "next_node": "b"}
+    assert list(state["feedback"]) == ["earlier"]   # the state's log is untouched
+    assert routed({**state, **update}) == "b"
+
+
+def test_async_routing_node():
+    import asyncio
+
+    async def arouter(state):
+        return _router(state)
+
+    update = asyncio.run(routing_node(arouter)({"feedback": AppendLog()}))
+    assert update == {"feedback": ["routed to b"], "next_node": "b"}
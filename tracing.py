@@ -0,0 +1,369 @@
+# tracing.py
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import functools
+import threading
+import contextvars
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Optional
+
+
+# =========================
+# 1) Configuration
+# =========================
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "2048"))
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "")           # "" = no JSONL export
+TRACE_METRICS_PORT = int(os.getenv("TRACE_METRICS_PORT", "0"))  # 0 = /metrics not served
+
+# seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# =========================
+# 2) Spans
+# =========================
+@dataclass
+class Span:
+    """One timed unit: a graph node, a router decision or an LLM call."""
+    name: str
+    kind: str                                  # "node" | "router" | "llm"
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start: float = 0.0                         # epoch seconds
+    duration_ms: float = 0.0
+    queue_ms: float = 0.0                      # waiting for a pooled client/agent or a batch slot
+    error: Optional[str] = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def add_queue_time(self, seconds: float) -> None:
+        self.queue_ms += seconds * 1000
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+_CURRENT: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+_TRACE_ID: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _CURRENT.get()
+
+
+def annotate(**attributes) -> None:
+    """Adds attributes to the innermost open span (no-op outside a span)."""
+    span = _CURRENT.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+def add_queue_time(seconds: float) -> None:
+    span = _CURRENT.get()
+    if span is not None:
+        span.add_queue_time(seconds)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Marks a cache lookup on the current span and in the hit/miss counters."""
+    annotate(**{f"{cache}_cache": "hit" if hit else "miss"})
+    tracer = _TRACER
+    if tracer is not None:
+        tracer.metrics.cache_event(cache, hit)
+
+
+@contextmanager
+def start_trace(trace_id: Optional[str] = None):
+    """Groups every span opened inside (e.g. one graph invocation) under one trace id."""
+    token = _TRACE_ID.set(trace_id or uuid.uuid4().hex[:16])
+    try:
+        yield _TRACE_ID.get()
+    finally:
+        _TRACE_ID.reset(token)
+
+
+# =========================
+# 3) Exporters
+# =========================
+class RingBufferExporter:
+    """Last `capacity` spans in memory, plus per-span percentiles to spot the p99 hop."""
+
+    def __init__(self, capacity: int = TRACE_BUFFER_SIZE):
+        self._spans: deque[Span] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self, kind: Optional[str] = None) -> list[Span]:
+        with self._lock:
+            spans = list(self._spans)
+        return [span for span in spans if kind is None or span.kind == kind]
+
+    def percentiles(self, pcts: tuple[float, ...] = (50, 95, 99)) -> dict[str, dict[str, float]]:
+        """(kind:name) -> {"count", "p50", "p95", "p99"} in ms, slowest p99 first."""
+        grouped: dict[str, list[float]] = {}
+        for span in self.spans():
+            grouped.setdefault(f"{span.kind}:{span.name}", []).append(span.duration_ms)
+        report = {}
+        for key, durations in grouped.items():
+            durations.sort()
+            report[key] = {"count": len(durations)}
+            for pct in pcts:
+                index = min(len(durations) - 1, int(round(pct / 100 * (len(durations) - 1))))
+                report[key][f"p{pct:g}"] = durations[index]
+        return dict(sorted(report.items(), key=lambda item: -item[1].get("p99", 0.0)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class JsonlExporter:
+    """Appends one JSON object per finished span."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusExporter:
+    """Aggregates spans into Prometheus text-format histograms and counters."""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS, prefix: str = "multiagent"):
+        self.buckets = buckets
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._latency: dict[tuple[str, str], list] = {}    # (kind, name) -> [bucket counts..., sum, count]
+        self._counters: dict[tuple[str, tuple], float] = {}
+
+    def _inc(self, metric: str, labels: tuple, value: float = 1.0) -> None:
+        self._counters[(metric, labels)] = self._counters.get((metric, labels), 0.0) + value
+
+    def export(self, span: Span) -> None:
+        seconds = span.duration_ms / 1000
+        labels = (("kind", span.kind), ("name", span.name))
+        with self._lock:
+            series = self._latency.setdefault((span.kind, span.name), [0] * (len(self.buckets) + 1) + [0.0, 0])
+            series[bisect_left(self.buckets, seconds)] += 1
+            series[-2] += seconds
+            series[-1] += 1
+            if span.queue_ms:
+                self._inc("span_queue_seconds_total", labels, span.queue_ms / 1000)
+            if span.error:
+                self._inc("span_errors_total", labels)
+            for key in ("prompt_tokens", "completion_tokens"):
+                if key in span.attributes:
+                    self._inc(f"llm_{key}_total", labels, span.attributes[key])
+
+    def cache_event(self, cache: str, hit: bool) -> None:
+        with self._lock:
+            self._inc("cache_lookups_total", (("cache", cache), ("result", "hit" if hit else "miss")))
+
+    def render(self) -> str:
+        def fmt(labels) -> str:
+            return ",".join(f'{key}="{value}"' for key, value in labels)
+
+        lines = [
+            f"# HELP {self.prefix}_span_duration_seconds Wall time per node, router and LLM call.",
+            f"# TYPE {self.prefix}_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            latency = {key: list(series) for key, series in self._latency.items()}
+            counters = dict(self._counters)
+        for (kind, name), series in sorted(latency.items()):
+            labels = fmt((("kind", kind), ("name", name)))
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ["+Inf"], series[:-2]):
+                cumulative += count
+                lines.append(f'{self.prefix}_span_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.prefix}_span_duration_seconds_sum{{{labels}}} {series[-2]:.6f}")
+            lines.append(f"{self.prefix}_span_duration_seconds_count{{{labels}}} {series[-1]}")
+        for metric in sorted({metric for metric, _ in counters}):
+            lines.append(f"# TYPE {self.prefix}_{metric} counter")
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f"{self.prefix}_{metric}{{{fmt(labels)}}} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+# =========================
+# 4) Tracer
+# =========================
+class Tracer:
+    def __init__(self, exporters: Optional[list] = None, metrics: Optional[PrometheusExporter] = None):
+        self.buffer = RingBufferExporter()
+        self.metrics = metrics or PrometheusExporter()
+        self.exporters = [self.buffer, self.metrics, *(exporters or [])]
+
+    def finish(self, span: Span) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as exc:   # tracing must never break a request
+                print(f"⚠️ Trace exporter {type(exporter).__name__} failed: {exc}")
+
+    @contextmanager
+    def span(self, name: str, kind: str = "node", **attributes):
+        parent = _CURRENT.get()
+        span = Span(
+            name=name,
+            kind=kind,
+            trace_id=parent.trace_id if parent else (_TRACE_ID.get() or uuid.uuid4().hex[:16]),
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent else None,
+            start=time.time(),
+            attributes=attributes,
+        )
+        token = _CURRENT.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = type(exc).__name__
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - started) * 1000
+            _CURRENT.reset(token)
+            self.finish(span)
+
+
+def _default_tracer() -> Optional[Tracer]:
+    if not TRACING_ENABLED:
+        return None
+    return Tracer([JsonlExporter(TRACE_JSONL_PATH)] if TRACE_JSONL_PATH else [])
+
+
+_TRACER: Optional[Tracer] = _default_tracer()
+
+
+def get_tracer() -> Optional[Tracer]:
+    """The process-wide tracer, or None when TRACING_ENABLED=0."""
+    return _TRACER
+
+
+def set_tracer(tracer: Optional[Tracer]) -> Optional[Tracer]:
+    """Swaps the process-wide tracer (None turns tracing off). Returns the previous one."""
+    global _TRACER
+    previous, _TRACER = _TRACER, tracer
+    return previous
+
+
+@contextmanager
+def span(name: str, kind: str = "node", **attributes):
+    tracer = _TRACER
+    if tracer is None:
+        yield None
+        return
+    with tracer.span(name, kind, **attributes) as opened:
+        yield opened
+
+
+# =========================
+# 5) Decorators
+# =========================
+def _annotate_result(result: Any) -> None:
+    if isinstance(result, str):
+        annotate(decision=result)
+    elif isinstance(result, dict) and result.get("next_node"):
+        annotate(next_node=result["next_node"])
+
+
+def traced(name: Optional[str] = None, kind: str = "node") -> Callable:
+    """
+    Wraps a node or router (sync or async) in a span:
+
+        @traced("supervisor", kind="router")
+        def supervisor(state): ...
+    """
+
+    def decorate(fn: Callable) -> Callable:
+        span_name = name or fn.__name__
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def traced_async(*args, **kwargs):
+                with span(span_name, kind):
+                    result = await fn(*args, **kwargs)
+                    _annotate_result(result)
+                    return result
+            return traced_async
+
+        @functools.wraps(fn)
+        def traced_sync(*args, **kwargs):
+            with span(span_name, kind):
+                result = fn(*args, **kwargs)
+                _annotate_result(result)
+                return result
+        return traced_sync
+
+    return decorate
+
+
+def llm_call_attributes(prompt: str, completion: Optional[str] = None) -> dict:
+    """Prompt/completion sizes for an LLM span (chars and estimated tokens)."""
+    from prompt_budget import estimate_tokens
+
+    attributes = {"prompt_chars": len(prompt), "prompt_tokens": estimate_tokens(prompt)}
+    prefix_key = getattr(prompt, "prefix_key", None)
+    if prefix_key:
+        attributes["prompt_prefix_key"] = prefix_key
+    if completion is not None:
+        attributes["completion_chars"] = len(completion)
+        attributes["completion_tokens"] = estimate_tokens(completion)
+    return attributes
+
+
+# =========================
+# 6) /metrics endpoint
+# =========================
+def serve_metrics(port: int = TRACE_METRICS_PORT or 9464, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serves the Prometheus text format on http://host:port/metrics from a daemon thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            tracer = _TRACER
+            if self.path.rstrip("/") != "/metrics" or tracer is None:
+                self.send_error(404)
+                return
+            body = tracer.metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+if TRACE_METRICS_PORT:
+    serve_metrics(TRACE_METRICS_PORT)